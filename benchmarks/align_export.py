@@ -0,0 +1,100 @@
+"""Benchmark of the aligned faces export. Writes `Face` metadata of the
+synthetic faces into a folder and measures how many aligned faces per
+second `Aligner.align_faces` exports for every image format and number of
+worker threads.
+
+Run with: python -m benchmarks.align_export
+"""
+import argparse
+import logging
+from pathlib import Path
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import synthetic_frames, synthetic_landmarks
+from core.aligner import Aligner, AlignerConfiguration
+from core.dictionary import Dictionary
+from core.face import Face
+from core.face_alignment.face_aligner import FaceAligner
+from core.image.image import Image
+from enums import IMAGE_FORMAT
+from serializer.face_serializer import FaceSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def write_metadata(directory: Path, num_faces: int, frame_size: int) -> None:
+    """Writes `Face` metadata files and `alignments.json` of synthetic
+    faces, one face per frame.
+
+    Parameters
+    ----------
+    directory : Path
+        metadata directory
+    num_faces : int
+        number of faces
+    frame_size : int
+        height and width of the frames
+    """
+    alignments = Dictionary()
+    frames = synthetic_frames(num_faces, frame_size, frame_size)
+    for i, (frame, bb) in enumerate(frames):
+        face = Face()
+        face.bounding_box = bb
+        face.landmarks = synthetic_landmarks(bb)
+        # frame exists only in memory so face keeps it for serialization
+        face.raw_image = Image(Path(f'frame_{i}.png'), frame)
+        FaceSerializer.save(face, directory)
+        FaceAligner.calculate_alignment(face)
+        alignments.add(face.name, face.alignment)
+    alignments.save(directory / 'alignments.json')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--faces', type=int, default=10_000)
+    parser.add_argument('--frame_size', type=int, default=256)
+    parser.add_argument('--face_size', type=int, default=128)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument(
+        '--workdir',
+        type=str,
+        default=None,
+        help='Directory for the metadata, temporary if not set.',
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='align_export_'))
+    metadata_dir = workdir / 'metadata'
+    try:
+        logger.info(f'Writing {args.faces} synthetic faces to {workdir}.')
+        write_metadata(metadata_dir, args.faces, args.frame_size)
+
+        print(f'{"format":>6} {"workers":>7} {"time [s]":>9} {"faces/s":>9}')
+        for image_format in IMAGE_FORMAT:
+            for workers in args.workers:
+                output_dir = workdir / f'{image_format.value}_{workers}'
+                aligner = Aligner(AlignerConfiguration(
+                    metadata_dir,
+                    args.face_size,
+                    image_format=image_format,
+                    num_workers=workers,
+                ))
+                start = time.perf_counter()
+                exported = aligner.align_faces(output_dir)
+                elapsed = time.perf_counter() - start
+                print(
+                    f'{image_format.value:>6} {workers:>7} {elapsed:9.2f} '
+                    f'{exported / elapsed:9.1f}'
+                )
+                shutil.rmtree(output_dir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Stress test of the gui console. Worker threads log many records through
+`GuiHandler` while the gui thread keeps the console widget updated. Timer
+in the gui thread measures how late its ticks are, which is how long the
+event loop was blocked by the console.
+
+Run with: python -m benchmarks.console_stress
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+
+import numpy as np
+import PyQt6.QtCore as qtc
+import PyQt6.QtWidgets as qwt
+
+from configs.app_config import APP_CONFIG
+from gui.widgets.console import Console, append_lines
+from logger import GuiHandler
+
+TICK_MS = 10
+
+
+def _emit_records(
+    logger: logging.Logger,
+    n_records: int,
+    repeat_every: int,
+) -> None:
+    for i in range(n_records):
+        if repeat_every and i % repeat_every:
+            # progress like messages which repeat, e.g. per frame logs
+            logger.debug('Processing frame.')
+        else:
+            logger.info(f'Record {i}.')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100_000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument(
+        '--repeat_every',
+        type=int,
+        default=0,
+        help='Every n-th record is unique, others repeat, 0 for all unique.',
+    )
+    args = parser.parse_args()
+
+    app = qwt.QApplication(sys.argv)
+    text_edit = qwt.QTextEdit()
+    text_edit.setReadOnly(True)
+    text_edit.document().setMaximumBlockCount(
+        APP_CONFIG.app.gui.widgets.console.max_lines
+    )
+    text_edit.show()
+
+    console = Console.get_instance()
+    chunks = []
+
+    def _print(lines):
+        chunks.append(len(lines))
+        append_lines(text_edit, lines)
+
+    console.print_sig.connect(_print)
+
+    logger = logging.getLogger('benchmarks.console_stress')
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = GuiHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+
+    per_thread = args.records // args.threads
+    total = per_thread * args.threads
+    lateness = []
+    last_tick = [time.perf_counter()]
+
+    def _tick():
+        now = time.perf_counter()
+        lateness.append(max(0., now - last_tick[0] - TICK_MS / 1000))
+        last_tick[0] = now
+        if console.flushed >= total:
+            app.quit()
+
+    timer = qtc.QTimer()
+    timer.timeout.connect(_tick)
+    timer.start(TICK_MS)
+
+    start = time.perf_counter()
+    emitters = [
+        threading.Thread(
+            target=_emit_records,
+            args=(logger, per_thread, args.repeat_every),
+            daemon=True,
+        )
+        for _ in range(args.threads)
+    ]
+    for t in emitters:
+        t.start()
+    app.exec()
+    elapsed = time.perf_counter() - start
+    for t in emitters:
+        t.join()
+
+    lateness_ms = np.array(lateness) * 1000
+    print(
+        f'{total} records from {args.threads} threads in {elapsed:.2f} s, '
+        f'{len(chunks)} chunks, {sum(chunks)} lines, '
+        f'{text_edit.document().blockCount()} rendered'
+    )
+    print(
+        f'gui timer lateness [ms]: mean {lateness_ms.mean():.1f}, '
+        f'p99 {np.percentile(lateness_ms, 99):.1f}, '
+        f'max {lateness_ms.max():.1f}'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark of the FAN heatmap decoding. Compares vectorized numpy decoder
+with the previous numba decoder, cold, which is the first call in a new
+process and includes numba compilation, and warm.
+
+Run with: python -m benchmarks.fan_decode
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from benchmarks.hot_paths import measure
+
+# decoder factory returns function with the signature of `get_preds_fromhm`
+DecoderFactory = Callable[[], Callable]
+
+
+def _numpy_decoder() -> Callable:
+    from core.landmark_detection.algorithms.fan.utils import get_preds_fromhm
+
+    return get_preds_fromhm
+
+
+def _numba_decoder() -> Callable:
+    """Previous numba decoder, kept here only for comparison."""
+    from numba import jit
+
+    @jit(nopython=True)
+    def transform_np(point, center, scale, resolution, invert=False):
+        _pt = np.ones(3)
+        _pt[0] = point[0]
+        _pt[1] = point[1]
+
+        h = 200.0 * scale
+        t = np.eye(3)
+        t[0, 0] = resolution / h
+        t[1, 1] = resolution / h
+        t[0, 2] = resolution * (-center[0] / h + 0.5)
+        t[1, 2] = resolution * (-center[1] / h + 0.5)
+
+        if invert:
+            t = np.ascontiguousarray(np.linalg.pinv(t))
+
+        new_point = np.dot(t, _pt)[0:2]
+
+        return new_point.astype(np.int32)
+
+    @jit(nopython=True)
+    def _get_preds_fromhm(hm, idx, center=None, scale=None):
+        B, C, H, W = hm.shape
+        idx += 1
+        preds = idx.repeat(2).reshape(B, C, 2).astype(np.float32)
+        preds[:, :, 0] = (preds[:, :, 0] - 1) % W + 1
+        preds[:, :, 1] = np.floor((preds[:, :, 1] - 1) / H) + 1
+
+        for i in range(B):
+            for j in range(C):
+                hm_ = hm[i, j, :]
+                pX, pY = int(preds[i, j, 0]) - 1, int(preds[i, j, 1]) - 1
+                if pX > 0 and pX < 63 and pY > 0 and pY < 63:
+                    diff = np.array(
+                        [hm_[pY, pX + 1] - hm_[pY, pX - 1],
+                         hm_[pY + 1, pX] - hm_[pY - 1, pX]])
+                    preds[i, j] += np.sign(diff) * 0.25
+
+        preds -= 0.5
+
+        preds_orig = np.zeros_like(preds)
+        if center is not None and scale is not None:
+            for i in range(B):
+                for j in range(C):
+                    preds_orig[i, j] = transform_np(
+                        preds[i, j], center, scale, H, True)
+
+        return preds, preds_orig
+
+    def get_preds_fromhm(hm, center=None, scale=None):
+        B, C, H, W = hm.shape
+        hm_reshape = hm.reshape(B, C, H * W)
+        idx = np.argmax(hm_reshape, axis=-1)
+        scores = np.take_along_axis(hm_reshape, np.expand_dims(
+            idx, axis=-1), axis=-1).squeeze(-1)
+        preds, preds_orig = _get_preds_fromhm(hm, idx, center, scale)
+        return preds, preds_orig, scores
+
+    return get_preds_fromhm
+
+
+DECODERS: Dict[str, DecoderFactory] = {
+    'numpy': _numpy_decoder,
+    'numba': _numba_decoder,
+}
+
+
+def _inputs(batch_size: int):
+    rng = np.random.default_rng(0)
+    hm = rng.random((batch_size, 68, 64, 64), dtype=np.float32)
+    return hm, np.array([480, 270]), 1.5
+
+
+def _cold(name: str, batch_size: int) -> float:
+    decoder = DECODERS[name]()
+    hm, center, scale = _inputs(batch_size)
+    start = time.perf_counter()
+    decoder(hm, center, scale)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    hm, center, scale = _inputs(args.batch_size)
+    reference = None
+    print(f'{"decoder":>8} {"cold [ms]":>10} {"warm [ms]":>10} {"same":>5}')
+    for name, factory in DECODERS.items():
+        try:
+            decoder = factory()
+        except ImportError as e:
+            print(f'{name:>8} skipped: {e}')
+            continue
+        # every cold run gets a new interpreter so nothing is compiled yet
+        with ProcessPoolExecutor(
+            1,
+            mp_context=multiprocessing.get_context('spawn'),
+        ) as pool:
+            cold = pool.submit(_cold, name, args.batch_size).result()
+        result = measure(
+            name,
+            lambda: decoder(hm, center, scale),
+            args.batch_size,
+            args.repeat,
+        )
+        _, preds_orig, _ = decoder(hm.copy(), center, scale)
+        if reference is None:
+            reference = preds_orig
+        same = bool(np.array_equal(reference, preds_orig))
+        print(
+            f'{name:>8} {cold * 1000:10.2f} {result.mean * 1000:10.3f} '
+            f'{str(same):>5}'
+        )
+
+
+if __name__ == '__main__':
+    main()
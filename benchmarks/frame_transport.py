@@ -0,0 +1,156 @@
+"""Throughput benchmark of the frame transport between processes. Compares
+sending frames pickled through `multiprocessing.Queue` with sending only slot
+indices while frames live in `SharedFrameRingBuffer`.
+
+Run with: python -m benchmarks.frame_transport
+"""
+import argparse
+import multiprocessing
+from multiprocessing import Process, Queue
+import time
+from typing import Dict
+
+import numpy as np
+
+from core.frame_buffer import SharedFrameRingBuffer
+
+
+def _make_frames(height: int, width: int, count: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (count, height, width, 3), dtype=np.uint8)
+
+
+def _queue_producer(q: Queue, height: int, width: int, total: int,
+                    num_consumers: int) -> None:
+    frames = _make_frames(height, width)
+    for i in range(total):
+        q.put((i, frames[i % len(frames)]))
+    for _ in range(num_consumers):
+        q.put(None)
+
+
+def _queue_consumer(q: Queue, done_q: Queue) -> None:
+    count = 0
+    while True:
+        item = q.get()
+        if item is None:
+            break
+        _, frame = item
+        # touch the frame so both transports do the same amount of work
+        frame[0, 0, 0]
+        count += 1
+    done_q.put(count)
+
+
+def _shm_producer(buffer: SharedFrameRingBuffer, height: int, width: int,
+                  total: int, num_consumers: int) -> None:
+    frames = _make_frames(height, width)
+    for i in range(total):
+        buffer.put(frames[i % len(frames)], i)
+    buffer.finish(num_consumers)
+
+
+def _shm_consumer(buffer: SharedFrameRingBuffer, done_q: Queue) -> None:
+    count = 0
+    for _, frame in buffer.frames():
+        frame[0, 0, 0]
+        count += 1
+    done_q.put(count)
+
+
+def _run(producer, producer_args, consumer, consumer_arg,
+         num_consumers: int) -> float:
+    done_q = Queue()
+    consumers = [
+        Process(target=consumer, args=(consumer_arg, done_q))
+        for _ in range(num_consumers)
+    ]
+    for c in consumers:
+        c.start()
+    start = time.perf_counter()
+    producer_process = Process(
+        target=producer,
+        args=(consumer_arg, *producer_args),
+    )
+    producer_process.start()
+    received = sum(done_q.get() for _ in range(num_consumers))
+    elapsed = time.perf_counter() - start
+    producer_process.join()
+    for c in consumers:
+        c.join()
+    return received / elapsed
+
+
+def benchmark_frame_transport(
+    height: int = 1080,
+    width: int = 1920,
+    total: int = 500,
+    num_slots: int = 16,
+    num_consumers: int = 2,
+) -> Dict[str, float]:
+    """Measures frames per second of both transports.
+
+    Parameters
+    ----------
+    height : int, optional
+        frame height, by default 1080
+    width : int, optional
+        frame width, by default 1920
+    total : int, optional
+        number of frames to send, by default 500
+    num_slots : int, optional
+        number of frames in flight, by default 16
+    num_consumers : int, optional
+        number of consumer processes, by default 2
+
+    Returns
+    -------
+    Dict[str, float]
+        frames per second for every transport
+    """
+    producer_args = (height, width, total, num_consumers)
+    queue_fps = _run(
+        _queue_producer,
+        producer_args,
+        _queue_consumer,
+        Queue(num_slots),
+        num_consumers,
+    )
+    with SharedFrameRingBuffer(num_slots, height, width) as buffer:
+        shm_fps = _run(
+            _shm_producer,
+            producer_args,
+            _shm_consumer,
+            buffer,
+            num_consumers,
+        )
+    return {'pickled_queue': queue_fps, 'shared_memory': shm_fps}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--slots', type=int, default=16)
+    parser.add_argument('--consumers', type=int, default=2)
+    args = parser.parse_args()
+
+    results = benchmark_frame_transport(
+        args.height,
+        args.width,
+        args.frames,
+        args.slots,
+        args.consumers,
+    )
+    print(
+        f'Frame transport, {args.frames} frames of ' +
+        f'{args.width}x{args.height}, {args.consumers} consumers:'
+    )
+    for name, fps in results.items():
+        print(f'{name:>15}: {fps:10.1f} fps')
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,185 @@
+"""CPU profiling mode of the face swapping model. Builds `FS` with tiny
+images, randomly initialized ArcFace and discriminator backbone so nothing
+has to be downloaded, and reports forward and backward time of every
+component: generator, ArcFace and projected discriminator.
+
+Run with: python -m benchmarks.fs_profile
+"""
+import argparse
+from dataclasses import dataclass
+import logging
+import time
+from typing import Callable, List
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from core.model.fs import FS
+from enums import DEVICE
+
+logger = logging.getLogger(__name__)
+
+# projected discriminator assumes 256x256 feature pyramid, its smallest
+# mini discriminator needs at least 128x128 input
+MIN_IMAGE_SIZE = 128
+
+
+@dataclass
+class ComponentTiming:
+    name: str
+    forward: float = 0.
+    backward: float = 0.
+
+
+def time_component(
+    name: str,
+    forward: Callable[[], torch.Tensor],
+    repeat: int,
+    warmup: int = 1,
+) -> ComponentTiming:
+    """Times forward pass and backward pass of the scalar made from the
+    output of the `forward` separately.
+
+    Parameters
+    ----------
+    name : str
+        component name
+    forward : Callable[[], torch.Tensor]
+        function which runs forward pass of the component
+    repeat : int
+        number of timed passes
+    warmup : int, optional
+        number of untimed passes, by default 1
+
+    Returns
+    -------
+    ComponentTiming
+        mean forward and backward time in seconds
+    """
+    forward_times = []
+    backward_times = []
+    for i in range(warmup + repeat):
+        start = time.perf_counter()
+        out = forward()
+        middle = time.perf_counter()
+        out.float().mean().backward()
+        end = time.perf_counter()
+        if i >= warmup:
+            forward_times.append(middle - start)
+            backward_times.append(end - middle)
+    return ComponentTiming(
+        name,
+        float(np.mean(forward_times)),
+        float(np.mean(backward_times)),
+    )
+
+
+def profile_fs(
+    batch_size: int = 2,
+    image_size: int = MIN_IMAGE_SIZE,
+    gdeep: bool = False,
+    repeat: int = 3,
+) -> List[ComponentTiming]:
+    """Profiles components of the `FS` model on the CPU.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        batch size, by default 2
+    image_size : int, optional
+        size of the square input images, by default MIN_IMAGE_SIZE
+    gdeep : bool, optional
+        whether generator uses additional down and up sampling blocks, by
+        default False
+    repeat : int, optional
+        number of timed passes, by default 3
+
+    Returns
+    -------
+    List[ComponentTiming]
+        timings of the generator, ArcFace and projected discriminator
+    """
+    if image_size < MIN_IMAGE_SIZE:
+        raise ValueError(
+            f'Image size must be at least {MIN_IMAGE_SIZE}, got {image_size}.'
+        )
+    torch.manual_seed(0)
+    model = FS()
+    model.initialize({
+        'train': True,
+        'gdeep': gdeep,
+        'arc_path': None,
+        'pretrained_backbone': False,
+        'device': DEVICE.CPU,
+        'lr': 4e-4,
+        'beta1': 0.,
+    })
+    model.netG.train()
+    model.netD.train()
+
+    img = torch.randn(batch_size, 3, image_size, image_size)
+    latent_id = F.normalize(torch.randn(batch_size, 512), p=2, dim=1)
+
+    def _generator():
+        return model.netG(img, latent_id)
+
+    def _arcface():
+        # ArcFace is frozen, but identity loss backpropagates through it to
+        # the generator, so backward pass is timed against the input
+        x = img.clone().requires_grad_(True)
+        x = F.interpolate(x, size=(112, 112), mode='bicubic')
+        return model.netArc(x)
+
+    def _discriminator():
+        logits, _ = model.netD(img, None)
+        return logits
+
+    return [
+        time_component('generator', _generator, repeat),
+        time_component('arcface', _arcface, repeat),
+        time_component('projected discriminator', _discriminator, repeat),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=2)
+    parser.add_argument('--image_size', type=int, default=MIN_IMAGE_SIZE)
+    parser.add_argument('--gdeep', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Number of torch CPU threads, torch default if not provided.',
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    timings = profile_fs(
+        args.batch_size,
+        args.image_size,
+        args.gdeep,
+        args.repeat,
+    )
+    total = sum(t.forward + t.backward for t in timings)
+    print(
+        f'FS on CPU, batch {args.batch_size}, '
+        f'{args.image_size}x{args.image_size}, '
+        f'{torch.get_num_threads()} threads'
+    )
+    print(f'{"component":>25} {"fwd [ms]":>10} {"bwd [ms]":>10} {"share":>7}')
+    for t in timings:
+        share = (t.forward + t.backward) / total if total else 0.
+        print(
+            f'{t.name:>25} {t.forward * 1000:10.1f} '
+            f'{t.backward * 1000:10.1f} {share:7.1%}'
+        )
+
+
+if __name__ == '__main__':
+    main()
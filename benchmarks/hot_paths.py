@@ -0,0 +1,491 @@
+"""CPU benchmark of the hot paths of the face extraction and deepfake
+detection pipelines on synthetic data. Every run is appended to the JSON
+history file and compared with the previous run so regressions show up.
+
+Run with: python -m benchmarks.hot_paths
+"""
+import argparse
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import json
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+import torch
+
+from benchmarks.synthetic import (
+    synthetic_frames,
+    synthetic_landmarks,
+    write_synthetic_video,
+)
+from core.face import Face
+from core.image.image import Image
+from enums import DEVICE
+from variables import DEEPFAKE_ROOT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = DEEPFAKE_ROOT / 'benchmarks' / 'history.json'
+
+# setup function receives working directory and returns function which is
+# timed and the number of items that function processes in one call
+Setup = Callable[[Path], Tuple[Callable[[], None], int]]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    repeat: int = 0
+    items: int = 0
+    mean: float = 0.
+    min: float = 0.
+    max: float = 0.
+    items_per_second: float = 0.
+    error: Optional[str] = None
+
+
+def measure(
+    name: str,
+    fun: Callable[[], None],
+    items: int,
+    repeat: int,
+    warmup: int = 1,
+) -> BenchmarkResult:
+    """Times `fun` `repeat` times after `warmup` untimed calls.
+
+    Parameters
+    ----------
+    name : str
+        benchmark name
+    fun : Callable[[], None]
+        function to time
+    items : int
+        number of items processed in one call
+    repeat : int
+        number of timed calls
+    warmup : int, optional
+        number of untimed calls, by default 1
+
+    Returns
+    -------
+    BenchmarkResult
+        timing statistics in seconds per call
+    """
+    for _ in range(warmup):
+        fun()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start)
+    mean = float(np.mean(times))
+    return BenchmarkResult(
+        name,
+        repeat,
+        items,
+        mean,
+        float(np.min(times)),
+        float(np.max(times)),
+        items / mean if mean else 0.,
+    )
+
+
+def _first_frame() -> Tuple[np.ndarray, Face]:
+    frame, bb = next(synthetic_frames(1))
+    face = Face()
+    face.bounding_box = bb
+    face.landmarks = synthetic_landmarks(bb)
+    return frame, face
+
+
+def _write_crops(directory: Path, count: int, size: int = 256) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, (frame, bb) in enumerate(
+        synthetic_frames(count, size * 2, size * 2)
+    ):
+        (x1, y1), (x2, y2) = bb.upper_left, bb.lower_right
+        crop = cv.resize(frame[y1:y2, x1:x2], (size, size))
+        path = directory / f'{i}_0.png'
+        cv.imwrite(str(path), crop)
+        paths.append(path)
+    return paths
+
+
+def _write_photos(
+    directory: Path,
+    count: int,
+    height: int = 3000,
+    width: int = 4000,
+) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, (frame, _) in enumerate(synthetic_frames(count, height, width)):
+        path = directory / f'{i}.jpg'
+        cv.imwrite(str(path), frame)
+        paths.append(path)
+    return paths
+
+
+# heavy modules are imported inside the setups so one missing model or
+# dependency skips only the benchmark which needs it
+
+
+def setup_s3fd(workdir: Path):
+    from core.face_detection.algorithms.s3fd.s3fd_fdm import S3FDFDM
+
+    frame, _ = _first_frame()
+    image = Image(workdir / 'frame.png', frame)
+    fdm = S3FDFDM(DEVICE.CPU)
+    return lambda: fdm.detect_faces(image), 1
+
+
+def setup_fan(workdir: Path):
+    from core.landmark_detection.algorithms.fan.fan_ldm import FANLDM
+
+    frame, face = _first_frame()
+    face.raw_image = Image(workdir / 'frame.png', frame)
+    ldm = FANLDM(DEVICE.CPU)
+    return lambda: ldm.detect_landmarks(face), 1
+
+
+def setup_face_aligner(workdir: Path):
+    from core.face_alignment.face_aligner import FaceAligner
+
+    frame, face = _first_frame()
+    face.raw_image = Image(workdir / 'frame.png', frame)
+    face.compute_mask()
+
+    def align():
+        face.alignment = None
+        FaceAligner.align_face(face, 256)
+
+    return align, 1
+
+
+def setup_extraction_decode(workdir: Path, count: int = 8):
+    from core.face_detection.algorithms.s3fd.s3fd_fdm import S3FDFDM
+    from core.image.image import ImagePrefetcher
+
+    paths = _write_photos(workdir / 'photos', count)
+    max_pixels = S3FDFDM.max_input_pixels
+
+    def decode():
+        # same decoding as in the extractor, full size image which the
+        # detector downscales in memory
+        for image in ImagePrefetcher(paths):
+            height, width = image.shape[:2]
+            shrink = np.sqrt(max_pixels / (height * width))
+            cv.resize(image.data, None, None, fx=shrink, fy=shrink)
+
+    return decode, count
+
+
+def setup_extractor_run(workdir: Path, count: int = 8):
+    from core.extractor import Extractor, ExtractorConfiguration
+
+    photos_dir = workdir / 'photos'
+    _write_photos(photos_dir, count)
+    extractor = Extractor(ExtractorConfiguration(
+        photos_dir,
+        workdir / 'metadata',
+        quiet=True,
+    ))
+    return extractor.run, count
+
+
+def _serializable_face(workdir: Path) -> Face:
+    from core.face_alignment.face_aligner import FaceAligner
+
+    frame, face = _first_frame()
+    face.raw_image = Image(workdir / 'frame.png', frame)
+    face.compute_mask()
+    FaceAligner.calculate_alignment(face)
+    return face
+
+
+def setup_serializer_save(workdir: Path):
+    from serializer.face_serializer import FaceSerializer
+
+    face = _serializable_face(workdir)
+    out_dir = workdir / 'faces_save'
+    return lambda: FaceSerializer.save(face, out_dir), 1
+
+
+def setup_serializer_load(workdir: Path):
+    from serializer.face_serializer import FaceSerializer
+
+    face = _serializable_face(workdir)
+    out_dir = workdir / 'faces_load'
+    FaceSerializer.save(face, out_dir)
+    path = face.path
+    return lambda: FaceSerializer.load(path), 1
+
+
+def setup_gen_mri(workdir: Path):
+    from core.df_detection.mri_gan.data_utils.face_mri import gen_mri
+
+    real, fake = _write_crops(workdir / 'mri_pair', 2)
+    mri_path = str(workdir / 'mri.png')
+    return lambda: gen_mri(str(real), str(fake), mri_path), 1
+
+
+def setup_dfdc_dataset(workdir: Path, count: int = 64):
+    from torchvision.transforms import transforms
+
+    from core.df_detection.mri_gan.deep_fake_detect.datasets import \
+        DFDCDatasetSimple
+    from enums import MODE
+
+    crops_dir = workdir / 'crops'
+    paths = _write_crops(crops_dir / 'dfdc_train_part_0' / 'video', count)
+    # constructor reads csv paths from the MRI GAN config, dataset is built
+    # directly from the synthetic crops instead
+    dataset = DFDCDatasetSimple.__new__(DFDCDatasetSimple)
+    dataset.mode = MODE.TEST
+    dataset.label_smoothing = 0
+    dataset.crops_dir = crops_dir
+    dataset.data_dict = [
+        {
+            'part': 'dfdc_train_part_0',
+            'video_id': 'video',
+            'frame': p.name,
+            'label': i % 2,
+        }
+        for i, p in enumerate(paths)
+    ]
+    dataset.data_len = len(dataset.data_dict)
+    dataset.transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+    ])
+
+    def iterate():
+        for i in range(len(dataset)):
+            dataset[i]
+
+    return iterate, count
+
+
+def setup_infer_df_detector(workdir: Path, num_frames: int = 30):
+    from common_structures import Job
+    from core.worker import InferDFDetectorWorker
+    from enums import JOB_DATA_KEY, JOB_TYPE, MRI_GAN_DATASET
+
+    video_path = write_synthetic_video(
+        workdir / 'video.mp4',
+        num_frames=num_frames,
+    )
+    worker = InferDFDetectorWorker(
+        MRI_GAN_DATASET.PLAIN,
+        fake_threshold=0.5,
+        fake_fraction=0.5,
+        batch_size=8,
+        num_workers=0,
+        device=DEVICE.CPU,
+    )
+    worker._current_job = Job(
+        JOB_TYPE.FILE_CHANGE,
+        {JOB_DATA_KEY.FILE_PATH: video_path},
+    )
+    return worker._predict, num_frames
+
+
+def setup_hash_deduplication(
+    workdir: Path,
+    count: int = 100_000,
+    clusters: int = 2000,
+):
+    from core.sort import deduplicate_hashes
+
+    # faces of one video differ in few bits, so hashes are made as random
+    # cluster centers with few flipped bits
+    rng = np.random.default_rng(0)
+    centers = rng.integers(0, 2 ** 63, (clusters, 2), dtype=np.uint64)
+    hashes = centers[rng.integers(0, clusters, count)]
+    flips = rng.integers(0, 64, (count, 2, 3), dtype=np.uint64)
+    for k in range(flips.shape[-1]):
+        hashes ^= np.left_shift(np.uint64(1), flips[..., k])
+    return lambda: deduplicate_hashes(hashes, 8), count
+
+
+BENCHMARKS: Dict[str, Setup] = {
+    's3fd_detect_faces': setup_s3fd,
+    'fan_landmarks': setup_fan,
+    'face_aligner_align_face': setup_face_aligner,
+    'extraction_decode': setup_extraction_decode,
+    'extractor_run': setup_extractor_run,
+    'face_serializer_save': setup_serializer_save,
+    'face_serializer_load': setup_serializer_load,
+    'gen_mri': setup_gen_mri,
+    'dfdc_dataset_simple_iteration': setup_dfdc_dataset,
+    'infer_df_detector_predict': setup_infer_df_detector,
+    'hash_deduplication': setup_hash_deduplication,
+}
+
+
+def run_benchmarks(
+    names: Optional[List[str]] = None,
+    repeat: int = 5,
+) -> List[BenchmarkResult]:
+    """Runs benchmarks on CPU in a temporary directory. Benchmark which
+    fails is recorded with the error instead of the timings.
+
+    Parameters
+    ----------
+    names : Optional[List[str]], optional
+        which benchmarks to run, if not provided, all of them are run, by
+        default None
+    repeat : int, optional
+        number of timed calls per benchmark, by default 5
+
+    Returns
+    -------
+    List[BenchmarkResult]
+        results of the benchmarks
+    """
+    torch.manual_seed(0)
+    if names is None:
+        names = list(BENCHMARKS.keys())
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            workdir = Path(tmp) / name
+            workdir.mkdir()
+            try:
+                fun, items = BENCHMARKS[name](workdir)
+                result = measure(name, fun, items, repeat)
+            except Exception as e:
+                logger.debug(traceback.format_exc())
+                result = BenchmarkResult(name, error=repr(e))
+            results.append(result)
+            logger.info(f'Benchmark {name} done.')
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=DEEPFAKE_ROOT,
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_to_history(path: Path, results: List[BenchmarkResult]) -> dict:
+    """Appends results of this run to the history file.
+
+    Parameters
+    ----------
+    path : Path
+        path to the JSON history file
+    results : List[BenchmarkResult]
+        results of this run
+
+    Returns
+    -------
+    dict
+        appended history entry
+    """
+    history = load_history(path)
+    entry = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'results': {r.name: asdict(r) for r in results},
+    }
+    history.append(entry)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=4)
+    return entry
+
+
+def format_report(
+    results: List[BenchmarkResult],
+    previous: Optional[dict] = None,
+) -> str:
+    """Formats results as a table, if previous history entry is passed,
+    relative change of the mean time is shown too.
+
+    Parameters
+    ----------
+    results : List[BenchmarkResult]
+        results of this run
+    previous : Optional[dict], optional
+        previous history entry, by default None
+
+    Returns
+    -------
+    str
+        formatted table
+    """
+    previous_results = previous['results'] if previous is not None else {}
+    header = f'{"benchmark":<32} {"mean [ms]":>10} {"min [ms]":>10} ' + \
+        f'{"items/s":>10} {"change":>8}'
+    lines = [header, '-' * len(header)]
+    for r in results:
+        if r.error is not None:
+            lines.append(f'{r.name:<32} failed: {r.error}')
+            continue
+        change = ''
+        prev = previous_results.get(r.name)
+        if prev is not None and prev.get('error') is None and prev['mean']:
+            change = f'{(r.mean / prev["mean"] - 1) * 100:+.1f}%'
+        lines.append(
+            f'{r.name:<32} {r.mean * 1000:>10.2f} {r.min * 1000:>10.2f} ' +
+            f'{r.items_per_second:>10.2f} {change:>8}'
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--benchmarks',
+        nargs='*',
+        choices=list(BENCHMARKS.keys()),
+        help='Which benchmarks to run, all by default.',
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--history',
+        type=str,
+        default=str(DEFAULT_HISTORY_PATH),
+        help='JSON file where results of every run are appended.',
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    history_path = Path(args.history)
+    history = load_history(history_path)
+    previous = history[-1] if history else None
+
+    results = run_benchmarks(args.benchmarks, args.repeat)
+    save_to_history(history_path, results)
+    print(format_report(results, previous))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Step time benchmark of the precision policies. Times one MRI-GAN training
+step (generator and discriminator forward and backward passes, both
+optimizer steps) on random data for every precision and memory format
+combination available on the device, so the policy for the training
+configuration can be picked by measurement.
+
+Run with: python -m benchmarks.precision
+"""
+import argparse
+import logging
+from typing import List
+
+import torch
+
+from benchmarks.hot_paths import BenchmarkResult, measure
+from core.precision import PrecisionPolicy
+from enums import DEVICE, PRECISION
+
+logger = logging.getLogger(__name__)
+
+
+def available_policies(device: DEVICE) -> List[PrecisionPolicy]:
+    precisions = [PRECISION.FP32, PRECISION.BF16]
+    if device == DEVICE.CUDA:
+        precisions.append(PRECISION.FP16)
+    return [
+        PrecisionPolicy(device, precision, channels_last)
+        for precision in precisions
+        for channels_last in (False, True)
+    ]
+
+
+def benchmark_policy(
+    policy: PrecisionPolicy,
+    batch_size: int,
+    image_size: int,
+    repeat: int,
+) -> BenchmarkResult:
+    """Times MRI-GAN training step with the `policy`.
+
+    Parameters
+    ----------
+    policy : PrecisionPolicy
+        policy to benchmark
+    batch_size : int
+        batch size of the step
+    image_size : int
+        size of the square input images, generator needs at least 256
+    repeat : int
+        number of timed steps
+
+    Returns
+    -------
+    BenchmarkResult
+        timing statistics in seconds per step
+    """
+    from core.df_detection.mri_gan.mri_gan.model import (
+        Discriminator,
+        GeneratorUNet,
+    )
+
+    torch.manual_seed(0)
+    generator = policy.prepare_model(GeneratorUNet())
+    discriminator = policy.prepare_model(Discriminator())
+    optimizer_G = torch.optim.Adam(generator.parameters(), lr=2e-4)
+    optimizer_D = torch.optim.Adam(discriminator.parameters(), lr=2e-4)
+    criterion = torch.nn.MSELoss()
+
+    shape = (batch_size, 3, image_size, image_size)
+    real_A = policy.prepare_input(torch.rand(shape) * 2 - 1)
+    real_B = policy.prepare_input(torch.rand(shape) * 2 - 1)
+
+    def _step():
+        optimizer_G.zero_grad()
+        with policy.autocast():
+            fake_B = generator(real_A)
+            pred_fake = discriminator(fake_B, real_A)
+        valid = torch.ones_like(pred_fake, dtype=torch.float32)
+        loss_G = criterion(pred_fake.float(), valid) + \
+            criterion(fake_B.float(), real_B)
+        policy.backward(loss_G)
+        policy.step(optimizer_G)
+
+        optimizer_D.zero_grad()
+        with policy.autocast():
+            pred_real = discriminator(real_B, real_A)
+            pred_fake = discriminator(fake_B.detach(), real_A)
+        loss_D = 0.5 * (
+            criterion(pred_real.float(), valid) +
+            criterion(pred_fake.float(), torch.zeros_like(valid))
+        )
+        policy.backward(loss_D)
+        policy.step(optimizer_D)
+        policy.update()
+        if policy.device == DEVICE.CUDA:
+            torch.cuda.synchronize()
+
+    return measure(str(policy), _step, batch_size, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--device',
+        type=str,
+        default=DEVICE.CPU.value,
+        choices=[d.value for d in DEVICE],
+    )
+    parser.add_argument('--batch_size', type=int, default=2)
+    parser.add_argument('--image_size', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    results = []
+    for policy in available_policies(DEVICE(args.device)):
+        logger.info(f'Benchmarking {policy}.')
+        try:
+            results.append(
+                benchmark_policy(
+                    policy,
+                    args.batch_size,
+                    args.image_size,
+                    args.repeat,
+                )
+            )
+        except Exception as e:
+            # bf16 kernels are missing on some older CPUs and GPUs
+            results.append(BenchmarkResult(str(policy), error=str(e)))
+
+    baseline = results[0].mean if results and results[0].mean else None
+    print(f'{"policy":>25} {"step [ms]":>10} {"samples/s":>10} {"speedup":>8}')
+    for r in results:
+        if r.error is not None:
+            print(f'{r.name:>25} failed: {r.error}')
+            continue
+        speedup = baseline / r.mean if baseline else 0.
+        print(
+            f'{r.name:>25} {r.mean * 1000:10.1f} '
+            f'{r.items_per_second:10.2f} {speedup:8.2f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Generators of synthetic data for benchmarks. Everything is rendered
+locally from a fixed seed so benchmarks don't need any network access or
+external datasets.
+"""
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+
+from core.bounding_box import BoundingBox
+from core.landmarks import MEAN_FACE_2D, Landmarks
+
+SKIN_COLOR = (120, 160, 210)
+
+
+def render_face(
+    image: np.ndarray,
+    center: Tuple[int, int],
+    size: int,
+) -> BoundingBox:
+    """Draws face-like blob, head with eyes and mouth, on the `image`.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        image on which face is drawn in place
+    center : Tuple[int, int]
+        center of the face
+    size : int
+        height of the face
+
+    Returns
+    -------
+    BoundingBox
+        bounding box of the drawn face
+    """
+    x, y = center
+    half_h = size // 2
+    half_w = int(size * 0.38)
+    cv.ellipse(image, center, (half_w, half_h), 0, 0, 360, SKIN_COLOR, -1)
+    eye_dx = half_w // 2
+    eye_y = y - half_h // 4
+    eye_r = max(size // 20, 1)
+    cv.circle(image, (x - eye_dx, eye_y), eye_r, (40, 40, 40), -1)
+    cv.circle(image, (x + eye_dx, eye_y), eye_r, (40, 40, 40), -1)
+    cv.ellipse(
+        image,
+        (x, y + half_h // 2),
+        (half_w // 2, max(size // 20, 1)),
+        0,
+        0,
+        360,
+        (60, 60, 150),
+        -1,
+    )
+    return BoundingBox(x - half_w, y - half_h, x + half_w, y + half_h)
+
+
+def synthetic_frames(
+    num_frames: int,
+    height: int = 720,
+    width: int = 1280,
+    seed: int = 0,
+) -> Iterator[Tuple[np.ndarray, BoundingBox]]:
+    """Renders frames with face-like blob moving over the noisy background.
+
+    Parameters
+    ----------
+    num_frames : int
+        number of frames
+    height : int, optional
+        frame height, by default 720
+    width : int, optional
+        frame width, by default 1280
+    seed : int, optional
+        seed of the background noise, by default 0
+
+    Yields
+    ------
+    Iterator[Tuple[np.ndarray, BoundingBox]]
+        frame and bounding box of the face on it
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 80, (height, width, 3), dtype=np.uint8)
+    size = height // 3
+    for i in range(num_frames):
+        frame = background.copy()
+        phase = 2 * np.pi * i / max(num_frames, 1)
+        center = (
+            int(width / 2 + width / 4 * np.sin(phase)),
+            int(height / 2 + height / 8 * np.cos(phase)),
+        )
+        bb = render_face(frame, center, size)
+        yield frame, bb
+
+
+def write_synthetic_video(
+    path: Union[str, Path],
+    num_frames: int = 60,
+    height: int = 720,
+    width: int = 1280,
+    fps: int = 30,
+    seed: int = 0,
+) -> Path:
+    """Writes synthetic video with moving face-like blob to the `path`.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        where the video is saved
+    num_frames : int, optional
+        number of frames, by default 60
+    height : int, optional
+        frame height, by default 720
+    width : int, optional
+        frame width, by default 1280
+    fps : int, optional
+        frames per second, by default 30
+    seed : int, optional
+        seed of the background noise, by default 0
+
+    Returns
+    -------
+    Path
+        path of the video
+    """
+    path = Path(path)
+    writer = cv.VideoWriter(
+        str(path),
+        cv.VideoWriter_fourcc(*'mp4v'),
+        fps,
+        (width, height),
+    )
+    for frame, _ in synthetic_frames(num_frames, height, width, seed):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def synthetic_landmarks(bb: BoundingBox) -> Landmarks:
+    """Makes 68 landmarks which fit into the bounding box. Inner 51 points
+    are the mean face, jaw line is a half ellipse around it.
+
+    Parameters
+    ----------
+    bb : BoundingBox
+        bounding box of the face
+
+    Returns
+    -------
+    Landmarks
+        face landmarks
+    """
+    (x1, y1), (x2, y2) = bb.upper_left, bb.lower_right
+    w, h = x2 - x1, y2 - y1
+    inner = MEAN_FACE_2D * [w * 0.6, h * 0.6] + [x1 + w * 0.2, y1 + h * 0.2]
+    angles = np.linspace(np.pi, 0, 17)
+    cx, cy = (x1 + x2) / 2, y1 + h * 0.4
+    jaw = np.stack(
+        [cx + w / 2 * np.cos(angles), cy + h * 0.55 * np.sin(angles)],
+        axis=1,
+    )
+    return Landmarks(np.concatenate([jaw, inner]))
@@ -5,8 +5,8 @@ from typing import List
 
 import torch
 
-from enums import DEVICE, FACE_DETECTION_ALGORITHM
-from variables import APP_CONFIG_PATH
+from enums import DEVICE, FACE_DETECTION_ALGORITHM, PROFILER
+from variables import APP_CONFIG_PATH, DEEPFAKE_ROOT
 
 
 @dataclass
@@ -82,11 +82,35 @@ class _DFDetection:
     models: _DFDetectionModels
 
 
+@dataclass
+class _FS:
+    arc_path: Path
+
+
+@dataclass
+class _FaceSwapModels:
+    fs: _FS
+
+
+@dataclass
+class _FaceSwap:
+    models: _FaceSwapModels
+
+
+@dataclass
+class _Profiling:
+    enabled: bool
+    directory: Path
+    profiler: PROFILER
+
+
 @dataclass
 class _Core:
     face_detection: _FaceDetection
     landmark_detection: _LandmarkDetection
     df_detection: _DFDetection
+    face_swap: _FaceSwap
+    profiling: _Profiling
     devices: List[DEVICE]
     selected_device: DEVICE = DEVICE.CPU
 
@@ -106,6 +130,8 @@ class _VideoWidget:
 class _Console:
     font_name: str
     text_size: int
+    flush_interval_ms: int
+    max_lines: int
 
 
 @dataclass
@@ -206,6 +232,22 @@ def _load_config():
         )
         _mri_gan_submodel = _Model(**_submodels['mri_gan'])
 
+        ###########
+        # FACE SWAP
+        ###########
+        _face_swap_models = _core['face_swap']['models']
+        # relative model paths are relative to the project root
+        fs_arc_path = DEEPFAKE_ROOT / _face_swap_models['fs']['arc_path']
+
+        ###########
+        # PROFILING
+        ###########
+        _profiling = _core['profiling']
+        profiling_enabled = _profiling['enabled']
+        # relative directory is relative to the project root
+        profiling_directory = DEEPFAKE_ROOT / _profiling['directory']
+        profiler = PROFILER[_profiling['profiler'].upper()]
+
         _gui = _app['gui']
 
         _window = _gui['window']
@@ -226,6 +268,8 @@ def _load_config():
 
         font_name = _console['font_name']
         text_size = _console['text_size']
+        console_flush_interval_ms = _console['flush_interval_ms']
+        console_max_lines = _console['max_lines']
 
         _google_images_scraper = _app['google_images_scraper']
         default_save_directory = _google_images_scraper[
@@ -276,6 +320,12 @@ def _load_config():
                             _meso_net,
                         )
                     ),
+                    _FaceSwap(_FaceSwapModels(_FS(fs_arc_path))),
+                    _Profiling(
+                        profiling_enabled,
+                        profiling_directory,
+                        profiler,
+                    ),
                     devices,
                     selected_device,
                 ),
@@ -283,7 +333,12 @@ def _load_config():
                     _Window(preferred_width, preferred_height),
                     _Widgets(
                         _VideoWidget(video_aspect_ratio),
-                        _Console(font_name, text_size),
+                        _Console(
+                            font_name,
+                            text_size,
+                            console_flush_interval_ms,
+                            console_max_lines,
+                        ),
                         _ImageViewerSorter(images_per_page_options)
                     ),
                 ),
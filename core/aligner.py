@@ -1,17 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import logging
 import os
 from pathlib import Path
 import PyQt6.QtCore as qtc
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 from tqdm import tqdm
 
 import cv2 as cv
 import numpy as np
 
 from core.dictionary import Dictionary
+from core.image.writer import AsyncImageWriter, imwrite_params
 from enums import (
     BODY_KEY,
+    IMAGE_FORMAT,
     JOB_NAME,
     JOB_TYPE,
     MESSAGE_STATUS,
@@ -21,7 +24,7 @@ from enums import (
 )
 from message.message import Body, Message, Messages
 from serializer.face_serializer import FaceSerializer
-from utils import get_file_paths_from_dir
+from utils import batchify, get_file_paths_from_dir
 
 
 logger = logging.getLogger(__name__)
@@ -37,10 +40,25 @@ class AlignerConfiguration:
         face_size (int): size of the new image square
         message_worker_sig (Optional[qtc.pyqtSignal]): signal to the message
             worker in order to report job progress, by default None
+        image_format (IMAGE_FORMAT): format of the exported aligned faces,
+            by default IMAGE_FORMAT.PNG
+        quality (Optional[int]): JPEG quality or PNG compression level of
+            the exported faces, by default None for 95 or 1 respectively
+        batch_size (int): number of faces loaded together while exporting,
+            by default 32
+        num_workers (int): number of threads which load and write faces
+            while exporting, by default 4
+        progress_every (int): progress is reported after this many faces,
+            by default 100
     """
     metadata_directory: Union[str, Path]
     face_size: int
     message_worker_sig: Optional[qtc.pyqtSignal] = None
+    image_format: IMAGE_FORMAT = IMAGE_FORMAT.PNG
+    quality: Optional[int] = None
+    batch_size: int = 32
+    num_workers: int = 4
+    progress_every: int = 100
 
 
 class Aligner:
@@ -60,6 +78,14 @@ class Aligner:
         self._metadata_path = path
         self._face_size = configuration.face_size
         self._message_worker_sig = configuration.message_worker_sig
+        self._image_format = configuration.image_format
+        self._quality = configuration.quality
+        if self._quality is None:
+            self._quality = 95 if self._image_format == IMAGE_FORMAT.JPG \
+                else 1
+        self._batch_size = configuration.batch_size
+        self._num_workers = configuration.num_workers
+        self._progress_every = max(configuration.progress_every, 1)
 
     @staticmethod
     def align_image(
@@ -82,16 +108,59 @@ class Aligner:
         alignment = np.copy(alignment) * image_size
         alignment[:, 2] += padding
         new_size = int(image_size + padding * 2)
-        warped = cv.warpAffine(
+        # padded image is scaled down to the `image_size` by the same warp
+        # instead of the separate resize
+        alignment *= image_size / new_size
+        return cv.warpAffine(
             image,
             alignment,
-            (new_size, new_size),
-        )
-        return cv.resize(
-            warped,
             (image_size, image_size),
-            cv.INTER_CUBIC,
+            flags=cv.INTER_LINEAR,
+        )
+
+    def _report_progress(
+        self,
+        job_type: JOB_TYPE,
+        job_name: str,
+        idx: int,
+        total: int,
+    ) -> None:
+        """Reports progress of the job only every `progress_every` items and
+        for the last item, so the gui isn't flooded by messages.
+        """
+        if self._message_worker_sig is None:
+            return
+        last = idx == total - 1
+        if idx % self._progress_every != 0 and not last:
+            return
+        job_prog_msg = Message(
+            MESSAGE_TYPE.ANSWER,
+            MESSAGE_STATUS.OK,
+            SIGNAL_OWNER.IMAGE_VIEWER,
+            SIGNAL_OWNER.JOB_PROGRESS,
+            Body(
+                job_type,
+                {
+                    BODY_KEY.PART: idx,
+                    BODY_KEY.TOTAL: total,
+                    BODY_KEY.JOB_NAME: job_name,
+                },
+                last,
+            )
+        )
+        self._message_worker_sig.emit(job_prog_msg)
+
+    def _configure_progress(self, job_name: JOB_NAME, total: int) -> None:
+        if self._message_worker_sig is None:
+            return
+        conf_wgt_msg = Messages.CONFIGURE_WIDGET(
+            SIGNAL_OWNER.ALIGNER,
+            WIDGET.JOB_PROGRESS,
+            'setMaximum',
+            [total],
+            job_name,
         )
+        self._message_worker_sig.emit(conf_wgt_msg)
 
     def align_landmarks(self) -> None:
         """Initiates alignment process for the landmarks of `Face` objects in
@@ -126,15 +195,10 @@ class Aligner:
 
         metadata_paths = get_file_paths_from_dir(self._metadata_path, ['p'])
 
-        if self._message_worker_sig is not None:
-            conf_wgt_msg = Messages.CONFIGURE_WIDGET(
-                SIGNAL_OWNER.ALIGNER,
-                WIDGET.JOB_PROGRESS,
-                'setMaximum',
-                [len(metadata_paths)],
-                JOB_NAME.ALIGNING_LANDMARKS,
-            )
-            self._message_worker_sig.emit(conf_wgt_msg)
+        self._configure_progress(
+            JOB_NAME.ALIGNING_LANDMARKS,
+            len(metadata_paths),
+        )
 
         for idx, m_p in enumerate(tqdm(metadata_paths, desc="Images done")):
             face = FaceSerializer.load(m_p)
@@ -151,24 +215,88 @@ class Aligner:
             dots = np.divide(dots.reshape(-1, 2), scale).astype(int)
             aligned_landmarks.add(face.name, dots)
 
-            if self._message_worker_sig is not None:
-                job_prog_msg = Message(
-                    MESSAGE_TYPE.ANSWER,
-                    MESSAGE_STATUS.OK,
-                    SIGNAL_OWNER.IMAGE_VIEWER,
-                    SIGNAL_OWNER.JOB_PROGRESS,
-                    Body(
-                        JOB_TYPE.LANDMARK_ALIGNMENT,
-                        {
-                            BODY_KEY.PART: idx,
-                            BODY_KEY.TOTAL: len(metadata_paths),
-                            BODY_KEY.JOB_NAME: 'landmark alignment'
-                        },
-                        idx == len(metadata_paths) - 1,
-                    )
-                )
-                self._message_worker_sig.emit(job_prog_msg)
+            self._report_progress(
+                JOB_TYPE.LANDMARK_ALIGNMENT,
+                'landmark alignment',
+                idx,
+                len(metadata_paths),
+            )
 
         aligned_landmarks.save(
             self._metadata_path / f'aligned_landmarks_{self._face_size}.json'
         )
+
+    def align_faces(
+        self,
+        output_directory: Optional[Path] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> int:
+        """Exports aligned faces of all `Face` objects in the directory from
+        the configuration as images of the size `face_size`.
+        `alignments.json` file must be present in the input directory.
+
+        Faces are loaded in batches by the thread pool and aligned images
+        are encoded and written by the other threads while the next batch
+        is aligned.
+
+        Args:
+            output_directory (Optional[Path], optional): where aligned faces
+                are saved, by default `aligned_<face_size>` directory in the
+                metadata directory
+            should_stop (Optional[Callable[[], bool]], optional): checked
+                before every batch, export stops if it returns True, by
+                default None
+
+        Returns:
+            int: number of exported faces
+        """
+        alignments_path = self._metadata_path / 'alignments.json'
+        if not os.path.exists(alignments_path):
+            logger.error(
+                'alignments.json file does not exist on location: ' +
+                f'{str(self._metadata_path)}.'
+            )
+            return 0
+        alignments = Dictionary.load(alignments_path)
+
+        if output_directory is None:
+            output_directory = self._metadata_path / \
+                f'aligned_{self._face_size}'
+        output_directory = Path(output_directory)
+        output_directory.mkdir(parents=True, exist_ok=True)
+
+        metadata_paths = get_file_paths_from_dir(self._metadata_path, ['p'])
+        total = len(metadata_paths)
+        self._configure_progress(JOB_NAME.ALIGNING_FACES, total)
+
+        ext = '.' + self._image_format.value
+        params = imwrite_params(self._image_format, self._quality)
+        idx = 0
+        with ThreadPoolExecutor(self._num_workers) as loader, \
+                AsyncImageWriter(
+                    self._num_workers,
+                    self._batch_size * 2,
+                ) as writer:
+            for batch in batchify(metadata_paths, self._batch_size):
+                if should_stop is not None and should_stop():
+                    logger.info('Face alignment stopped.')
+                    break
+                for face in loader.map(FaceSerializer.load, batch):
+                    aligned = Aligner.align_image(
+                        face.raw_image.data,
+                        alignments[face.name],
+                        self._face_size,
+                    )
+                    writer.write(
+                        output_directory / (Path(face.name).stem + ext),
+                        aligned,
+                        params,
+                    )
+                    self._report_progress(
+                        JOB_TYPE.FACE_ALIGNMENT,
+                        'face alignment',
+                        idx,
+                        total,
+                    )
+                    idx += 1
+        return idx
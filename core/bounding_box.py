@@ -7,6 +7,8 @@ class BoundingBox:
     represent lower right corner of the image.
     """
 
+    __slots__ = ('_x1', '_y1', '_x2', '_y2')
+
     def __init__(self, x1: int, y1: int, x2: int, y2: int) -> None:
         """Constructor.
 
@@ -42,3 +44,11 @@ class BoundingBox:
 
     def __repr__(self):
         return f'{self.upper_left} - {self.lower_right}'
+
+    def __getstate__(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state: dict) -> None:
+        # bounding boxes pickled before slots have the same dict state
+        for slot, value in state.items():
+            setattr(self, slot, value)
@@ -0,0 +1,319 @@
+"""Background checkpoint writing.
+
+Saving a checkpoint inline stalls training for the whole serialization and
+disk write. `CheckpointWriter` only copies the state to the CPU in the
+calling thread and leaves pickling and writing to its own thread. Files are
+written to a temporary file first and atomically renamed, so an interrupted
+write never leaves a truncated checkpoint. Saves to the same path which are
+still waiting for the writer are coalesced, only the newest state is
+written, which makes frequent best-so-far saves cheap.
+
+`AppendOnlyLog` replaces re-pickling of ever growing lists of losses, every
+row is appended to the CSV file once.
+"""
+from collections import OrderedDict
+import csv
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any, BinaryIO, Callable, List, Optional, Sequence, Union
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+SaveFn = Callable[[Any, BinaryIO], None]
+
+
+def snapshot(state: Any, reuse: Any = None) -> Any:
+    """Copies all tensors of the nested state (dicts, lists, tuples) to the
+    CPU, so training can continue changing the originals. Other values are
+    shared with the original state.
+
+    Parameters
+    ----------
+    state : Any
+        state to copy, usually dict with state dicts of models and
+        optimizers
+    reuse : Any, optional
+        previous snapshot of the state with the same structure whose tensors
+        are overwritten in place instead of allocating the new ones, by
+        default None
+
+    Returns
+    -------
+    Any
+        copy of the state with tensors on the CPU
+    """
+    if isinstance(state, torch.Tensor):
+        state = state.detach()
+        if isinstance(reuse, torch.Tensor) and \
+                reuse.shape == state.shape and reuse.dtype == state.dtype:
+            return reuse.copy_(state)
+        return state.to('cpu', copy=True)
+    if isinstance(state, dict):
+        if not isinstance(reuse, dict):
+            reuse = {}
+        return type(state)(
+            (k, snapshot(v, reuse.get(k))) for k, v in state.items()
+        )
+    if isinstance(state, (list, tuple)):
+        if not isinstance(reuse, (list, tuple)) or len(reuse) != len(state):
+            reuse = [None] * len(state)
+        copied = [snapshot(v, r) for v, r in zip(state, reuse)]
+        return copied if isinstance(state, list) else type(state)(copied)
+    return state
+
+
+def atomic_save(
+    state: Any,
+    path: Union[str, Path],
+    save_fn: SaveFn = torch.save,
+) -> None:
+    """Writes state to the temporary file next to the `path` and renames it
+    to the `path`, readers see either old or new file, never partial one.
+
+    Parameters
+    ----------
+    state : Any
+        state to save
+    path : Union[str, Path]
+        destination path
+    save_fn : SaveFn, optional
+        function which serializes state to the opened binary file, by
+        default torch.save
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        save_fn(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _PendingSave:
+
+    def __init__(
+        self,
+        state: Any,
+        save_fn: SaveFn,
+        callback: Optional[Callable[[Path], None]],
+    ) -> None:
+        self.state = state
+        self.save_fn = save_fn
+        self.callback = callback
+
+
+class CheckpointWriter:
+    """Writes checkpoints in the background thread.
+
+    Parameters
+    ----------
+    name : str, optional
+        name of the writer thread, by default 'checkpoint_writer'
+    """
+
+    def __init__(self, name: str = 'checkpoint_writer') -> None:
+        self._pending: 'OrderedDict[Path, _PendingSave]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._written = 0
+        self._coalesced = 0
+        self._thread = threading.Thread(
+            target=self._run,
+            name=name,
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def written(self) -> int:
+        """Number of the checkpoints written so far."""
+        return self._written
+
+    @property
+    def coalesced(self) -> int:
+        """Number of the saves replaced by the newer save of the same path
+        before they were written."""
+        return self._coalesced
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Writing checkpoint failed.') from error
+
+    def save(
+        self,
+        state: Any,
+        path: Union[str, Path],
+        save_fn: SaveFn = torch.save,
+        callback: Optional[Callable[[Path], None]] = None,
+    ) -> None:
+        """Schedules writing of the state. State is copied to the CPU before
+        this function returns, so models and optimizers can be changed
+        right away. If save to the same path is still waiting, it's replaced
+        and its CPU buffers are reused.
+
+        Parameters
+        ----------
+        state : Any
+            state to save
+        path : Union[str, Path]
+            destination path
+        save_fn : SaveFn, optional
+            function which serializes state to the opened binary file, by
+            default torch.save
+        callback : Optional[Callable[[Path], None]], optional
+            called from the writer thread with the path after the file is
+            written, by default None
+        """
+        path = Path(path)
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise RuntimeError('Checkpoint writer is closed.')
+            previous = self._pending.pop(path, None)
+        # copying happens outside of the lock so the writer isn't blocked,
+        # popped save can't be taken by the writer anymore
+        state = snapshot(
+            state,
+            previous.state if previous is not None else None,
+        )
+        with self._cond:
+            if previous is not None:
+                self._coalesced += 1
+            self._pending[path] = _PendingSave(state, save_fn, callback)
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                path, pending = self._pending.popitem(last=False)
+                self._writing += 1
+            try:
+                atomic_save(pending.state, path, pending.save_fn)
+                self._written += 1
+                if pending.callback is not None:
+                    pending.callback(path)
+            except BaseException as e:
+                logger.error(f'Failed to write checkpoint {str(path)}: {e}.')
+                self._error = e
+            finally:
+                with self._cond:
+                    self._writing -= 1
+                    self._cond.notify_all()
+
+    def flush(self) -> None:
+        """Waits until all scheduled checkpoints are written.
+
+        Raises
+        ------
+        RuntimeError
+            if any of the writes failed
+        """
+        with self._cond:
+            while self._pending or self._writing:
+                self._cond.wait()
+            self._raise_error()
+
+    def close(self) -> None:
+        """Writes remaining checkpoints and stops the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._cond:
+            self._raise_error()
+
+    def __enter__(self) -> 'CheckpointWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class AppendOnlyLog:
+    """CSV log where every row is appended once instead of rewriting whole
+    history.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        path of the CSV file
+    columns : Sequence[str]
+        column names, written as header of the new file
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        columns: Sequence[str],
+    ) -> None:
+        self._path = Path(path)
+        self._columns = list(columns)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        new_file = not self._path.exists() or self._path.stat().st_size == 0
+        self._file = open(self._path, 'a', newline='', buffering=1)
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(self._columns)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def append(self, row: Sequence[Any]) -> None:
+        self._writer.writerow(row)
+
+    def read(self) -> List[List[float]]:
+        """Reads all rows of the log, values are parsed as floats.
+
+        Returns
+        -------
+        List[List[float]]
+            rows without header
+        """
+        self._file.flush()
+        with open(self._path, newline='') as f:
+            rows = list(csv.reader(f))[1:]
+        return [[float(v) for v in row] for row in rows]
+
+    def truncate(self, n_rows: int) -> None:
+        """Keeps only the first `n_rows` rows, used when resuming from the
+        checkpoint older than the log.
+
+        Parameters
+        ----------
+        n_rows : int
+            number of rows to keep
+        """
+        rows = self.read()
+        if len(rows) <= n_rows:
+            return
+        self._file.close()
+        with open(self._path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self._columns)
+            writer.writerows(rows[:n_rows])
+        self._file = open(self._path, 'a', newline='', buffering=1)
+        self._writer = csv.writer(self._file)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'AppendOnlyLog':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
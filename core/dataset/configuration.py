@@ -27,8 +27,9 @@ class DatasetConfiguration:
         transformations for the dataset, by default None
     shuffle : bool
         should the dataset be shuffled, by default True
-    num_workers : int
-        number of threads used for dataset loading, by default 2
+    num_workers : Optional[int]
+        number of processes used for dataset loading, if not provided, sized
+        from the CPU count, by default None
     """
 
     def __init__(
@@ -41,7 +42,7 @@ class DatasetConfiguration:
         image_augmentations: List[Callable] = field(),
         data_transforms: Optional[transforms.Compose] = None,
         shuffle: bool = True,
-        num_workers: int = 2,
+        num_workers: Optional[int] = None,
     ) -> None:
         if isinstance(path_A, str):
             path_A = Path(path_A)
@@ -90,5 +91,5 @@ class DatasetConfiguration:
         return self._shuffle
 
     @property
-    def num_workers(self) -> int:
+    def num_workers(self) -> Optional[int]:
         return self._num_workers
@@ -103,12 +103,20 @@ class DeepfakeDataset(Dataset):
     def _load_paths(self) -> None:
         """Generates file paths for both A and B metadata files.
         """
-        self._paths_A = get_file_paths_from_dir(self._path_A, ['p'])
+        self._paths_A = get_file_paths_from_dir(
+            self._path_A,
+            ['p'],
+            use_cache=True,
+        )
         logger.info(
             f'Found {len(self._paths_A)} images for person A in ' +
             f'directory {str(self._path_A)}.'
         )
-        self._paths_B = get_file_paths_from_dir(self._path_B, ['p'])
+        self._paths_B = get_file_paths_from_dir(
+            self._path_B,
+            ['p'],
+            use_cache=True,
+        )
         logger.info(
             f'Found {len(self._paths_B)} images for person B in ' +
             f'directory {str(self._path_B)}.'
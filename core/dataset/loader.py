@@ -0,0 +1,168 @@
+"""Data loaders which are built once and reused for the whole training.
+
+Worker processes are expensive to start, so loaders made here keep their
+workers alive between epochs. Datasets which need new random content every
+epoch, like real and fake pairs of the MRI-GAN, do it through the sampler
+instead of being recreated.
+"""
+import os
+import platform
+from typing import Dict, Iterator, Optional, Sequence
+
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+
+def default_num_workers(max_workers: int = 8, reserved: int = 2) -> int:
+    """Number of loader workers for this machine, some CPUs are left for
+    the training loop and the GUI.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        upper limit of workers, by default 8
+    reserved : int, optional
+        number of CPUs not used by workers, by default 2
+
+    Returns
+    -------
+    int
+        number of workers, 0 if data should be loaded in the main process
+    """
+    cpu_count = os.cpu_count() or 1
+    return max(0, min(max_workers, cpu_count - reserved))
+
+
+def make_loader(
+    dataset: Dataset,
+    batch_size: int,
+    shuffle: bool = False,
+    sampler: Optional[Sampler] = None,
+    num_workers: Optional[int] = None,
+    pin_memory: Optional[bool] = None,
+    drop_last: bool = False,
+    prefetch_factor: int = 2,
+) -> DataLoader:
+    """Constructs `DataLoader` with persistent workers, so iterating over
+    it again in the next epoch doesn't spawn new processes.
+
+    Parameters
+    ----------
+    dataset : Dataset
+        dataset to load
+    batch_size : int
+        batch size
+    shuffle : bool, optional
+        should data be reshuffled every epoch, ignored if `sampler` is
+        provided, by default False
+    sampler : Optional[Sampler], optional
+        sampler which picks indices of the dataset, by default None
+    num_workers : Optional[int], optional
+        number of worker processes, if not provided, sized from the CPU
+        count, by default None
+    pin_memory : Optional[bool], optional
+        should batches be put in the page-locked memory, by default if CUDA
+        is available
+    drop_last : bool, optional
+        drop last incomplete batch, by default False
+    prefetch_factor : int, optional
+        number of batches loaded in advance by each worker, by default 2
+
+    Returns
+    -------
+    DataLoader
+        data loader
+    """
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    kwargs: Dict = {}
+    if num_workers > 0:
+        kwargs['persistent_workers'] = True
+        kwargs['prefetch_factor'] = prefetch_factor
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle if sampler is None else False,
+        sampler=sampler,
+        num_workers=num_workers,
+        pin_memory=pin_memory,
+        drop_last=drop_last,
+        **kwargs,
+    )
+
+
+def main_process_loading() -> bool:
+    """Whether loaders created from the Qt worker threads have to load data
+    in the main process. Workers are started with spawn on Windows which
+    fails to pickle datasets holding Qt objects.
+    """
+    return platform.system() == 'Windows'
+
+
+class RealFakePairSampler(Sampler):
+    """Samples all real items and the same number of randomly picked fake
+    items, shuffled together. New fake items are picked every time sampler
+    is iterated, i.e. every epoch, so dataset can contain all fake items and
+    doesn't have to be rebuilt to balance the classes.
+
+    Parameters
+    ----------
+    real_indices : Sequence[int]
+        indices of the real items in the dataset
+    fake_indices : Sequence[int]
+        indices of the fake items in the dataset
+    seed : Optional[int], optional
+        seed of the sampling, random if not provided, by default None
+    """
+
+    def __init__(
+        self,
+        real_indices: Sequence[int],
+        fake_indices: Sequence[int],
+        seed: Optional[int] = None,
+    ) -> None:
+        self._real = torch.as_tensor(list(real_indices), dtype=torch.long)
+        self._fake = torch.as_tensor(list(fake_indices), dtype=torch.long)
+        self._n_fake = min(len(self._real), len(self._fake))
+        self._generator = torch.Generator()
+        if seed is None:
+            self._generator.seed()
+        else:
+            self._generator.manual_seed(seed)
+
+    def __iter__(self) -> Iterator[int]:
+        fake_perm = torch.randperm(len(self._fake), generator=self._generator)
+        fake = self._fake[fake_perm[:self._n_fake]]
+        indices = torch.cat([self._real, fake])
+        perm = torch.randperm(len(indices), generator=self._generator)
+        return iter(indices[perm].tolist())
+
+    def __len__(self) -> int:
+        return len(self._real) + self._n_fake
+
+
+def cycle(loader: DataLoader) -> Iterator:
+    """Endless iterator over the loader, started again when exhausted.
+    Keeping one such iterator, e.g. for generation of the samples during
+    training, avoids starting the loader from the scratch every time one
+    batch is needed.
+
+    Parameters
+    ----------
+    loader : DataLoader
+        loader to iterate over
+
+    Yields
+    ------
+    Iterator
+        batches of the loader
+    """
+    while True:
+        yielded = False
+        for batch in loader:
+            yielded = True
+            yield batch
+        if not yielded:
+            return
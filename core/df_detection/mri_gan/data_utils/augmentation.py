@@ -6,6 +6,8 @@ import time
 import torch
 import random
 
+from core.df_detection.mri_gan.data_utils.utils import stream_video_frames
+
 random_setting = '$RANDOM$'
 
 
@@ -241,7 +243,8 @@ def prepare_augmentation_param(augmentation, augmentation_param, frame_num, res)
 
 
 def apply_augmentation_to_videofile(input_video_filename, output_video_filename, augmentation=None,
-                                    augmentation_param=None, save_intermdt_files=False, test_mode=False):
+                                    augmentation_param=None, save_intermdt_files=False, test_mode=False,
+                                    num_workers=None, intermdt_jpeg_quality=100):
     """
     This is main driver API to apply augmentation to the input video
     :param input_video_filename: input file
@@ -250,6 +253,8 @@ def apply_augmentation_to_videofile(input_video_filename, output_video_filename,
     :param augmentation_param: params
     :param save_intermdt_files: save each frames as image
     :param test_mode: Dont process video, just for testing
+    :param num_workers: threads applying augmentation to frames, number of CPUs by default
+    :param intermdt_jpeg_quality: JPEG quality of the saved frames
     :return: updated augmentation_param for logging
     """
     # t = time.time()
@@ -261,11 +266,10 @@ def apply_augmentation_to_videofile(input_video_filename, output_video_filename,
         raise Exception("Unknown augmentation supplied")
 
     capture = cv2.VideoCapture(input_video_filename)
-    frames_num = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
     org_height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
     org_width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
     res = (org_width, org_height)
-    org_fps = int(capture.get(cv2.CAP_PROP_FPS))
+    capture.release()
 
     if augmentation_param is None:
         augmentation_param = dict()
@@ -279,28 +283,19 @@ def apply_augmentation_to_videofile(input_video_filename, output_video_filename,
     if save_intermdt_files:
         os.makedirs(out_images_path, exist_ok=True)
 
-    frames = list()
     if not test_mode:
-        for i in range(frames_num):
-            capture.grab()
-            success, frame = capture.retrieve()
-            if not success:
-                continue
-            augmentation_param = prepare_augmentation_param(augmentation, augmentation_param, i, res)
-            if augmentation == 'rescale':
-                res = augmentation_param['res']
-            frame = augmentation_func(image=frame, augmentation_param=augmentation_param)
-
-            if save_intermdt_files:
-                out_image_name = os.path.join(out_images_path, "{}.jpg".format(i))
-                # print(f'saving {out_image_name}')
-                cv2.imwrite(out_image_name, frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
-
-            frames.append(frame)
-
-        create_video_from_images(frames, output_video_filename, fps=org_fps, res=res)
-    # print('Done in', (time.time() - t))
-    # print(output_video_filename)
+        # frames are streamed from the reader through the thread pool to the encoder, so memory doesn't depend on
+        # the video length, params are prepared in order because they can change from frame to frame
+        stream_video_frames(
+            input_video_filename,
+            output_video_filename,
+            augmentation_func,
+            lambda param, frame_num: prepare_augmentation_param(augmentation, param, frame_num, res),
+            augmentation_param,
+            intermediate_dir=out_images_path if save_intermdt_files else None,
+            intermediate_params=[cv2.IMWRITE_JPEG_QUALITY, intermdt_jpeg_quality],
+            num_workers=num_workers,
+        )
     augmentation_param['input_file'] = input_video_filename
     augmentation_param['out_file'] = output_video_filename
     augmentation_param['augmentation'] = augmentation
@@ -6,6 +6,8 @@ import os
 import random
 import string
 
+from core.df_detection.mri_gan.data_utils.utils import stream_video_frames
+
 random_setting = '$RANDOM$'
 
 
@@ -347,7 +349,8 @@ def get_random_distractor():
 
 
 def apply_distraction_to_videofile(input_video_filename, output_video_filename, distraction=None,
-                                   distraction_param=None, save_intermdt_files=False, test_mode=False):
+                                   distraction_param=None, save_intermdt_files=False, test_mode=False,
+                                   num_workers=None, intermdt_jpeg_quality=100):
     # t = time.time()
 
     if distraction in get_supported_distraction_methods():
@@ -356,11 +359,10 @@ def apply_distraction_to_videofile(input_video_filename, output_video_filename,
         raise Exception("Unknown distraction supplied")
 
     capture = cv2.VideoCapture(input_video_filename)
-    frames_num = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
     org_height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
     org_width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
     res = (org_width, org_height)
-    org_fps = int(capture.get(cv2.CAP_PROP_FPS))
+    capture.release()
 
     if distraction_param is None:
         distraction_param = dict()
@@ -374,27 +376,19 @@ def apply_distraction_to_videofile(input_video_filename, output_video_filename,
     if save_intermdt_files:
         os.makedirs(out_images_path, exist_ok=True)
 
-    frames = list()
     if not test_mode:
-        for i in range(frames_num):
-            capture.grab()
-            success, frame = capture.retrieve()
-            if not success:
-                continue
-
-            distraction_param = prepare_distraction_param(distraction, distraction_param, i, res)
-            frame = distraction_func(image=frame, distraction_param=distraction_param)
-
-            if save_intermdt_files:
-                out_image_name = os.path.join(out_images_path, "{}.jpg".format(i))
-                # print(f'saving {out_image_name}')
-                cv2.imwrite(out_image_name, frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
-
-            frames.append(frame)
-
-        create_video_from_images(frames, output_video_filename, fps=org_fps, res=res)
-    # print('Done in', (time.time() - t))
-    # print(output_video_filename)
+        # frames are streamed from the reader through the thread pool to the encoder, so memory doesn't depend on
+        # the video length, params are prepared in order because they can change from frame to frame
+        stream_video_frames(
+            input_video_filename,
+            output_video_filename,
+            distraction_func,
+            lambda param, frame_num: prepare_distraction_param(distraction, param, frame_num, res),
+            distraction_param,
+            intermediate_dir=out_images_path if save_intermdt_files else None,
+            intermediate_params=[cv2.IMWRITE_JPEG_QUALITY, intermdt_jpeg_quality],
+            num_workers=num_workers,
+        )
     distraction_param['input_file'] = input_video_filename
     distraction_param['out_file'] = output_video_filename
     distraction_param['distraction'] = distraction
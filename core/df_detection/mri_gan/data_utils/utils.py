@@ -1,50 +1,370 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 import json
 from glob import glob
+import logging
 import os
 from pathlib import Path
+import queue
 import re
-from typing import List, Match, Tuple, Union
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Match,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import cv2 as cv
+import numpy as np
 import pandas as pd
 from configs.mri_gan_config import MRIGANConfig
 
 from core.df_detection.mri_gan.utils import ConfigParser
+from core.image.writer import AsyncImageWriter
+from utils import get_dir_paths_from_dir, scan_dir
 from variables import SUPPORTED_VIDEO_EXTS
 
+logger = logging.getLogger(__name__)
+
+
+_END_OF_STREAM = None
+
+
+def stream_video_frames(
+    input_video_filename: Union[str, Path],
+    output_video_filename: Union[str, Path],
+    frame_func: Callable[..., np.ndarray],
+    prepare_param: Callable[[Dict[str, Any], int], Dict[str, Any]],
+    param: Dict[str, Any],
+    intermediate_dir: Optional[Union[str, Path]] = None,
+    intermediate_params: Optional[List[int]] = None,
+    num_workers: Optional[int] = None,
+    queue_size: int = 32,
+    fourcc: str = 'mp4v',
+) -> int:
+    """Streams video frames through `frame_func` into the new video.
+
+    Frames are read and parameters prepared in the calling thread, because
+    preparation is stateful (e.g. rolling text moves from frame to frame).
+    Every frame is then processed in the thread pool with its own copy of
+    the parameters and the encoder thread writes processed frames in the
+    original order. At most `queue_size` frames are in flight, so memory
+    does not depend on the video length.
+
+    Parameters
+    ----------
+    input_video_filename : Union[str, Path]
+        video which is processed
+    output_video_filename : Union[str, Path]
+        where the processed video is saved
+    frame_func : Callable[..., np.ndarray]
+        function called as `frame_func(frame, param)` which returns
+        processed frame
+    prepare_param : Callable[[Dict[str, Any], int], Dict[str, Any]]
+        function called as `prepare_param(param, frame_num)` before every
+        frame, returns parameters for that frame
+    param : Dict[str, Any]
+        initial parameters
+    intermediate_dir : Optional[Union[str, Path]], optional
+        if provided, every processed frame is also saved to this directory
+        as `<frame_num>.jpg`, by default None
+    intermediate_params : Optional[List[int]], optional
+        OpenCV `imwrite` parameters of the intermediate frames, by default
+        JPEG quality 95
+    num_workers : Optional[int], optional
+        number of threads processing frames, if not provided, number of
+        CPUs is used, by default None
+    queue_size : int, optional
+        maximal number of frames in flight, by default 32
+    fourcc : str, optional
+        codec of the output video, by default 'mp4v'
+
+    Returns
+    -------
+    int
+        number of frames written
+    """
+    capture = cv.VideoCapture(str(input_video_filename))
+    frames_num = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+    fps = int(capture.get(cv.CAP_PROP_FPS))
+    if intermediate_dir is not None:
+        os.makedirs(intermediate_dir, exist_ok=True)
+    if intermediate_params is None:
+        intermediate_params = [cv.IMWRITE_JPEG_QUALITY, 95]
+
+    frames_q: queue.Queue = queue.Queue(queue_size)
+    encoder_state = {'written': 0, 'error': None}
+
+    def _encode() -> None:
+        # output resolution is known only after the first frame is processed
+        # because some functions change it, e.g. rescale
+        video = None
+        writer = None
+        if intermediate_dir is not None:
+            writer = AsyncImageWriter()
+        try:
+            while True:
+                item = frames_q.get()
+                if item is _END_OF_STREAM:
+                    break
+                frame_num, future = item
+                frame = future.result()
+                if video is None:
+                    video = cv.VideoWriter(
+                        str(output_video_filename),
+                        cv.VideoWriter_fourcc(*fourcc),
+                        fps,
+                        (frame.shape[1], frame.shape[0]),
+                        frame.ndim == 3,
+                    )
+                video.write(frame)
+                if writer is not None:
+                    writer.write(
+                        Path(intermediate_dir) / f'{frame_num}.jpg',
+                        frame,
+                        intermediate_params,
+                    )
+                encoder_state['written'] += 1
+        except Exception as e:
+            encoder_state['error'] = e
+            # drain the queue so the reader doesn't block
+            while frames_q.get() is not _END_OF_STREAM:
+                pass
+        finally:
+            if video is not None:
+                video.release()
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception as e:
+                    if encoder_state['error'] is None:
+                        encoder_state['error'] = e
+
+    encoder = threading.Thread(target=_encode, daemon=True)
+    encoder.start()
+    num_workers = num_workers or os.cpu_count() or 1
+    try:
+        with ThreadPoolExecutor(num_workers) as executor:
+            try:
+                for i in range(frames_num):
+                    if encoder_state['error'] is not None:
+                        break
+                    capture.grab()
+                    success, frame = capture.retrieve()
+                    if not success:
+                        continue
+                    # every frame gets snapshot of the parameters as they
+                    # are prepared sequentially while earlier frames are
+                    # still processed
+                    frame_param = dict(prepare_param(param, i))
+                    future: Future = executor.submit(
+                        frame_func,
+                        frame,
+                        frame_param,
+                    )
+                    frames_q.put((i, future))
+            finally:
+                # encoder always finishes and releases the output video,
+                # even if reading or preparing of the frame failed
+                frames_q.put(_END_OF_STREAM)
+                encoder.join()
+    finally:
+        capture.release()
+
+    if encoder_state['error'] is not None:
+        raise encoder_state['error']
+    return encoder_state['written']
+
+
+@dataclass
+class VideoIOStats:
+    """Throughput of the video encoding or frame extraction."""
+    frames: int = 0
+    elapsed: float = 0.
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.
+
+
+def _read_image(image: Union[np.ndarray, str, Path]) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        return image
+    frame = cv.imread(str(image), cv.IMREAD_COLOR)
+    if frame is None:
+        raise IOError(f'Unable to read image: {str(image)}.')
+    return frame
+
+
+def prefetch_images(
+    images: Iterable[Union[np.ndarray, str, Path]],
+    num_workers: int = 4,
+    prefetch: int = 16,
+) -> Iterator[np.ndarray]:
+    """Decodes images in a thread pool ahead of the consumer, images are
+    yielded in the original order and at most `prefetch` of them are
+    decoded but not consumed yet.
+
+    Parameters
+    ----------
+    images : Iterable[Union[np.ndarray, str, Path]]
+        image paths, arrays are passed through
+    num_workers : int, optional
+        number of decoding threads, by default 4
+    prefetch : int, optional
+        how many images are decoded ahead, by default 16
+
+    Yields
+    ------
+    Iterator[np.ndarray]
+        decoded images
+    """
+    with ThreadPoolExecutor(num_workers) as executor:
+        pending = deque()
+        for image in images:
+            pending.append(executor.submit(_read_image, image))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
 def create_video_from_images(
-    images,
-    output_video_filename,
-    fps=30,
-    res=(
-        1920,
-        1080)):
+    images: Iterable[Union[np.ndarray, str, Path]],
+    output_video_filename: Union[str, Path],
+    fps: int = 30,
+    res: Tuple[int, int] = (1920, 1080),
+    fourcc: str = 'mp4v',
+    num_workers: int = 4,
+    prefetch: int = 16,
+) -> VideoIOStats:
+    """Encodes images into the video. Images can be passed as arrays or as
+    paths, paths are decoded in a thread pool ahead of the encoder.
+
+    Parameters
+    ----------
+    images : Iterable[Union[np.ndarray, str, Path]]
+        frames of the video or paths of the frames
+    output_video_filename : Union[str, Path]
+        where video is saved, extension determines the container
+    fps : int, optional
+        frames per second of the video, by default 30
+    res : Tuple[int, int], optional
+        width and height of the video, by default (1920, 1080)
+    fourcc : str, optional
+        codec of the video, e.g. 'mp4v', 'avc1' or 'MJPG', by default
+        'mp4v'
+    num_workers : int, optional
+        number of decoding threads, by default 4
+    prefetch : int, optional
+        how many frames are decoded ahead of the encoder, by default 16
+
+    Returns
+    -------
+    VideoIOStats
+        number of encoded frames and encoding speed
+    """
+    stats = VideoIOStats()
+    start = time.perf_counter()
     video = cv.VideoWriter(
-        output_video_filename,
-        cv.VideoWriter_fourcc(
-            *"mp4v"),
+        str(output_video_filename),
+        cv.VideoWriter_fourcc(*fourcc),
         fps,
-        res)
-    for image in images:
-        video.write(image)
-    video.release()
-
-
-def extract_images_from_video(input_video_filename, output_folder, res=None):
+        res,
+    )
+    try:
+        for image in prefetch_images(images, num_workers, prefetch):
+            video.write(image)
+            stats.frames += 1
+    finally:
+        video.release()
+    stats.elapsed = time.perf_counter() - start
+    logger.debug(
+        f'Encoded {stats.frames} frames to {str(output_video_filename)} ' +
+        f'at {stats.fps:.2f} fps.'
+    )
+    return stats
+
+
+def extract_images_from_video(
+    input_video_filename: Union[str, Path],
+    output_folder: Union[str, Path],
+    res: Optional[Tuple[int, int]] = None,
+    image_format: str = 'jpg',
+    image_params: Optional[List[int]] = None,
+    num_workers: int = 2,
+    max_in_flight: int = 64,
+) -> VideoIOStats:
+    """Saves every frame of the video as an image. Frames are encoded and
+    written in a thread pool while the next frames are decoded.
+
+    Parameters
+    ----------
+    input_video_filename : Union[str, Path]
+        video from which frames are extracted
+    output_folder : Union[str, Path]
+        where frames are saved as `<frame_num>.<image_format>`
+    res : Optional[Tuple[int, int]], optional
+        if provided, frames are resized to this width and height, by
+        default None
+    image_format : str, optional
+        format of the saved frames, by default 'jpg'
+    image_params : Optional[List[int]], optional
+        OpenCV `imwrite` parameters, by default JPEG quality 100
+    num_workers : int, optional
+        number of writer threads, by default 2
+    max_in_flight : int, optional
+        maximal number of frames waiting to be written, by default 64
+
+    Returns
+    -------
+    VideoIOStats
+        number of extracted frames and extraction speed
+    """
+    if image_params is None:
+        image_params = [cv.IMWRITE_JPEG_QUALITY, 100]
     os.makedirs(output_folder, exist_ok=True)
-    capture = cv.VideoCapture(input_video_filename)
+    stats = VideoIOStats()
+    start = time.perf_counter()
+    capture = cv.VideoCapture(str(input_video_filename))
     frames_num = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
 
-    for i in range(frames_num):
-        capture.grab()
-        success, frame = capture.retrieve()
-        if not success:
-            continue
-        out_image_name = os.path.join(output_folder, "{}.jpg".format(i))
-        if res is not None:
-            frame = cv.resize(frame, res, interpolation=cv.INTER_AREA)
-        cv.imwrite(out_image_name, frame, [cv.IMWRITE_JPEG_QUALITY, 100])
+    try:
+        with AsyncImageWriter(num_workers, max_in_flight) as writer:
+            for i in range(frames_num):
+                capture.grab()
+                success, frame = capture.retrieve()
+                if not success:
+                    continue
+                out_image_name = os.path.join(
+                    output_folder,
+                    f'{i}.{image_format}',
+                )
+                if res is not None:
+                    frame = cv.resize(
+                        frame,
+                        res,
+                        interpolation=cv.INTER_AREA,
+                    )
+                writer.write(out_image_name, frame, image_params)
+                stats.frames += 1
+    finally:
+        capture.release()
+    stats.elapsed = time.perf_counter() - start
+    logger.debug(
+        f'Extracted {stats.frames} frames from ' +
+        f'{str(input_video_filename)} at {stats.fps:.2f} fps.'
+    )
+    return stats
 
 
 """
@@ -79,18 +399,20 @@ def match_dfdc_dirs(directory: str) -> Union[Match, None]:
     return re.match(r'dfdc_(train|test|valid)_part_[0-9]+', directory)
 
 
-def filter_dfdc_dirs(dirs: List[str]) -> List[str]:
+def filter_dfdc_dirs(dirs: Iterable[str]) -> List[str]:
     matches = [match_dfdc_dirs(d) for d in dirs]
     matches = list(filter(lambda x: x is not None, matches))
     return [m.group(0) for m in matches]
 
 
+def get_dfdc_dirs(root_dir: Path) -> List[Path]:
+    """Subdirectories of `root_dir` which are DFDC dataset parts."""
+    dirs = get_dir_paths_from_dir(root_dir, use_cache=True)
+    return [root_dir / d for d in filter_dfdc_dirs(d.name for d in dirs)]
+
+
 def get_metadata_file_paths(root_dir: Path) -> List[Path]:
-    dirs = os.listdir(root_dir)
-    dirs = filter_dfdc_dirs(dirs)
-    dirs = [root_dir / d for d in dirs]
-    json_paths = [d / 'metadata.json' for d in dirs]
-    return json_paths
+    return [d / 'metadata.json' for d in get_dfdc_dirs(root_dir)]
 
 
 def get_dfdc_training_video_filepaths(root_dir: Path) -> List[Path]:
@@ -105,20 +427,9 @@ def get_dfdc_training_video_filepaths(root_dir: Path) -> List[Path]:
 
 
 def get_dfdc_valid_or_test_video_filepaths(root_dir: Path) -> List[Path]:
-    dirs = os.listdir(root_dir)
-    dirs = filter_dfdc_dirs(dirs)
-    dirs = [root_dir / d for d in dirs]
     file_paths = []
-    for d in dirs:
-        f_p = [d / v_id for v_id in os.listdir(d)]
-        file_paths.extend(
-            list(
-                filter(
-                    lambda x: x.suffix in SUPPORTED_VIDEO_EXTS,
-                    f_p,
-                )
-            )
-        )
+    for d in get_dfdc_dirs(root_dir):
+        file_paths.extend(scan_dir(d, SUPPORTED_VIDEO_EXTS))
     return file_paths
 
 # def get_dfdc_training_video_filepaths(root_dir) -> List[str]:
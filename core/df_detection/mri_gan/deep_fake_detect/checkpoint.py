@@ -3,6 +3,7 @@ import pickle
 
 import torch
 
+from core.checkpoint import atomic_save
 from core.df_detection.mri_gan.utils import ConfigParser
 
 
@@ -15,6 +16,7 @@ def save_checkpoint(
     log_dir=None,
     log_kind=None,
     amp_dict=None,
+    checkpoint_writer=None,
 ):
     model_class_name = type(model).__name__
     checkpoint_root_path = os.path.join(log_dir, log_kind)
@@ -35,7 +37,12 @@ def save_checkpoint(
         'amp': amp_dict
     }
 
-    torch.save(check_point_dict, check_point_path)
+    # with the writer, checkpoint is written in background and training
+    # continues as soon as the state is copied to the CPU
+    if checkpoint_writer is not None:
+        checkpoint_writer.save(check_point_dict, check_point_path)
+    else:
+        atomic_save(check_point_dict, check_point_path)
 
 
 def load_checkpoint(model=None, optimizer=None, check_point_path=None):
@@ -0,0 +1,199 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from torchvision.transforms import transforms
+
+from configs.app_config import APP_CONFIG
+from configs.mri_gan_config import MRIGANConfig
+from core.df_detection.mri_gan.data_utils.datasets import SimpleImageFolder
+from core.df_detection.mri_gan.deep_fake_detect.DeepFakeDetectModel import \
+    DeepFakeDetectModel
+from core.df_detection.mri_gan.deep_fake_detect.utils import (
+    ENCODER_PARAMS,
+    get_predictions,
+    get_probability,
+    pred_strategy,
+)
+from core.precision import PrecisionPolicy
+from enums import DEVICE, MRI_GAN_DATASET, OUTPUT_KEYS
+from utils import load_file_from_google_drive
+from variables import IMAGENET_MEAN, IMAGENET_STD
+
+logger = logging.getLogger(__name__)
+
+
+def _image_transforms(image_size: int):
+    return transforms.Compose(
+        [
+            transforms.Resize((image_size, image_size)),
+            transforms.ToTensor(),
+            transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+        ]
+    )
+
+
+def load_df_detector_model(
+    df_detection_model: MRI_GAN_DATASET,
+    device: DEVICE = DEVICE.CPU,
+) -> Optional[DeepFakeDetectModel]:
+    """Loads pretrained MRI GAN deepfake detector, model is downloaded from
+    Google drive if it does not exist locally.
+
+    Parameters
+    ----------
+    df_detection_model : MRI_GAN_DATASET
+        on which dataset was the detector trained
+    device : DEVICE, optional
+        device where model is loaded, by default DEVICE.CPU
+
+    Returns
+    -------
+    Optional[DeepFakeDetectModel]
+        model in eval mode or `None` if model type is not supported
+    """
+    submodels = APP_CONFIG.app.core.df_detection.models.mri_gan.submodels
+    if df_detection_model == MRI_GAN_DATASET.MRI:
+        model_id = submodels.mri_gan_df_detector.gd_id
+    elif df_detection_model == MRI_GAN_DATASET.PLAIN:
+        model_id = submodels.plain_df_detector.gd_id
+    else:
+        logger.error('Unsupported model for MRI GAN deepfake detector.')
+        return None
+
+    model_path = load_file_from_google_drive(
+        model_id,
+        f'{df_detection_model.value.lower()}.chkpt',
+    )
+
+    logger.debug(f'Loading df detector model to: {device.value}.')
+    model_dict = torch.load(
+        model_path,
+        map_location=torch.device(device.value),
+    )
+    model_params = model_dict['model_params']
+    model = DeepFakeDetectModel(
+        model_params['imsize'],
+        model_params['encoder_name'],
+    )
+    model.load_state_dict(model_dict['model_state_dict'], False)
+    model = model.to(device.value)
+    model.eval()
+    logger.debug('Model loaded.')
+    return model
+
+
+def predict_video(
+    model: DeepFakeDetectModel,
+    frames_dir: Path,
+    fake_threshold: float,
+    fake_fraction: float,
+    batch_size: int,
+    num_workers: int,
+    device: DEVICE = DEVICE.CPU,
+    precision_policy: Optional[PrecisionPolicy] = None,
+) -> Dict[OUTPUT_KEYS, Any]:
+    """Classifies every face frame of the video in `frames_dir` and
+    aggregates frame probabilities into the prediction for the whole video.
+
+    Parameters
+    ----------
+    model : DeepFakeDetectModel
+        loaded deepfake detector
+    frames_dir : Path
+        directory with face crops (or MRIs) of one video
+    fake_threshold : float
+        probability above which the frame is considered fake
+    fake_fraction : float
+        fraction of fake frames needed to consider whole video fake
+    batch_size : int
+        batch size for the model
+    num_workers : int
+        number of data loader workers
+    device : DEVICE, optional
+        device where model is, by default DEVICE.CPU
+    precision_policy : Optional[PrecisionPolicy], optional
+        precision and memory format of the forward passes, if not provided,
+        fp32 on the `device` is used, by default None
+
+    Returns
+    -------
+    Dict[OUTPUT_KEYS, Any]
+        fake probability, real probability and the prediction
+    """
+    encoder_name = MRIGANConfig \
+        .get_instance() \
+        .get_default_cnn_encoder_name()
+    image_size = ENCODER_PARAMS[encoder_name]['imsize']
+
+    logger.debug('Constructing simple dataset.')
+    test_dataset = SimpleImageFolder(frames_dir, _image_transforms(image_size))
+    test_loader = DataLoader(
+        test_dataset,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=True,
+    )
+    logger.debug(f'Dataset constructed. Total {len(test_dataset)} frames.')
+    if precision_policy is None:
+        precision_policy = PrecisionPolicy(device)
+    precision_policy.prepare_model(model)
+    probabilities = []
+    with torch.no_grad():
+        for samples in test_loader:
+            frames = precision_policy.prepare_input(samples)
+            with precision_policy.autocast():
+                output = model(frames)
+            output = output.float()
+            predicted = get_predictions(output) \
+                .to('cpu') \
+                .detach() \
+                .numpy()
+            class_probability = get_probability(output) \
+                .to('cpu') \
+                .detach() \
+                .numpy()
+            if len(predicted) > 1:
+                probabilities.extend(class_probability.squeeze())
+            else:
+                probabilities.append(class_probability.squeeze())
+
+    total_number_frames = len(probabilities)
+    probabilities = np.array(probabilities)
+
+    fake_frames_high_prob = probabilities[probabilities >= fake_threshold]
+    number_fake_frames = len(fake_frames_high_prob)
+    if number_fake_frames == 0:
+        fake_prob = 0
+    else:
+        fake_prob = round(
+            sum(fake_frames_high_prob) / number_fake_frames,
+            4,
+        )
+
+    real_frames_high_prob = probabilities[probabilities < fake_threshold]
+    number_real_frames = len(real_frames_high_prob)
+    if number_real_frames == 0:
+        real_prob = 0
+    else:
+        real_prob = 1 - round(
+            sum(real_frames_high_prob) / number_real_frames,
+            4,
+        )
+
+    pred = pred_strategy(
+        number_fake_frames,
+        number_real_frames,
+        total_number_frames,
+        fake_fraction=fake_fraction,
+    )
+
+    # numpy scalars are converted so the output can be saved as json
+    return {
+        OUTPUT_KEYS.FAKE_PROB: float(fake_prob),
+        OUTPUT_KEYS.REAL_PROB: float(real_prob),
+        OUTPUT_KEYS.PREDICTION: int(pred),
+    }
@@ -29,6 +29,8 @@ from core.df_detection.mri_gan.deep_fake_detect.utils import (
     save_all_model_results,
 )
 from core.df_detection.mri_gan.utils import ConfigParser, print_green
+from core.checkpoint import CheckpointWriter
+from core.precision import PrecisionPolicy
 
 cv2.setNumThreads(0)
 
@@ -47,6 +49,8 @@ def train_model(log_dir=None, train_resume_checkpoint=None):
     imsize = ENCODER_PARAMS[encoder_name]["imsize"]
     model_params['encoder_name'] = encoder_name
     model_params['imsize'] = imsize
+    precision_policy = PrecisionPolicy.from_params(model_params)
+    print(f'Precision policy {precision_policy}')
 
     def gaussian_blur(img):
         return img.filter(PIL.ImageFilter.BoxBlur(random.choice([1, 2, 3])))
@@ -118,22 +122,18 @@ def train_model(log_dir=None, train_resume_checkpoint=None):
         pin_memory=True)
 
     print(f"Batch_size {model_params['batch_size']}")
-    model = DeepFakeDetectModel(
-        frame_dim=model_params['imsize'],
-        encoder_name=model_params['encoder_name'],
-    ).to(device)
+    model = precision_policy.prepare_model(
+        DeepFakeDetectModel(
+            frame_dim=model_params['imsize'],
+            encoder_name=model_params['encoder_name'],
+        )
+    )
     criterion = nn.BCEWithLogitsLoss().to(device)
     optimizer = torch.optim.Adam(
         model.parameters(),
         lr=model_params['learning_rate'],
     )
 
-    # if model_params['fp16']:
-    #     model, optimizer = amp.initialize(
-    #         model, optimizer,
-    #         opt_level=model_params['opt_level'],
-    #         loss_scale='dynamic',
-    #     )
     print(f'model params {model_params}')
     start_epoch = 0
     lowest_v_epoch_loss = float('inf')
@@ -149,8 +149,7 @@ def train_model(log_dir=None, train_resume_checkpoint=None):
             optimizer,
             train_resume_checkpoint,
         )
-        # if model_params['fp16']:
-        #     amp.load_state_dict(amp_dict)
+        precision_policy.load_state_dict(amp_dict)
         start_epoch = saved_epoch + 1
         print(f'Resuming Training from epoch {start_epoch}')
         if os.path.basename(log_dir) == 'highest_acc' or os.path.basename(
@@ -188,175 +187,121 @@ def train_model(log_dir=None, train_resume_checkpoint=None):
     tqdm_train_obj = tqdm(range(model_params['epochs']), desc=tqdm_train_descr)
 
     train_writer = SummaryWriter(log_dir=os.path.join(log_dir, 'runs'))
-
-    for e in tqdm_train_obj:
-
-        if e < start_epoch:
-            print(f"Skipping epoch {e}")
-            continue
-
-        train_valid_use_tqdm = True
-        (
-            model,
-            t_epoch_accuracy,
-            t_epoch_loss,
-            t_epoch_fake_loss,
-            t_epoch_real_loss,
-        ) = train_epoch(
-            epoch=e,
-            model=model,
-            criterion=criterion,
-            optimizer=optimizer,
-            data_loader=train_loader,
-            batch_size=model_params['batch_size'],
-            device=device,
-            log_dir=log_dir,
-            sum_writer=train_writer,
-            use_tqdm=train_valid_use_tqdm,
-            model_params=model_params,
-        )
-        model_train_accuracies.append(t_epoch_accuracy)
-        model_train_losses.append(t_epoch_loss)
-
-        tqdm_descr = tqdm_train_descr_format.format(
-            t_epoch_accuracy,
-            t_epoch_loss,
-            t_epoch_fake_loss,
-            t_epoch_real_loss,
-            0,
-            float('inf'),
-            float('inf'),
-            float('inf'),
-        )
-        tqdm_train_obj.set_description(tqdm_descr)
-        tqdm_train_obj.update()
-
-        train_writer.add_scalar('Training: loss per epoch', t_epoch_loss, e)
-        train_writer.add_scalar(
-            'Training: fake loss per epoch',
-            t_epoch_fake_loss,
-            e,
-        )
-        train_writer.add_scalar(
-            'Training: real loss per epoch',
-            t_epoch_real_loss,
-            e,
-        )
-        train_writer.add_scalar(
-            'Training: accuracy per epoch',
-            t_epoch_accuracy,
-            e,
-        )
-
-        print_green(tqdm_descr)
-        (
-            v_epoch_accuracy,
-            v_epoch_loss,
-            v_epoch_fake_loss,
-            v_epoch_real_loss,
-            all_predicted_labels,
-            all_ground_truth_labels,
-            all_filenames,
-            probabilities,
-        ) = valid_epoch(
-            epoch=e,
-            model=model,
-            criterion=criterion,
-            data_loader=valid_loader,
-            batch_size=model_params['batch_size'],
-            device=device,
-            log_dir=log_dir,
-            sum_writer=train_writer,
-            use_tqdm=train_valid_use_tqdm,
-            model_params=model_params,
-        )
-
-        model_valid_accuracies.append(v_epoch_accuracy)
-        model_valid_losses.append(v_epoch_loss)
-
-        tqdm_descr = tqdm_train_descr_format.format(
-            t_epoch_accuracy, t_epoch_loss, t_epoch_fake_loss,
-            t_epoch_real_loss, v_epoch_accuracy, v_epoch_loss,
-            v_epoch_fake_loss, v_epoch_real_loss)
-        tqdm_train_obj.set_description(tqdm_descr)
-        tqdm_train_obj.update()
-
-        train_writer.add_scalar('Validation: loss per epoch', v_epoch_loss, e)
-        train_writer.add_scalar(
-            'Validation: fake loss per epoch',
-            v_epoch_fake_loss,
-            e)
-        train_writer.add_scalar(
-            'Validation: real loss per epoch',
-            v_epoch_real_loss,
-            e)
-        train_writer.add_scalar(
-            'Validation: accuracy per epoch',
-            v_epoch_accuracy,
-            e)
-
-        print_green(tqdm_descr)
-        print(f'Saving model results at {log_dir}/latest_epoch for epoch {e}')
-        if model_params['fp16']:
-            # amp_dict = amp.state_dict()
-            amp_dict = None
-        else:
-            amp_dict = None
-        save_all_model_results(
-            model=model,
-            model_params=model_params,
-            optimizer=optimizer,
-            criterion=criterion.__class__.__name__,
-            train_losses=model_train_losses,
-            train_accuracies=model_train_accuracies,
-            valid_losses=model_valid_losses,
-            valid_accuracies=model_valid_accuracies,
-            valid_predicted=all_predicted_labels,
-            valid_ground_truth=all_ground_truth_labels,
-            valid_sample_names=all_filenames,
-            epoch=e,
-            log_dir=log_dir,
-            log_kind='latest_epoch',
-            probabilities=probabilities,
-            amp_dict=amp_dict,
-        )
-
-        if v_epoch_loss < lowest_v_epoch_loss:
-            lowest_v_epoch_loss = v_epoch_loss
-            print_green(
-                f'Saving best model (low loss) results at {log_dir}/lowest_loss for epoch {e}')
-            if model_params['fp16']:
-                amp_dict = None
-                # amp_dict = amp.state_dict()
-            else:
-                amp_dict = None
-            save_all_model_results(
+    # latest and best checkpoints are written in background, queued ones
+    # are written even if training fails
+    with CheckpointWriter() as checkpoint_writer:
+        for e in tqdm_train_obj:
+
+            if e < start_epoch:
+                print(f"Skipping epoch {e}")
+                continue
+
+            train_valid_use_tqdm = True
+            (
+                model,
+                t_epoch_accuracy,
+                t_epoch_loss,
+                t_epoch_fake_loss,
+                t_epoch_real_loss,
+            ) = train_epoch(
+                epoch=e,
                 model=model,
-                model_params=model_params,
+                criterion=criterion,
                 optimizer=optimizer,
-                criterion=criterion.__class__.__name__,
-                train_losses=model_train_losses,
-                train_accuracies=model_train_accuracies,
-                valid_losses=model_valid_losses,
-                valid_accuracies=model_valid_accuracies,
-                valid_predicted=all_predicted_labels,
-                valid_ground_truth=all_ground_truth_labels,
-                valid_sample_names=all_filenames,
+                data_loader=train_loader,
+                batch_size=model_params['batch_size'],
+                device=device,
+                log_dir=log_dir,
+                sum_writer=train_writer,
+                use_tqdm=train_valid_use_tqdm,
+                model_params=model_params,
+                precision_policy=precision_policy,
+            )
+            model_train_accuracies.append(t_epoch_accuracy)
+            model_train_losses.append(t_epoch_loss)
+
+            tqdm_descr = tqdm_train_descr_format.format(
+                t_epoch_accuracy,
+                t_epoch_loss,
+                t_epoch_fake_loss,
+                t_epoch_real_loss,
+                0,
+                float('inf'),
+                float('inf'),
+                float('inf'),
+            )
+            tqdm_train_obj.set_description(tqdm_descr)
+            tqdm_train_obj.update()
+
+            train_writer.add_scalar('Training: loss per epoch', t_epoch_loss, e)
+            train_writer.add_scalar(
+                'Training: fake loss per epoch',
+                t_epoch_fake_loss,
+                e,
+            )
+            train_writer.add_scalar(
+                'Training: real loss per epoch',
+                t_epoch_real_loss,
+                e,
+            )
+            train_writer.add_scalar(
+                'Training: accuracy per epoch',
+                t_epoch_accuracy,
+                e,
+            )
+
+            print_green(tqdm_descr)
+            (
+                v_epoch_accuracy,
+                v_epoch_loss,
+                v_epoch_fake_loss,
+                v_epoch_real_loss,
+                all_predicted_labels,
+                all_ground_truth_labels,
+                all_filenames,
+                probabilities,
+            ) = valid_epoch(
                 epoch=e,
+                model=model,
+                criterion=criterion,
+                data_loader=valid_loader,
+                batch_size=model_params['batch_size'],
+                device=device,
                 log_dir=log_dir,
-                log_kind='lowest_loss',
-                probabilities=probabilities,
-                amp_dict=amp_dict)
-
-        if highest_v_epoch_acc < v_epoch_accuracy:
-            highest_v_epoch_acc = v_epoch_accuracy
-            print_green(
-                f'Saving best model (high acc) results at {log_dir}/highest_acc for epoch {e}')
-            if model_params['fp16']:
-                amp_dict = None
-                # mp_dict = amp.state_dict()
-            else:
-                amp_dict = None
+                sum_writer=train_writer,
+                use_tqdm=train_valid_use_tqdm,
+                model_params=model_params,
+                precision_policy=precision_policy,
+            )
+
+            model_valid_accuracies.append(v_epoch_accuracy)
+            model_valid_losses.append(v_epoch_loss)
+
+            tqdm_descr = tqdm_train_descr_format.format(
+                t_epoch_accuracy, t_epoch_loss, t_epoch_fake_loss,
+                t_epoch_real_loss, v_epoch_accuracy, v_epoch_loss,
+                v_epoch_fake_loss, v_epoch_real_loss)
+            tqdm_train_obj.set_description(tqdm_descr)
+            tqdm_train_obj.update()
+
+            train_writer.add_scalar('Validation: loss per epoch', v_epoch_loss, e)
+            train_writer.add_scalar(
+                'Validation: fake loss per epoch',
+                v_epoch_fake_loss,
+                e)
+            train_writer.add_scalar(
+                'Validation: real loss per epoch',
+                v_epoch_real_loss,
+                e)
+            train_writer.add_scalar(
+                'Validation: accuracy per epoch',
+                v_epoch_accuracy,
+                e)
+
+            print_green(tqdm_descr)
+            print(f'Saving model results at {log_dir}/latest_epoch for epoch {e}')
+            # loss scale of the GradScaler, empty if policy doesn't scale losses
+            amp_dict = precision_policy.state_dict()
             save_all_model_results(
                 model=model,
                 model_params=model_params,
@@ -371,11 +316,59 @@ def train_model(log_dir=None, train_resume_checkpoint=None):
                 valid_sample_names=all_filenames,
                 epoch=e,
                 log_dir=log_dir,
-                log_kind='highest_acc',
+                log_kind='latest_epoch',
                 probabilities=probabilities,
                 amp_dict=amp_dict,
+                checkpoint_writer=checkpoint_writer,
             )
 
+            if v_epoch_loss < lowest_v_epoch_loss:
+                lowest_v_epoch_loss = v_epoch_loss
+                print_green(
+                    f'Saving best model (low loss) results at {log_dir}/lowest_loss for epoch {e}')
+                save_all_model_results(
+                    model=model,
+                    model_params=model_params,
+                    optimizer=optimizer,
+                    criterion=criterion.__class__.__name__,
+                    train_losses=model_train_losses,
+                    train_accuracies=model_train_accuracies,
+                    valid_losses=model_valid_losses,
+                    valid_accuracies=model_valid_accuracies,
+                    valid_predicted=all_predicted_labels,
+                    valid_ground_truth=all_ground_truth_labels,
+                    valid_sample_names=all_filenames,
+                    epoch=e,
+                    log_dir=log_dir,
+                    log_kind='lowest_loss',
+                    probabilities=probabilities,
+                    amp_dict=amp_dict,
+                    checkpoint_writer=checkpoint_writer)
+
+            if highest_v_epoch_acc < v_epoch_accuracy:
+                highest_v_epoch_acc = v_epoch_accuracy
+                print_green(
+                    f'Saving best model (high acc) results at {log_dir}/highest_acc for epoch {e}')
+                save_all_model_results(
+                    model=model,
+                    model_params=model_params,
+                    optimizer=optimizer,
+                    criterion=criterion.__class__.__name__,
+                    train_losses=model_train_losses,
+                    train_accuracies=model_train_accuracies,
+                    valid_losses=model_valid_losses,
+                    valid_accuracies=model_valid_accuracies,
+                    valid_predicted=all_predicted_labels,
+                    valid_ground_truth=all_ground_truth_labels,
+                    valid_sample_names=all_filenames,
+                    epoch=e,
+                    log_dir=log_dir,
+                    log_kind='highest_acc',
+                    probabilities=probabilities,
+                    amp_dict=amp_dict,
+                    checkpoint_writer=checkpoint_writer,
+                )
+
     return model, model_params, criterion, log_dir
 
 
@@ -391,7 +384,10 @@ def train_epoch(
     sum_writer=None,
     use_tqdm=False,
     model_params=None,
+    precision_policy=None,
 ):
+    if precision_policy is None:
+        precision_policy = PrecisionPolicy()
     losses = []
     fake_losses = []
     real_losses = []
@@ -414,11 +410,14 @@ def train_epoch(
         # prepare data before passing to model
         optimizer.zero_grad()
 
-        frames = samples['frame_tensor'].to(device)
+        frames = precision_policy.prepare_input(samples['frame_tensor'])
         labels = samples['label'].to(device).unsqueeze(1)
         batch_size = labels.shape[0]
 
-        output = model(frames)
+        with precision_policy.autocast():
+            output = model(frames)
+        # loss is calculated in fp32, BCE is unstable in lower precision
+        output = output.float()
         labels = labels.type_as(output)
         fake_loss = 0
         real_loss = 0
@@ -435,13 +434,9 @@ def train_epoch(
         real_loss_val = 0 if real_loss == 0 else real_loss.item()
         fake_loss_val = 0 if fake_loss == 0 else fake_loss.item()
 
-        # if model_params['fp16']:
-        #     with amp.scale_loss(batch_loss, optimizer) as scaled_loss:
-        #         scaled_loss.backward()
-        # else:
-        batch_loss.backward()
-
-        optimizer.step()
+        precision_policy.backward(batch_loss)
+        precision_policy.step(optimizer)
+        precision_policy.update()
 
         predicted = get_predictions(output).to('cpu').detach().numpy()
         labels = labels.to('cpu').detach().numpy()
@@ -489,7 +484,10 @@ def valid_epoch(
     sum_writer=None,
     use_tqdm=False,
     model_params=None,
+    precision_policy=None,
 ):
+    if precision_policy is None:
+        precision_policy = PrecisionPolicy()
     losses = []
     fake_losses = []
     real_losses = []
@@ -517,7 +515,7 @@ def valid_epoch(
         for batch_id, samples in enumerate(valid_data_iter):
             # prepare data before passing to model
 
-            frames = samples['frame_tensor'].to(device)
+            frames = precision_policy.prepare_input(samples['frame_tensor'])
             labels = samples['label'].to(device).unsqueeze(1)
             batch_size = labels.shape[0]
             for i in range(batch_size):
@@ -525,7 +523,9 @@ def valid_epoch(
                     str(samples['video_id'][i].item()) + '__' +
                     str(samples['frame'][i]))
 
-            output = model(frames)
+            with precision_policy.autocast():
+                output = model(frames)
+            output = output.float()
             labels = labels.type_as(output)
             fake_loss = 0
             real_loss = 0
@@ -347,7 +347,8 @@ def save_all_model_results(
         log_dir=None,
         log_kind=None,
         probabilities=None,
-        amp_dict=None):
+        amp_dict=None,
+        checkpoint_writer=None):
     report_type = 'Train'
     save_model_results_to_log(
         epoch=epoch,
@@ -382,7 +383,8 @@ def save_all_model_results(
         criterion=criterion,
         log_dir=log_dir,
         log_kind=log_kind,
-        amp_dict=amp_dict)
+        amp_dict=amp_dict,
+        checkpoint_writer=checkpoint_writer)
 
 
 def get_per_video_stat(df, vid, prob_threshold_fake, prob_threshold_real):
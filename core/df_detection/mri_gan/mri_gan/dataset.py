@@ -37,15 +37,22 @@ class MRIDataset(Dataset):
         self.real_df_len = len(self.real_df)
         self.fake_df = pd.read_csv(self.fake_data_csv)
         # our dataset if skewed. we have lesser real samples and more fake :)
-        self.fake_df_trimmed = self.fake_df.sample(n=self.real_df_len)
-
-        # merge both df
-        self.df = pd.concat([self.real_df, self.fake_df_trimmed])
-        # shuffle the df
-        self.df = self.df.sample(frac=1).reset_index(drop=True)
+        # all fake samples are kept, balanced subset of them is picked every
+        # epoch by the `RealFakePairSampler` over `real_indices` and
+        # `fake_indices`
+        self.df = pd.concat([self.real_df, self.fake_df]) \
+            .reset_index(drop=True)
         self.data_dict = self.df.to_dict(orient='records')
         self.df_len = len(self.df)
 
+    @property
+    def real_indices(self) -> range:
+        return range(self.real_df_len)
+
+    @property
+    def fake_indices(self) -> range:
+        return range(self.real_df_len, self.df_len)
+
     def __getitem__(self, index):
         while True:
             try:
@@ -63,7 +70,7 @@ class MRIDataset(Dataset):
                 return {"A": img_A, "B": img_B}
 
             except Exception as e:
-                index = random.randint(0, self.df_len)
+                index = random.randint(0, self.df_len - 1)
 
     def __len__(self) -> int:
         return self.df_len
@@ -0,0 +1,145 @@
+"""SSIM evaluation of the MRI-GAN generator.
+
+Scores of the whole batch are computed with the same SSIM criterion which
+is used for the SSIM loss in training, on the device where the images are.
+Evaluation can be done in the background thread on the snapshot of the
+generated images, results are then collected by the training loop once
+they are ready.
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, List, Tuple
+
+from pytorch_msssim import SSIM, ssim
+import torch
+
+
+def denormalize(img):
+    img = (img + 1) / 2  # [-1, 1] => [0, 1]
+    return img * 255
+
+
+SSIMResult = Tuple[Any, float, List[float]]
+
+
+class SSIMEvaluator:
+    """Batched SSIM evaluation of the generated images.
+
+    Parameters
+    ----------
+    criterion : SSIM
+        SSIM criterion of the training, its window, data range and
+        constants are used for the evaluation
+    asynchronous : bool, optional
+        evaluate submitted batches in the background thread, by default
+        False
+    """
+
+    def __init__(self, criterion: SSIM, asynchronous: bool = False) -> None:
+        self._criterion = criterion
+        self._executor = ThreadPoolExecutor(1, 'ssim_evaluator') \
+            if asynchronous else None
+        self._pending: Deque[Tuple[Any, Future]] = deque()
+        self._done: List[SSIMResult] = []
+
+    @torch.no_grad()
+    def scores(
+        self,
+        real: torch.Tensor,
+        fake: torch.Tensor,
+    ) -> torch.Tensor:
+        """SSIM of every pair of images in the batch.
+
+        Parameters
+        ----------
+        real : torch.Tensor
+            real images normalized to [-1, 1], shape (N, C, H, W)
+        fake : torch.Tensor
+            generated images normalized to [-1, 1], shape (N, C, H, W)
+
+        Returns
+        -------
+        torch.Tensor
+            SSIM per image, shape (N,), on the device of the images
+        """
+        c = self._criterion
+        return ssim(
+            denormalize(real.float()),
+            denormalize(fake.float()),
+            data_range=c.data_range,
+            size_average=False,
+            win=c.win.to(real.device),
+            K=c.K,
+            nonnegative_ssim=c.nonnegative_ssim,
+        )
+
+    def evaluate(
+        self,
+        real: torch.Tensor,
+        fake: torch.Tensor,
+    ) -> Tuple[float, List[float]]:
+        """Evaluates batch right away.
+
+        Returns
+        -------
+        Tuple[float, List[float]]
+            mean SSIM of the batch and SSIM of every image
+        """
+        per_image = self.scores(real, fake).cpu().tolist()
+        return sum(per_image) / len(per_image), per_image
+
+    def submit(self, key: Any, real: torch.Tensor, fake: torch.Tensor) -> None:
+        """Schedules evaluation of the batch, result is returned by
+        `collect` together with the `key`. Images are copied, so the
+        training can reuse their memory.
+
+        Parameters
+        ----------
+        key : Any
+            identifies the batch, e.g. epoch and batch number
+        real : torch.Tensor
+            real images normalized to [-1, 1]
+        fake : torch.Tensor
+            generated images normalized to [-1, 1]
+        """
+        if self._executor is None:
+            self._done.append((key, *self.evaluate(real, fake)))
+            return
+        real = real.detach().clone()
+        fake = fake.detach().clone()
+        self._pending.append(
+            (key, self._executor.submit(self.evaluate, real, fake))
+        )
+
+    def collect(self, wait: bool = False) -> List[SSIMResult]:
+        """Returns finished evaluations in the order they were submitted.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            wait for all submitted evaluations, by default False
+
+        Returns
+        -------
+        List[SSIMResult]
+            key, mean SSIM and SSIM of every image for each batch
+        """
+        while self._pending and (wait or self._pending[0][1].done()):
+            key, future = self._pending.popleft()
+            self._done.append((key, *future.result()))
+        done, self._done = self._done, []
+        return done
+
+    def close(self) -> List[SSIMResult]:
+        """Waits for the submitted evaluations and stops the background
+        thread.
+
+        Returns
+        -------
+        List[SSIMResult]
+            evaluations which were not collected yet
+        """
+        done = self.collect(wait=True)
+        if self._executor is not None:
+            self._executor.shutdown()
+        return done
@@ -0,0 +1,105 @@
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+import torch
+import torch.nn as nn
+from torchvision.transforms import transforms
+from torchvision.utils import save_image
+
+from configs.mri_gan_config import MRIGANConfig
+from core.df_detection.mri_gan.mri_gan.model import get_MRI_GAN
+from core.precision import PrecisionPolicy
+from enums import DEVICE
+from utils import batchify
+
+logger = logging.getLogger(__name__)
+
+
+def predict_mri_for_video(
+    mri_path: Path,
+    v_d: Path,
+    batch_size: int,
+    device: DEVICE = DEVICE.CPU,
+    load_model_from_gd: bool = False,
+    overwrite: bool = False,
+    inference: bool = False,
+    mri_generator: nn.Module = None,
+    precision_policy: Optional[PrecisionPolicy] = None,
+) -> None:
+    """Uses trained MRI gan to predict MRI for every cropped face of one
+    video.
+
+    Parameters
+    ----------
+    mri_path : Path
+        directory where predicted MRIs will be saved
+    v_d : Path
+        path of the video directory with cropped faces
+    batch_size : int
+        batch size for the prediction
+    device : DEVICE, optional
+        device used for prediction, by default DEVICE.CPU
+    load_model_from_gd : bool, optional
+        load MRI gan weights from Google drive, by default False
+    overwrite : bool, optional
+        should already predicted MRIs be overwritten, by default False
+    inference : bool, optional
+        if `True`, dataset part directory is not used, by default False
+    mri_generator : nn.Module, optional
+        already loaded generator, if not provided it's loaded for this
+        video, by default None
+    precision_policy : Optional[PrecisionPolicy], optional
+        precision and memory format of the forward passes, if not provided,
+        fp32 on the `device` is used, by default None
+    """
+    logger.debug(f'Predicting MRI for video {str(v_d)}.')
+    video_id = v_d.parts[-1]
+    if inference:
+        part = ''
+    else:
+        part = v_d.parts[-2]
+    vid_mri_path = mri_path / part / video_id
+    if not overwrite and vid_mri_path.is_dir():
+        return
+
+    vid_mri_path.mkdir(parents=True, exist_ok=True)
+    frame_paths = [v_d / file for file in os.listdir(v_d)]
+
+    im_size = MRIGANConfig \
+        .get_instance() \
+        .get_mri_gan_model_params()['imsize']
+    transforms_ = transforms.Compose([
+        transforms.Resize((im_size, im_size)),
+        transforms.ToTensor(),
+        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+    ])
+
+    if mri_generator is None:
+        mri_generator = get_MRI_GAN(
+            load_from_gd=load_model_from_gd,
+            device=device,
+        )
+
+    if precision_policy is None:
+        precision_policy = PrecisionPolicy(device)
+    precision_policy.prepare_model(mri_generator)
+
+    with torch.no_grad():
+        for frame_names in batchify(frame_paths, batch_size):
+            frames = list(
+                map(lambda fn: transforms_(Image.open(fn)), frame_names)
+            )
+            frames = torch.stack(frames)
+            frames = precision_policy.prepare_input(frames)
+            with precision_policy.autocast():
+                mri_images = mri_generator(frames)
+            # save_image can't handle half precision
+            mri_images = mri_images.float()
+            for idx in range(mri_images.shape[0]):
+                save_path = vid_mri_path / frame_names[idx].parts[-1]
+                save_image(mri_images[idx], save_path)
+
+    logger.debug(f'MRI prediction done for video {str(v_d)}.')
@@ -3,18 +3,20 @@ import pickle
 import pprint
 import random
 
-import cv2 as cv
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from pytorch_msssim import SSIM
 import torch
-from torch.utils.data import DataLoader
 import torchvision
 from torchvision.transforms import transforms
 from torchvision.utils import save_image
 from tqdm import tqdm
 from core.df_detection.mri_gan.mri_gan.dataset import MRIDataset
+from core.df_detection.mri_gan.mri_gan.evaluation import (
+    SSIMEvaluator,
+    denormalize,
+)
 
 from core.df_detection.mri_gan.mri_gan.model import (
     Discriminator,
@@ -22,55 +24,49 @@ from core.df_detection.mri_gan.mri_gan.model import (
     weights_init_normal,
 )
 from core.df_detection.mri_gan.utils import ConfigParser, print_line
-from core.df_detection.mri_gan.data_utils.face_mri import \
-    get_structural_similarity
+from core.checkpoint import AppendOnlyLog, CheckpointWriter
+from core.dataset.loader import (
+    RealFakePairSampler,
+    cycle,
+    default_num_workers,
+    make_loader,
+)
+from core.precision import PrecisionPolicy
 
 pp = pprint.PrettyPrinter(indent=4)
 
+LOSS_COLUMNS = [
+    'epoch',
+    'local_batch_num',
+    'global_batch_num',
+    'loss_G',
+    'loss_GAN',
+    'loss_pixel',
+    'loss_ssim',
+    'loss_D',
+    'loss_real',
+    'loss_fake',
+]
+
 
-def get_ssim_report(
-    global_batch_num,
-    model_params,
-    imgs,
-    generator,
-    device,
-    save_img=False,
-):
-    num_imgs = imgs["A"].shape[0]
+def losses_log_path(losses_file):
+    # losses are appended to the CSV file instead of pickling whole list
+    return os.path.splitext(losses_file)[0] + '.csv'
+
+
+@torch.no_grad()
+def generate_for_ssim(imgs, generator, device, precision_policy=None):
     real_A = imgs["A"].to(device)
-    fake_B = generator(real_A)
-    scores = []
-    real_B = imgs["B"].detach().cpu()
-    fake_B = fake_B.detach().cpu()
-    for i in range(num_imgs):
-        image1 = np.transpose(real_B[i].numpy(), (1, 2, 0))
-        image1 = denormalize(image1)
-        image2 = np.transpose(fake_B[i].numpy(), (1, 2, 0))
-        image2 = denormalize(image2)
-        d, a = get_structural_similarity(image1, image2)
-        scores.append(a)
-        if save_img:
-            impath = os.path.join(
-                model_params['log_dir'],
-                model_params['model_name'],
-                'global_batches',
-                str(global_batch_num))
-            os.makedirs(impath, exist_ok=True)
-            real_B_path = os.path.join(impath, 'real_B_{}.png'.format(i))
-            fake_B_path = os.path.join(impath, 'fake_B_{}.png'.format(i))
-            cv.imwrite(real_B_path, image1)
-            cv.imwrite(fake_B_path, image2)
-
-    return np.mean(scores)
-
-
-def denormalize(img):
-    img = (img + 1) / 2  # [-1, 1] => [0, 1]
-    return img * 255
+    real_B = imgs["B"].to(device)
+    if precision_policy is None:
+        fake_B = generator(real_A)
+    else:
+        with precision_policy.autocast():
+            fake_B = generator(precision_policy.prepare_input(real_A))
+    return real_B, fake_B.float()
 
 
 def generate_graphs(losses_file, ssim_report_file, model_params):
-    losses = pickle.load(open(losses_file, "rb"))
     ssim_report = pickle.load(open(ssim_report_file, "rb"))
 
     plots_path = os.path.join(
@@ -96,19 +92,7 @@ def generate_graphs(losses_file, ssim_report_file, model_params):
         title='SSIM score vs Global batches').get_figure()
     fig_ssim.savefig(os.path.join(plots_path, 'ssim_global_batch.png'))
 
-    df_losses = pd.DataFrame(
-        data=losses,
-        columns=[
-            'epoch',
-            'local_batch_num',
-            'global_batch_num',
-            'loss_G',
-            'loss_GAN',
-            'loss_pixel',
-            'loss_ssim',
-            'loss_D',
-            'loss_real',
-            'loss_fake'])
+    df_losses = pd.read_csv(losses_log_path(losses_file))
     df_losses = df_losses.drop(
         labels=['epoch', 'local_batch_num'],
         axis=1).set_index('global_batch_num')
@@ -154,6 +138,8 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
     model_params = ConfigParser.getInstance().get_mri_gan_model_params()
     use_cuda = torch.cuda.is_available()
     device = torch.device("cuda" if use_cuda else "cpu")
+    precision_policy = PrecisionPolicy.from_params(model_params)
+    print(f'Precision policy {precision_policy}')
 
     data_transforms = torchvision.transforms.Compose([
         transforms.Resize((model_params['imsize'], model_params['imsize'])),
@@ -181,8 +167,8 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
         2 ** 4)
 
     # Initialize generator and discriminator
-    generator = GeneratorUNet().to(device)
-    discriminator = Discriminator().to(device)
+    generator = precision_policy.prepare_model(GeneratorUNet())
+    discriminator = precision_policy.prepare_model(Discriminator())
 
     # Optimizers
     optimizer_G = torch.optim.Adam(
@@ -197,7 +183,6 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
         betas=(
             model_params['b1'],
             model_params['b2']))
-    losses = []
     ssim_report = []
     global_batches_done = 0
     start_epoch = 0
@@ -213,6 +198,7 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
         discriminator.load_state_dict(checkpoint['discriminator_state_dict'])
         optimizer_G.load_state_dict(checkpoint['optimizer_G_state_dict'])
         optimizer_D.load_state_dict(checkpoint['optimizer_D_state_dict'])
+        precision_policy.load_state_dict(checkpoint.get('scaler_state_dict'))
         log_dir = checkpoint['log_dir']
         start_epoch = checkpoint['epoch'] + 1
         print(f'Override log dir {log_dir}')
@@ -226,18 +212,9 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
             log_dir, model_params['model_name'],
             model_params['ssim_report_file'])
 
-        losses = pickle.load(open(losses_file, "rb"))
         ssim_report = pickle.load(open(ssim_report_file, "rb"))
         mri_gan_metadata = pickle.load(open(metadata_file, "rb"))
         global_batches_done = mri_gan_metadata['global_batches_done']
-        if len(losses) != global_batches_done + 1:
-            print(
-                f'losses len = {len(losses)}, ' +
-                f'mri_gan_metadata = {mri_gan_metadata}'
-            )
-            print(f'Use data from metadata file')
-            losses = losses[0:global_batches_done]
-            # raise Exception('Bad metadata and saved states')
         loss_D_lowest = mri_gan_metadata['loss_D_lowest']
         loss_G_lowest = mri_gan_metadata['loss_G_lowest']
     else:
@@ -258,6 +235,28 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
             model_params['ssim_report_file'])
 
     model_params['log_dir'] = log_dir
+
+    def checkpoint_state(epoch):
+        return {
+            'epoch': epoch,
+            'model_params': model_params,
+            'log_dir': log_dir,
+            'generator_state_dict': generator.state_dict(),
+            'discriminator_state_dict': discriminator.state_dict(),
+            'optimizer_G_state_dict': optimizer_G.state_dict(),
+            'optimizer_D_state_dict': optimizer_D.state_dict(),
+            'scaler_state_dict': precision_policy.state_dict(),
+        }
+
+    ssim_evaluator = SSIMEvaluator(criterion_ssim, asynchronous=True)
+
+    def collect_ssim_report(wait=False):
+        results = ssim_evaluator.collect(wait)
+        for key, mean_ssim, _ in results:
+            ssim_report.append([*key, mean_ssim])
+        if results:
+            pickle.dump(ssim_report, open(ssim_report_file, "wb"))
+
     checkpoint_best_G_path = os.path.join(
         log_dir, model_params['model_name'],
         'checkpoint_best_G.chkpt')
@@ -274,203 +273,208 @@ def train_MRI_GAN_model(log_dir=None, train_resume_dir=None):
     pp.pprint(model_params)
     print_line()
 
-    for e in range(model_params['n_epochs']):
-        if e < start_epoch:
-            print(f"Skipping epoch {e}")
-            continue
-
-        # we are creating dataloader at each epoch as we want to sample new
-        # fake image randomly as each epoch. We have lesser real image and
-        # more fake. We can get more real images but that would impose a lot
-        # of computation power need considering the dataset size we have.
-
-        print(f'Creating data-loaders for epoch: {e}')
-        train_dataset = MRIDataset(
-            mode='train',
-            transforms=data_transforms,
-            frac=model_params['frac'],
-        )
-        test_dataset = MRIDataset(
-            mode='test',
-            transforms=data_transforms,
-            frac=model_params['frac'],
-        )
-
-        num_workers = 8
-        # num_workers = 0
-        train_dataloader = DataLoader(
-            train_dataset,
-            batch_size=model_params['batch_size'],
-            shuffle=True,
-            num_workers=num_workers,
-        )
-
-        test_dataloader = DataLoader(
-            test_dataset,
-            batch_size=model_params['batch_size'],
-            shuffle=True,
-            num_workers=num_workers,
-        )
-
-        desc = "Training MRI-GAN [e:{e}/{n_epochs}] [G_loss:{loss_G}] [D_loss:{loss_D}]".format(
-            e=e, n_epochs=model_params['n_epochs'], loss_G='N/A', loss_D='N/A')
-        pbar = tqdm(train_dataloader, desc=desc)
-
-        for local_batch_num, batch in enumerate(pbar):
-
-            generator.train()
-            discriminator.train()
-            real_A = batch["A"].to(device)
-            real_B = batch["B"].to(device)
-
-            valid = torch.ones((real_A.size(0), *patch)).to(device)
-            fake = torch.zeros((real_A.size(0), *patch)).to(device)
-
-            #  Train Generator
-            optimizer_G.zero_grad()
-
-            # GAN loss
-            fake_B = generator(real_A)
-            pred_fake = discriminator(fake_B, real_A)
-            loss_GAN = criterion_GAN(pred_fake, valid)
-            # Pixel-wise loss
-            loss_pixel = criterion_pixelwise(fake_B, real_B)
-            fake_B_dn = denormalize(fake_B)
-            real_B_dn = denormalize(real_B)
-            # SSIM loss
-            loss_ssim = torch.sqrt(1 - criterion_ssim(fake_B_dn, real_B_dn))
-            # Total generator loss
-            loss_G = loss_GAN + model_params['lambda_pixel'] * (
-                model_params['tau'] * loss_pixel + (1 - model_params['tau']) * loss_ssim
-            )
-
-            loss_G.backward()
-            optimizer_G.step()
-
-            #  Train Discriminator
-            optimizer_D.zero_grad()
-
-            # Real loss
-            pred_real = discriminator(real_B, real_A)
-            loss_real = criterion_GAN(pred_real, valid)
-            # Fake loss
-            pred_fake = discriminator(fake_B.detach(), real_A)
-            loss_fake = criterion_GAN(pred_fake, fake)
-            # Total discriminator loss
-            loss_D = 0.5 * (loss_real + loss_fake)
-
-            loss_D.backward()
-            optimizer_D.step()
+    # datasets and loaders are created once, workers persist between the
+    # epochs. We have lesser real images and more fake, the sampler picks
+    # new fake images randomly every epoch instead of creating the datasets
+    # again.
+    train_dataset = MRIDataset(
+        mode='train',
+        transforms=data_transforms,
+        frac=model_params['frac'],
+    )
+    test_dataset = MRIDataset(
+        mode='test',
+        transforms=data_transforms,
+        frac=model_params['frac'],
+    )
+    train_dataloader = make_loader(
+        train_dataset,
+        batch_size=model_params['batch_size'],
+        sampler=RealFakePairSampler(
+            train_dataset.real_indices,
+            train_dataset.fake_indices,
+        ),
+    )
+    # small loader of the test set which only feeds sample generation,
+    # its iterator is kept instead of starting new one for every sample
+    sample_dataloader = make_loader(
+        test_dataset,
+        batch_size=model_params['batch_size'],
+        sampler=RealFakePairSampler(
+            test_dataset.real_indices,
+            test_dataset.fake_indices,
+        ),
+        num_workers=min(1, default_num_workers()),
+        drop_last=True,
+    )
+    sample_batches = cycle(sample_dataloader)
+
+    # queued checkpoints and losses are written even if training fails
+    with AppendOnlyLog(
+        losses_log_path(losses_file),
+        LOSS_COLUMNS,
+    ) as losses_log, CheckpointWriter() as checkpoint_writer:
+        # rows logged after the metadata was saved are dropped when resuming
+        losses_log.truncate(global_batches_done)
+
+        for e in range(model_params['n_epochs']):
+            if e < start_epoch:
+                print(f"Skipping epoch {e}")
+                continue
 
             desc = "Training MRI-GAN [e:{e}/{n_epochs}] [G_loss:{loss_G}] [D_loss:{loss_D}]".format(
-                e=e, n_epochs=model_params['n_epochs'], loss_G=loss_G.item(), loss_D=loss_D.item())
-
-            pbar.set_description(desc=desc, refresh=True)
-
-            losses.append(
-                [e, local_batch_num, global_batches_done, loss_G.item(),
-                 loss_GAN.item(),
-                 loss_pixel.item(),
-                 loss_ssim.item(),
-                 loss_D.item(),
-                 loss_real.item(),
-                 loss_fake.item()])
-
-            mri_gan_metadata['global_batches_done'] = global_batches_done
-            mri_gan_metadata['model_params'] = model_params
-
-            global_batches_done += 1
-
-            if global_batches_done % model_params['sample_gen_freq'] == 0:
-                try:
-                    generator.eval()
-                    imgs = next(iter(test_dataloader))
-                    rand_start = random.randint(
-                        0,
-                        model_params['batch_size'] -
-                        model_params['test_sample_size'],
-                    )
-                    rand_end = rand_start + model_params['test_sample_size']
-                    real_A = imgs["A"][rand_start:rand_end].to(device)
-                    real_B = imgs["B"][rand_start:rand_end].to(device)
+                e=e, n_epochs=model_params['n_epochs'], loss_G='N/A', loss_D='N/A')
+            pbar = tqdm(train_dataloader, desc=desc)
+
+            for local_batch_num, batch in enumerate(pbar):
+
+                generator.train()
+                discriminator.train()
+                real_A = precision_policy.prepare_input(batch["A"])
+                real_B = precision_policy.prepare_input(batch["B"])
+
+                valid = torch.ones((real_A.size(0), *patch)).to(device)
+                fake = torch.zeros((real_A.size(0), *patch)).to(device)
+
+                #  Train Generator
+                optimizer_G.zero_grad()
+
+                # GAN loss, models run in the precision of the policy and
+                # losses are calculated in fp32
+                with precision_policy.autocast():
                     fake_B = generator(real_A)
-                    img_sample = torch.cat(
-                        (real_A.data, real_B.data, fake_B.data),
-                        -2,
-                    )
-                    os.makedirs(
-                        os.path.join(
-                            generated_samples_path,
-                            str(e),
-                        ),
-                        exist_ok=True,
+                    pred_fake = discriminator(fake_B, real_A)
+                fake_B = fake_B.float()
+                loss_GAN = criterion_GAN(pred_fake.float(), valid)
+                # Pixel-wise loss
+                loss_pixel = criterion_pixelwise(fake_B, real_B)
+                fake_B_dn = denormalize(fake_B)
+                real_B_dn = denormalize(real_B)
+                # SSIM loss
+                loss_ssim = torch.sqrt(1 - criterion_ssim(fake_B_dn, real_B_dn))
+                # Total generator loss
+                loss_G = loss_GAN + model_params['lambda_pixel'] * (
+                    model_params['tau'] * loss_pixel + (1 - model_params['tau']) * loss_ssim
+                )
+
+                precision_policy.backward(loss_G)
+                precision_policy.step(optimizer_G)
+
+                #  Train Discriminator
+                optimizer_D.zero_grad()
+
+                with precision_policy.autocast():
+                    pred_real = discriminator(real_B, real_A)
+                    pred_fake = discriminator(fake_B.detach(), real_A)
+                # Real loss
+                loss_real = criterion_GAN(pred_real.float(), valid)
+                # Fake loss
+                loss_fake = criterion_GAN(pred_fake.float(), fake)
+                # Total discriminator loss
+                loss_D = 0.5 * (loss_real + loss_fake)
+
+                precision_policy.backward(loss_D)
+                precision_policy.step(optimizer_D)
+                # one scale update per iteration, shared by both optimizers
+                precision_policy.update()
+
+                loss_G_val = loss_G.item()
+                loss_D_val = loss_D.item()
+                desc = "Training MRI-GAN [e:{e}/{n_epochs}] [G_loss:{loss_G}] [D_loss:{loss_D}]".format(
+                    e=e, n_epochs=model_params['n_epochs'], loss_G=loss_G_val, loss_D=loss_D_val)
+
+                pbar.set_description(desc=desc, refresh=True)
+
+                losses_log.append(
+                    [e, local_batch_num, global_batches_done, loss_G_val,
+                     loss_GAN.item(),
+                     loss_pixel.item(),
+                     loss_ssim.item(),
+                     loss_D_val,
+                     loss_real.item(),
+                     loss_fake.item()])
+
+                mri_gan_metadata['global_batches_done'] = global_batches_done
+                mri_gan_metadata['model_params'] = model_params
+
+                global_batches_done += 1
+
+                if global_batches_done % model_params['sample_gen_freq'] == 0:
+                    try:
+                        generator.eval()
+                        imgs = next(sample_batches)
+                        rand_start = random.randint(
+                            0,
+                            model_params['batch_size'] -
+                            model_params['test_sample_size'],
+                        )
+                        rand_end = rand_start + model_params['test_sample_size']
+                        real_A = imgs["A"][rand_start:rand_end].to(device)
+                        real_B = imgs["B"][rand_start:rand_end].to(device)
+                        fake_B = generator(real_A)
+                        img_sample = torch.cat(
+                            (real_A.data, real_B.data, fake_B.data),
+                            -2,
+                        )
+                        os.makedirs(
+                            os.path.join(
+                                generated_samples_path,
+                                str(e),
+                            ),
+                            exist_ok=True,
+                        )
+                        save_image(
+                            img_sample,
+                            "{}/{}/{}.png".format(
+                                generated_samples_path,
+                                e,
+                                local_batch_num,
+                            ),
+                            nrow=int(np.sqrt(model_params['test_sample_size'])),
+                            normalize=True,
+                        )
+
+                        # SSIM of the batch is computed in the background, the
+                        # report is extended with evaluations finished so far
+                        ssim_evaluator.submit(
+                            [e, local_batch_num, global_batches_done],
+                            *generate_for_ssim(
+                                imgs, generator, device, precision_policy),
+                        )
+                        collect_ssim_report()
+                        if os.path.exists(ssim_report_file):
+                            generate_graphs(
+                                losses_file, ssim_report_file, model_params)
+                    except Exception as expn:
+                        print(f'Exception {expn}')
+                        pass
+
+                # checkpoints are written by the background thread, pending
+                # best-so-far saves of the same file are coalesced
+                if global_batches_done % model_params['chkpt_freq'] == 0:
+                    checkpoint_writer.save(checkpoint_state(e), checkpoint_path)
+
+                if loss_D_val < loss_D_lowest:
+                    loss_D_lowest = loss_D_val
+                    checkpoint_writer.save(
+                        checkpoint_state(e),
+                        checkpoint_best_D_path,
                     )
-                    save_image(
-                        img_sample,
-                        "{}/{}/{}.png".format(
-                            generated_samples_path,
-                            e,
-                            local_batch_num,
-                        ),
-                        nrow=int(np.sqrt(model_params['test_sample_size'])),
-                        normalize=True,
+
+                if loss_G_val < loss_G_lowest:
+                    loss_G_lowest = loss_G_val
+                    checkpoint_writer.save(
+                        checkpoint_state(e),
+                        checkpoint_best_G_path,
                     )
 
-                    mean_ssim = get_ssim_report(
-                        global_batches_done - 1, model_params, imgs, generator,
-                        device, save_img=False)
-                    ssim_report.append(
-                        [e, local_batch_num, global_batches_done, mean_ssim])
-                    pickle.dump(ssim_report, open(ssim_report_file, "wb"))
-
-                    generate_graphs(
-                        losses_file, ssim_report_file, model_params)
-                except Exception as expn:
-                    print(f'Exception {expn}')
-                    pass
-
-            if global_batches_done % model_params['chkpt_freq'] == 0:
-                # print(f'\nSaving model checkpoint at {checkpoint_path}')
-                check_point_dict = {
-                    'epoch': e,
-                    'model_params': model_params,
-                    'log_dir': log_dir,
-                    'generator_state_dict': generator.state_dict(),
-                    'discriminator_state_dict': discriminator.state_dict(),
-                    'optimizer_G_state_dict': optimizer_G.state_dict(),
-                    'optimizer_D_state_dict': optimizer_D.state_dict(),
-                }
-                torch.save(check_point_dict, checkpoint_path)
-
-            if loss_D.item() < loss_D_lowest:
-                loss_D_lowest = loss_D.item()
-
-                check_point_dict = {
-                    'epoch': e,
-                    'model_params': model_params,
-                    'log_dir': log_dir,
-                    'generator_state_dict': generator.state_dict(),
-                    'discriminator_state_dict': discriminator.state_dict(),
-                    'optimizer_G_state_dict': optimizer_G.state_dict(),
-                    'optimizer_D_state_dict': optimizer_D.state_dict(),
-                }
-                torch.save(check_point_dict, checkpoint_best_D_path)
-
-            if loss_G.item() < loss_G_lowest:
-                loss_G_lowest = loss_G.item()
-
-                check_point_dict = {
-                    'epoch': e,
-                    'model_params': model_params,
-                    'log_dir': log_dir,
-                    'generator_state_dict': generator.state_dict(),
-                    'discriminator_state_dict': discriminator.state_dict(),
-                    'optimizer_G_state_dict': optimizer_G.state_dict(),
-                    'optimizer_D_state_dict': optimizer_D.state_dict(),
-                }
-                torch.save(check_point_dict, checkpoint_best_G_path)
-
-            mri_gan_metadata['loss_D_lowest'] = loss_D_lowest
-            mri_gan_metadata['loss_G_lowest'] = loss_G_lowest
-            pickle.dump(losses, open(losses_file, "wb"))
-            pickle.dump(mri_gan_metadata, open(metadata_file, "wb"))
+                mri_gan_metadata['loss_D_lowest'] = loss_D_lowest
+                mri_gan_metadata['loss_G_lowest'] = loss_G_lowest
+                checkpoint_writer.save(
+                    mri_gan_metadata,
+                    metadata_file,
+                    save_fn=pickle.dump,
+                )
+
+        collect_ssim_report(wait=True)
+        ssim_evaluator.close()
@@ -10,10 +10,9 @@ from tqdm import tqdm
 from core.dictionary import Dictionary
 from core.face import Face
 from core.face_alignment.face_aligner import FaceAligner
-from core.face_alignment.utils import get_face_mask
 from core.face_detection.algorithms.faceboxes.faceboxes_fdm import FaceboxesFDM
 from core.face_detection.algorithms.s3fd.s3fd_fdm import S3FDFDM
-from core.image.image import Image
+from core.image.image import Image, ImagePrefetcher
 from core.landmark_detection.algorithms.fan.fan_ldm import FANLDM
 from enums import (
     DEVICE,
@@ -165,7 +164,7 @@ class Extractor:
         """
         landmarks = self.ldm.detect_landmarks(face)
         face.landmarks = landmarks
-        face.mask = get_face_mask(face.raw_image.data, landmarks.dots)
+        face.compute_mask()
 
     def run(self):
         """Initiates process of face and landmark extraction."""
@@ -183,13 +182,15 @@ class Extractor:
         # extract faces and landmarks once and then image size and alignment
         # can be ran multiple times for different sizes
         pbar = tqdm(
-            image_paths,
+            total=len(image_paths),
             desc="Images done",
             disable=not self.verbose,
         )
-        for path in pbar:
-            image = Image.load(path)
-
+        # images are decoded in the background, at full size because
+        # landmarks are detected on almost every frame, detector downscales
+        # them in memory
+        images = ImagePrefetcher(image_paths)
+        for image in images:
             faces = self.detect_faces(image)
 
             for f in faces:
@@ -198,6 +199,11 @@ class Extractor:
                 landmarks.add(f.name, f.landmarks.dots)
                 FaceAligner.calculate_alignment(f)
                 alignments.add(f.name, f.alignment)
+                # frame is loaded again from the disk if it's needed later
+                f.release_raw_image()
+            pbar.update()
+
+        pbar.close()
 
         logger.debug('Saving landmarks.')
         landmarks.save(self.output_dir / 'landmarks.json')
@@ -1,9 +1,12 @@
-from typing import Union
+from pathlib import Path
+from typing import Tuple, Union
+import weakref
 
 import cv2 as cv
 import numpy as np
 
 from core.bounding_box import BoundingBox
+from core.face_alignment.utils import get_face_mask_crop
 from core.image.image import Image
 from core.landmarks import Landmarks
 from enums import MASK_DIM
@@ -12,11 +15,37 @@ from enums import MASK_DIM
 class Face:
     """Class for everything that has to do with faces. Contains image from
     which faces are extracted, extracted faces, alignments...
+
+    Raw image is referenced strongly until `release_raw_image` is called,
+    after that only weakly, so the frame is freed as soon as the extraction
+    moves to the next one, and is loaded again if it's needed. Mask is kept
+    as uint8 crop around the face and detected face is cropped from the raw
+    image when it's requested.
     """
 
+    __slots__ = (
+        '_raw_image',
+        '_raw_image_path',
+        '_mask',
+        '_mask_origin',
+        '_image_shape',
+        '_bounding_box',
+        '_detected_face',
+        '_landmarks',
+        '_alignment',
+        '_aligned_landmarks',
+        '_aligned_image',
+        '_aligned_mask',
+        '_path',
+        '_name',
+    )
+
     def __init__(self):
         self._raw_image = None
+        self._raw_image_path = None
         self._mask = None
+        self._mask_origin = None
+        self._image_shape = None
         self._bounding_box = None
         self._detected_face = None
         self._landmarks = None
@@ -36,7 +65,15 @@ class Face:
         Union[Image, None]
             raw image if it was set, else None
         """
-        return self._raw_image
+        raw_image = self._raw_image
+        if isinstance(raw_image, weakref.ref):
+            raw_image = raw_image()
+            if raw_image is None:
+                # frame was freed, it's loaded again and kept until the
+                # next release so it isn't decoded on every access
+                raw_image = Image.load(self._raw_image_path)
+                self._raw_image = raw_image
+        return raw_image
 
     @property
     def mask(self) -> Union[np.ndarray, None]:
@@ -44,13 +81,45 @@ class Face:
         where only face is visible without background i.e. convex polygon
         defined by landmarks is only visible on raw image.
 
+        Note: mask is stored only as the crop around the face, see
+        `mask_crop`, full mask is constructed on every call.
+
         Returns
         -------
         Union[np.ndarray, None]
             binary mask for raw image
         """
+        if self._mask is None:
+            return None
+        mask = np.zeros(self._image_shape, dtype=np.uint8)
+        x, y = self._mask_origin
+        h, w = self._mask.shape
+        mask[y:y + h, x:x + w] = self._mask
+        return mask
+
+    @property
+    def mask_crop(self) -> Union[np.ndarray, None]:
+        """Part of the `mask` around the face, uint8 array of ones where's
+        the face.
+
+        Returns
+        -------
+        Union[np.ndarray, None]
+            mask crop if the mask was set, None else
+        """
         return self._mask
 
+    @property
+    def mask_origin(self) -> Union[Tuple[int, int], None]:
+        """Upper left corner (x, y) of the `mask_crop` on the raw image.
+
+        Returns
+        -------
+        Union[Tuple[int, int], None]
+            corner if the mask was set, None else
+        """
+        return self._mask_origin
+
     @property
     def bounding_box(self) -> Union[BoundingBox, None]:
         """Bounding box around the face which is representd by two points.
@@ -71,7 +140,12 @@ class Face:
         Union[np.ndarray, None]
             detected face if the face detection process was run, None else
         """
-        return self._detected_face
+        if self._detected_face is not None or self._bounding_box is None \
+                or self._raw_image is None:
+            return self._detected_face
+        (x1, y1), (x2, y2) = self._bounding_box.upper_left, \
+            self._bounding_box.lower_right
+        return self.raw_image.data[max(y1, 0):y2, max(x1, 0):x2]
 
     @property
     def landmarks(self) -> Union[Landmarks, None]:
@@ -151,11 +225,60 @@ class Face:
 
     @raw_image.setter
     def raw_image(self, raw_image: Image) -> None:
+        self._raw_image_path = None
+        if raw_image is not None:
+            path = Path(raw_image.path)
+            # images which exist only in memory, e.g. video frames named by
+            # their number, can't be loaded again
+            if path.is_absolute() and path.is_file():
+                self._raw_image_path = path
         self._raw_image = raw_image
 
+    def release_raw_image(self) -> None:
+        """Keeps only weak reference to the raw image if it can be loaded
+        again from the disk, so the frame can be freed when the caller is
+        done with it. Images which exist only in memory are kept.
+        """
+        if self._raw_image_path is not None \
+                and isinstance(self._raw_image, Image):
+            self._raw_image = weakref.ref(self._raw_image)
+
     @mask.setter
     def mask(self, mask: np.ndarray) -> None:
+        if mask is None:
+            self.set_mask_crop(None, None, None)
+            return
+        mask = mask.astype(np.uint8, copy=False)
+        x, y, w, h = cv.boundingRect(mask)
+        self.set_mask_crop(mask[y:y + h, x:x + w].copy(), (x, y), mask.shape)
+
+    def set_mask_crop(
+        self,
+        mask: Union[np.ndarray, None],
+        origin: Union[Tuple[int, int], None],
+        image_shape: Union[Tuple[int, int], None],
+    ) -> None:
+        """Sets mask which is already cropped around the face.
+
+        Args:
+            mask (Union[np.ndarray, None]): uint8 mask crop
+            origin (Union[Tuple[int, int], None]): upper left corner (x, y)
+                of the crop on the raw image
+            image_shape (Union[Tuple[int, int], None]): height and width of
+                the raw image
+        """
         self._mask = mask
+        self._mask_origin = origin
+        self._image_shape = None if image_shape is None \
+            else tuple(image_shape[:2])
+
+    def compute_mask(self) -> None:
+        """Constructs face mask crop from the convex polygon around face
+        landmarks.
+        """
+        shape = self.raw_image.shape[:2]
+        mask, origin = get_face_mask_crop(self.landmarks.hull, shape)
+        self.set_mask_crop(mask, origin, shape)
 
     @bounding_box.setter
     def bounding_box(self, bounding_box: BoundingBox) -> None:
@@ -199,11 +322,25 @@ class Face:
         fill_values: int = 1,
         mask_dim: MASK_DIM = MASK_DIM.ONE,
     ) -> np.ndarray:
-        if aligned:
-            m = self.aligned_mask
-        else:
-            m = self.mask
-        m[m == 1] = fill_values
+        """Face mask where face pixels have value `fill_values`. Stored mask
+        isn't changed, new array is always returned.
+
+        Parameters
+        ----------
+        aligned : bool, optional
+            aligned mask or the mask of the raw image, by default True
+        fill_values : int, optional
+            value of the face pixels, by default 1
+        mask_dim : MASK_DIM, optional
+            one or three channel mask, by default MASK_DIM.ONE
+
+        Returns
+        -------
+        np.ndarray
+            face mask
+        """
+        m = self.aligned_mask if aligned else self.mask
+        m = np.where(m == 1, np.asarray(fill_values, dtype=m.dtype), m)
         if mask_dim == MASK_DIM.ONE:
             return m
         else:
@@ -224,14 +361,22 @@ class Face:
         np.ndarray
             image where only face is visible, without background
         """
-        face = self.aligned_image
-        face_mask = self.aligned_mask
-        if not aligned:
-            face = self.raw_image.data
-            face_mask = self.mask
-        masked = np.zeros_like(face, dtype=np.uint8)
-        for i in range(3):
-            masked[:, :, i] = np.multiply(face[:, :, i], face_mask)
+        if aligned:
+            return np.multiply(
+                self.aligned_image,
+                self.aligned_mask[..., np.newaxis],
+            ).astype(np.uint8, copy=False)
+        # only the part of the image under the mask crop has to be multiplied
+        image = self.raw_image.data
+        masked = np.zeros_like(image, dtype=np.uint8)
+        x, y = self._mask_origin
+        h, w = self._mask.shape
+        np.multiply(
+            image[y:y + h, x:x + w],
+            self._mask[..., np.newaxis],
+            out=masked[y:y + h, x:x + w],
+            casting='unsafe',
+        )
         return masked
 
     def draw_landmarks(self) -> np.ndarray:
@@ -252,3 +397,22 @@ class Face:
             copy = cv.circle(copy, (x, y), radius=2,
                              color=(255, 0, 0), thickness=-1)
         return copy
+
+    def __getstate__(self) -> dict:
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        # pickled face contains the raw image so it can be used without
+        # the original frame
+        state['_raw_image'] = self.raw_image
+        state['_raw_image_path'] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+        mask = state.pop('_mask', None)
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        if mask is not None and '_mask_origin' not in state:
+            # faces pickled before masks were cropped have full float mask
+            self.mask = mask
+        else:
+            self._mask = mask
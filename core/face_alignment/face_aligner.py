@@ -35,7 +35,7 @@ class FaceAligner:
             new_size,
             image_size,
         )
-        FaceAligner._align_mask(face)
+        FaceAligner._align_mask(face, alignment, new_size, image_size)
 
     @staticmethod
     def calculate_alignment(face: Face):
@@ -76,12 +76,13 @@ class FaceAligner:
         size : int
             size of the new square image
         """
-        warped = cv.warpAffine(
+        # padded image is scaled down to the `size` by the same warp
+        face.aligned_image = cv.warpAffine(
             face.raw_image.data,
-            alignment,
-            (new_size, new_size),
+            alignment * (size / new_size),
+            (size, size),
+            flags=cv.INTER_LINEAR,
         )
-        face.aligned_image = cv.resize(warped, (size, size), cv.INTER_CUBIC)
 
     @staticmethod
     def _align_face_landmarks(
@@ -110,15 +111,41 @@ class FaceAligner:
         face.aligned_landmarks = dots
 
     @staticmethod
-    def _align_mask(face: Face):
-        """Function for aligning face mask.
+    def _align_mask(
+        face: Face,
+        alignment: np.ndarray,
+        new_size: int,
+        size: int,
+    ) -> None:
+        """Function for aligning face mask. Only the mask crop around the
+        face is warped, if the face has no mask, mask is constructed from
+        the aligned landmarks.
 
         Parameters
         ----------
         face : Face
-            face object containing aligned landmarks and aligned image
+            face object containing mask crop or aligned landmarks and
+                aligned image
+        alignment : np.ndarray
+            alignment matrix
+        new_size : int
+            size of the image which takes into account image padding
+        size : int
+            size of the new square image
         """
-        face.aligned_mask = get_face_mask(
-            face.aligned_image,
-            face.aligned_landmarks,
+        if face.mask_crop is None:
+            face.aligned_mask = get_face_mask(
+                face.aligned_image,
+                face.aligned_landmarks,
+            ).astype(np.uint8)
+            return
+        # warp of the crop is the warp of the whole mask moved by the crop
+        # origin and scaled straight to the output size
+        roi_alignment = alignment * (size / new_size)
+        roi_alignment[:, 2] += roi_alignment[:, :2] @ face.mask_origin
+        face.aligned_mask = cv.warpAffine(
+            face.mask_crop,
+            roi_alignment,
+            (size, size),
+            flags=cv.INTER_NEAREST,
         )
@@ -1,3 +1,5 @@
+from typing import Tuple
+
 import cv2 as cv
 import numpy as np
 
@@ -19,12 +21,41 @@ def get_face_mask(image: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
     np.ndarray
         image where only face has pixel values of 1, everything else is 0
     """
-    hull = cv.convexHull(landmarks)
+    hull = cv.convexHull(landmarks.astype(np.int32))
     mask = np.zeros(image.shape[:2])
     cv.fillConvexPoly(mask, hull, 1)
     return mask
 
 
+def get_face_mask_crop(
+    hull: np.ndarray,
+    image_shape: Tuple[int, int],
+) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """Same as `get_face_mask`, but constructs only the part of the mask
+    around the face instead of the mask of the whole image. Crop is bounded
+    by the convex polygon around face landmarks and clipped to the image.
+
+    Parameters
+    ----------
+    hull : np.ndarray
+        int32 convex polygon around face landmarks, e.g. `Landmarks.hull`
+    image_shape : Tuple[int, int]
+        height and width of the image on which landmarks were detected
+
+    Returns
+    -------
+    Tuple[np.ndarray, Tuple[int, int]]
+        uint8 mask crop where only face has pixel values of 1 and the upper
+            left corner of the crop on the image
+    """
+    x, y, w, h = cv.boundingRect(hull)
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, image_shape[1]), min(y + h, image_shape[0])
+    mask = np.zeros((max(y2 - y1, 0), max(x2 - x1, 0)), dtype=np.uint8)
+    cv.fillPoly(mask, [hull], 1, offset=(-x1, -y1))
+    return mask, (x1, y1)
+
+
 def umeyama(src, dst, estimate_scale):
     """Estimate N-D similarity transformation with or without scaling.
     Parameters
@@ -1,5 +1,5 @@
 import abc
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
@@ -13,7 +13,16 @@ from enums import DEVICE
 
 
 class FaceDetectionModel(BaseModel):
-    """Base class which every face detection algorithm should implement."""
+    """Base class which every face detection algorithm should implement.
+
+    Detection models return bounding boxes in the coordinates of the
+    original image, even if the image was decoded at reduced size, see
+    `Image.load`.
+    """
+
+    # number of pixels the model resizes input image to, images can be
+    # decoded at reduced size up to it, None if model uses the whole image
+    max_input_pixels: Optional[int] = None
 
     def __init__(self, model_factory: ModelFactory, device: DEVICE):
         super().__init__(model_factory, device)
@@ -59,14 +68,10 @@ class FaceDetectionModel(BaseModel):
         extracted_faces = []
 
         for bb in bounding_boxes:
-            (x1, y1), (x2, y2) = bb.upper_left, bb.lower_right
-
-            # TODO don't save detected face, save only bounding box
-            # and if the detected face is needed, it can be returned by some
-            # method of class Face
+            # detected face is cropped from the raw image by the `Face` when
+            # it's needed, view into the image would keep the whole frame
             f = Face()
             f.bounding_box = bb
-            f.detected_face = img[y1:y2, x1:x2]
 
             extracted_faces.append(f)
 
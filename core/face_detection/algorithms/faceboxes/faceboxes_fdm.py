@@ -28,8 +28,10 @@ class FaceboxesFDM(FaceDetectionModel):
     def detect_faces(self, image: Image) -> List[Face]:
         img = np.float32(image.data)
         im_height, im_width, _ = img.shape
-        scale = torch.Tensor(
-            [img.shape[1], img.shape[0], img.shape[1], img.shape[0]])
+        # boxes are relative to the image size so they are scaled straight
+        # to the original image
+        height, width = image.original_shape[:2]
+        scale = torch.Tensor([width, height, width, height])
         img -= (104, 117, 123)
         img = img.transpose(2, 0, 1)
         img = torch.from_numpy(img).unsqueeze(0)
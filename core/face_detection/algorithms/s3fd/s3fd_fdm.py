@@ -21,13 +21,15 @@ from enums import DEVICE
 class S3FDFDM(FaceDetectionModel):
     """Face detection model for S3FD algorithm."""
 
+    max_input_pixels = 1700 * 1200
+
     def __init__(self, device: DEVICE):
         super().__init__(S3FDModelFactory, device)
 
     def detect_faces(self, image: Image) -> List[Face]:
         thresh = 0.6
         height, width, _ = image.shape
-        max_im_shrink = np.sqrt(1700 * 1200 / (height * width))
+        max_im_shrink = np.sqrt(self.max_input_pixels / (height * width))
         img = cv.resize(
             image.data,
             None,
@@ -50,6 +52,9 @@ class S3FDFDM(FaceDetectionModel):
         with torch.no_grad():
             y = self.model(x)
         detections = y.data
+        # detections are relative to the image size so they are scaled
+        # straight to the original image
+        height, width = image.original_shape[:2]
         scale = torch.Tensor([width, height, width, height])
 
         bounding_boxes = []
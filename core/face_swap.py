@@ -0,0 +1,456 @@
+"""Face swapping of the whole video or folder of frames.
+
+Frames are decoded in the background thread, faces of several frames are
+swapped by the autoencoder in one batch, swapped faces are blended back into
+their frames in the thread pool and frames are streamed into the video
+writer in the original order, so no stage waits for the others longer than
+it has to and memory stays bounded regardless of the video length.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+import torch
+
+from core.face import Face
+from core.face_alignment.face_aligner import FaceAligner
+from core.image.image import Image
+from enums import BLEND, DEVICE
+from utils import get_file_paths_from_dir
+from variables import IMAGE_EXTS
+
+logger = logging.getLogger(__name__)
+
+_END_OF_STREAM = None
+
+
+class FrameReader:
+    """Decodes frames of the video or reads images of the folder in the
+    background thread.
+
+    Parameters
+    ----------
+    source : Union[str, Path]
+        video file or directory with frames, frames are ordered by name
+    queue_size : int, optional
+        maximal number of decoded frames waiting to be processed, by
+        default 32
+    folder_fps : float, optional
+        fps of the output when frames are read from the folder, by default
+        25.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, Path],
+        queue_size: int = 32,
+        folder_fps: float = 25.,
+    ) -> None:
+        self._source = Path(source)
+        self._q: queue.Queue = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        if self._source.is_dir():
+            self._paths = sorted(
+                get_file_paths_from_dir(self._source, list(IMAGE_EXTS))
+            )
+            self.fps = folder_fps
+            self.frame_count = len(self._paths)
+            self._capture = None
+        else:
+            self._paths = None
+            self._capture = cv.VideoCapture(str(self._source))
+            if not self._capture.isOpened():
+                raise IOError(f'Unable to open video: {str(self._source)}.')
+            self.fps = self._capture.get(cv.CAP_PROP_FPS) or folder_fps
+            self.frame_count = int(
+                self._capture.get(cv.CAP_PROP_FRAME_COUNT)
+            )
+        self._thread = threading.Thread(
+            target=self._run,
+            name='frame_reader',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _frames(self) -> Iterator[np.ndarray]:
+        if self._capture is not None:
+            while True:
+                success, frame = self._capture.read()
+                if not success:
+                    return
+                yield frame
+        for path in self._paths:
+            frame = cv.imread(str(path), cv.IMREAD_COLOR)
+            if frame is None:
+                logger.warning(f'Unable to read frame: {str(path)}.')
+                continue
+            yield frame
+
+    def _run(self) -> None:
+        try:
+            for frame in self._frames():
+                if self._stop.is_set():
+                    break
+                self._q.put(frame)
+        except BaseException as e:
+            self._error = e
+        finally:
+            if self._capture is not None:
+                self._capture.release()
+            self._q.put(_END_OF_STREAM)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        while True:
+            frame = self._q.get()
+            if frame is _END_OF_STREAM:
+                break
+            yield frame
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        """Stops decoding, frames which weren't read are discarded."""
+        self._stop.set()
+        # unblock the reader if the queue is full
+        while self._thread.is_alive():
+            try:
+                self._q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+
+def aligned_face_transform(alignment: np.ndarray, size: int) -> np.ndarray:
+    """Affine transform from the frame to the aligned face image made by
+    `FaceAligner.align_face`, i.e. warp to the padded image and resize.
+
+    Parameters
+    ----------
+    alignment : np.ndarray
+        alignment matrix of the face
+    size : int
+        size of the aligned face image
+
+    Returns
+    -------
+    np.ndarray
+        2x3 transformation matrix
+    """
+    padding = size // 4
+    transform = alignment * size
+    transform[:, 2] += padding
+    return transform * (size / (size + padding * 2))
+
+
+def feather_mask(
+    mask: np.ndarray,
+    feather: Optional[int] = None,
+) -> np.ndarray:
+    """Makes alpha mask which fades out towards the edge of the face mask.
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        face mask with values 0 and 1
+    feather : Optional[int], optional
+        width of the fading edge in pixels, by default 1/16 of the mask size
+
+    Returns
+    -------
+    np.ndarray
+        float32 alpha mask in 0..1 range
+    """
+    if feather is None:
+        feather = max(1, mask.shape[0] // 16)
+    kernel = np.ones((feather, feather), np.uint8)
+    eroded = cv.erode(mask.astype(np.float32), kernel)
+    ksize = 2 * feather + 1
+    return cv.GaussianBlur(eroded, (ksize, ksize), 0)
+
+
+def seamless_merge(
+    aligned_image: np.ndarray,
+    prediction: np.ndarray,
+    mask: np.ndarray,
+) -> np.ndarray:
+    """Merges predicted face with the aligned image using Poisson blending.
+
+    Parameters
+    ----------
+    aligned_image : np.ndarray
+        aligned face image, BGR uint8
+    prediction : np.ndarray
+        predicted face of the same size, BGR uint8
+    mask : np.ndarray
+        aligned face mask with values 0 and 1
+
+    Returns
+    -------
+    np.ndarray
+        merged image, BGR uint8, copy of the aligned image if the mask is
+        empty
+    """
+    max_region = np.argwhere(mask > 0)
+    if not len(max_region):
+        # nothing to blend, one bad face mustn't abort the whole video
+        return aligned_image.copy()
+
+    mask_3 = mask[:, :, np.newaxis]
+    clone = aligned_image * (1 - mask_3) + prediction * mask_3
+
+    min_y, min_x = max_region.min(axis=0)
+    max_y, max_x = max_region.max(axis=0)
+    center = (int(min_x + (max_x - min_x) // 2),
+              int(min_y + (max_y - min_y) // 2))
+
+    return cv.seamlessClone(
+        clone.astype(np.uint8),
+        aligned_image,
+        (mask * 255).astype(np.uint8),
+        center,
+        cv.NORMAL_CLONE,
+    )
+
+
+def paste_face(
+    frame: np.ndarray,
+    face_image: np.ndarray,
+    alpha: np.ndarray,
+    transform: np.ndarray,
+) -> None:
+    """Warps face image back to the frame and blends it in place, only the
+    region of the frame covered by the face is touched.
+
+    Parameters
+    ----------
+    frame : np.ndarray
+        frame which is modified
+    face_image : np.ndarray
+        aligned face image
+    alpha : np.ndarray
+        alpha mask of the aligned face image, float in 0..1 range
+    transform : np.ndarray
+        transform from the frame to the aligned face image
+    """
+    inverse = cv.invertAffineTransform(transform)
+    h, w = face_image.shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [0, h], [w, h]]).reshape(-1, 1, 2)
+    corners = cv.transform(corners, inverse).reshape(-1, 2)
+    frame_h, frame_w = frame.shape[:2]
+    x0, y0 = np.maximum(np.floor(corners.min(axis=0)).astype(int), 0)
+    x1, y1 = np.minimum(
+        np.ceil(corners.max(axis=0)).astype(int),
+        (frame_w, frame_h),
+    )
+    if x1 <= x0 or y1 <= y0:
+        return
+    inverse[:, 2] -= (x0, y0)
+    size = (int(x1 - x0), int(y1 - y0))
+    face_w = cv.warpAffine(
+        face_image,
+        inverse,
+        size,
+        flags=cv.INTER_LINEAR,
+        borderMode=cv.BORDER_REPLICATE,
+    )
+    alpha_w = cv.warpAffine(alpha, inverse, size)[:, :, np.newaxis]
+    roi = frame[y0:y1, x0:x1]
+    roi[:] = (face_w * alpha_w + roi * (1 - alpha_w)).astype(np.uint8)
+
+
+class FaceSwapper:
+    """Swaps faces in every frame of the video or folder with the
+    autoencoder.
+
+    Parameters
+    ----------
+    model : torch.nn.Module
+        autoencoder which returns swapped face as the third output, e.g.
+        `OriginalAE`
+    fdm : Any
+        face detection model
+    ldm : Any
+        landmark detection model
+    device : DEVICE
+        device of the autoencoder
+    image_size : int, optional
+        size of the autoencoder input, by default 64
+    batch_size : int, optional
+        number of faces swapped at once, by default 32
+    blend : BLEND, optional
+        how swapped face is blended with the frame, by default BLEND.FEATHER
+    num_workers : Optional[int], optional
+        number of blending threads, by default number of CPUs
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        fdm,
+        ldm,
+        device: DEVICE,
+        image_size: int = 64,
+        batch_size: int = 32,
+        blend: BLEND = BLEND.FEATHER,
+        num_workers: Optional[int] = None,
+    ) -> None:
+        self._model = model
+        self._fdm = fdm
+        self._ldm = ldm
+        self._device = device
+        self._image_size = image_size
+        self._batch_size = batch_size
+        self._blend = blend
+        self._num_workers = num_workers or os.cpu_count() or 1
+
+    def _detect(self, frame: np.ndarray, frame_num: int) -> List[Face]:
+        # `Image` needs path of the supported format, frame has none
+        image = Image(Path(f'{frame_num}.png'), frame)
+        faces = self._fdm.detect_faces(image)
+        for face in faces:
+            face.raw_image = image
+            face.landmarks = self._ldm.detect_landmarks(face)
+            FaceAligner.align_face(face, self._image_size)
+        return faces
+
+    @torch.no_grad()
+    def _swap(self, faces: List[Face]) -> np.ndarray:
+        batch = np.stack([face.aligned_image for face in faces])
+        x = torch.from_numpy(batch).to(self._device.value)
+        x = x.permute(0, 3, 1, 2).float().div(255)
+        _, _, swapped, _ = self._model(x)
+        swapped = swapped.clamp(0, 1).mul(255).round().to(torch.uint8)
+        return swapped.permute(0, 2, 3, 1).cpu().numpy()
+
+    def _blend_frame(
+        self,
+        frame: np.ndarray,
+        faces: List[Tuple[Face, np.ndarray]],
+    ) -> np.ndarray:
+        for face, swapped in faces:
+            mask = face.aligned_mask
+            if self._blend == BLEND.SEAMLESS:
+                swapped = seamless_merge(face.aligned_image, swapped, mask)
+            paste_face(
+                frame,
+                swapped,
+                feather_mask(mask),
+                aligned_face_transform(face.alignment, self._image_size),
+            )
+        return frame
+
+    def swap(
+        self,
+        source: Union[str, Path],
+        output_path: Union[str, Path],
+        progress: Optional[Callable[[int, int], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        fourcc: str = 'mp4v',
+    ) -> int:
+        """Swaps faces of the whole video or folder of frames and writes
+        result to the video.
+
+        Parameters
+        ----------
+        source : Union[str, Path]
+            video file or directory with frames
+        output_path : Union[str, Path]
+            path of the output video
+        progress : Optional[Callable[[int, int], None]], optional
+            called with the number of written frames and number of all
+            frames, by default None
+        should_stop : Optional[Callable[[], bool]], optional
+            checked before every frame, processing stops if it returns True,
+            by default None
+        fourcc : str, optional
+            codec of the output video, by default 'mp4v'
+
+        Returns
+        -------
+        int
+            number of written frames
+        """
+        reader = FrameReader(source)
+        frames_q: queue.Queue = queue.Queue(self._batch_size * 4)
+        state = {'written': 0, 'error': None}
+
+        def _encode() -> None:
+            video = None
+            try:
+                while True:
+                    item = frames_q.get()
+                    if item is _END_OF_STREAM:
+                        break
+                    frame = item.result() if isinstance(item, Future) \
+                        else item
+                    if video is None:
+                        video = cv.VideoWriter(
+                            str(output_path),
+                            cv.VideoWriter_fourcc(*fourcc),
+                            reader.fps,
+                            (frame.shape[1], frame.shape[0]),
+                        )
+                    video.write(frame)
+                    state['written'] += 1
+                    if progress is not None:
+                        progress(state['written'], reader.frame_count)
+            except Exception as e:
+                state['error'] = e
+                while frames_q.get() is not _END_OF_STREAM:
+                    pass
+            finally:
+                if video is not None:
+                    video.release()
+
+        encoder = threading.Thread(target=_encode, daemon=True)
+        encoder.start()
+        # frames waiting for their faces to be swapped, in the frame order
+        pending: List[Tuple[np.ndarray, List[Face]]] = []
+        n_faces = 0
+
+        def _flush(executor: ThreadPoolExecutor) -> None:
+            faces = [face for _, frame_faces in pending
+                     for face in frame_faces]
+            swapped = iter(self._swap(faces)) if faces else iter([])
+            for frame, frame_faces in pending:
+                if not frame_faces:
+                    frames_q.put(frame)
+                    continue
+                frame_swaps = [(face, next(swapped)) for face in frame_faces]
+                frames_q.put(
+                    executor.submit(self._blend_frame, frame, frame_swaps)
+                )
+            pending.clear()
+
+        try:
+            with ThreadPoolExecutor(self._num_workers) as executor:
+                for frame_num, frame in enumerate(reader):
+                    if state['error'] is not None or \
+                            (should_stop is not None and should_stop()):
+                        break
+                    faces = self._detect(frame, frame_num)
+                    pending.append((frame, faces))
+                    n_faces += len(faces)
+                    # frames without faces also wait for the batch so the
+                    # order is kept, their number is bounded too
+                    if n_faces >= self._batch_size or \
+                            len(pending) >= self._batch_size:
+                        _flush(executor)
+                        n_faces = 0
+                if state['error'] is None:
+                    _flush(executor)
+        finally:
+            frames_q.put(_END_OF_STREAM)
+            encoder.join()
+            reader.close()
+
+        if state['error'] is not None:
+            raise state['error']
+        return state['written']
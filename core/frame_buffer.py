@@ -0,0 +1,263 @@
+from __future__ import annotations
+import logging
+from multiprocessing import Queue
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# index message which tells consumers that no more frames will arrive
+END_OF_STREAM = None
+
+
+class SharedFrameRingBuffer:
+    """Ring buffer of fixed size frame slots which lives in shared memory so
+    frames can be passed between processes without pickling them. Every slot
+    holds one `height x width x 3` uint8 frame. Only small index messages
+    (slot index and frame index) travel through the queues, frame data is
+    written once by the producer and read in place by the consumer.
+
+    Object can be passed as an argument to the `multiprocessing.Process`,
+    on the other side it reattaches to the same shared memory block.
+
+    Parameters
+    ----------
+    num_slots : int
+        number of frames which can be in flight at once
+    height : int
+        height of the frame
+    width : int
+        width of the frame
+    name : Optional[str], optional
+        name of the shared memory block, if not provided, random name is
+        generated, by default None
+    """
+
+    def __init__(
+        self,
+        num_slots: int,
+        height: int,
+        width: int,
+        name: Optional[str] = None,
+    ) -> None:
+        self._num_slots = num_slots
+        self._frame_shape = (height, width, 3)
+        size = num_slots * height * width * 3
+        self._shm = SharedMemory(name=name, create=True, size=size)
+        self._owner = True
+        self._free_q = Queue(num_slots)
+        self._filled_q = Queue(num_slots + 1)
+        for slot in range(num_slots):
+            self._free_q.put(slot)
+        self._slots = self._make_slots()
+
+    def _make_slots(self) -> np.ndarray:
+        return np.ndarray(
+            (self._num_slots, *self._frame_shape),
+            dtype=np.uint8,
+            buffer=self._shm.buf,
+        )
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # numpy view can't be pickled, it is recreated on the other side
+        del state['_slots']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._owner = False
+        self._slots = self._make_slots()
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def num_slots(self) -> int:
+        return self._num_slots
+
+    @property
+    def frame_shape(self) -> Tuple[int, int, int]:
+        return self._frame_shape
+
+    def put(
+        self,
+        frame: np.ndarray,
+        frame_idx: int,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Copies `frame` into the first free slot and notifies consumers.
+        Blocks if all slots are currently taken by consumers.
+
+        Parameters
+        ----------
+        frame : np.ndarray
+            frame in `height x width x 3` uint8 format
+        frame_idx : int
+            index of the frame in the video
+        timeout : Optional[float], optional
+            how long to wait for the free slot, by default None
+
+        Raises
+        ------
+        ValueError
+            if the frame shape does not match slot shape
+        """
+        if frame.shape != self._frame_shape:
+            raise ValueError(
+                f'Frame of shape {frame.shape} does not fit into slot of ' +
+                f'shape {self._frame_shape}.'
+            )
+        slot = self._free_q.get(timeout=timeout)
+        self._slots[slot] = frame
+        self._filled_q.put((slot, frame_idx))
+
+    def get(
+        self,
+        timeout: Optional[float] = None,
+    ) -> Union[Tuple[int, int, np.ndarray], None]:
+        """Takes next filled slot. Returned frame is a view into the shared
+        memory and is valid only until `release` is called for the slot, copy
+        it if it has to live longer.
+
+        Parameters
+        ----------
+        timeout : Optional[float], optional
+            how long to wait for the frame, by default None
+
+        Returns
+        -------
+        Union[Tuple[int, int, np.ndarray], None]
+            slot index, frame index and the frame view or `None` if the
+            producer finished
+        """
+        msg = self._filled_q.get(timeout=timeout)
+        if msg is END_OF_STREAM:
+            return None
+        slot, frame_idx = msg
+        return slot, frame_idx, self._slots[slot]
+
+    def release(self, slot: int) -> None:
+        """Gives slot back to the producer.
+
+        Parameters
+        ----------
+        slot : int
+            slot index obtained from `get`
+        """
+        self._free_q.put(slot)
+
+    def frames(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Iterates over frames until producer signals the end of stream.
+        Slot is released when the consumer asks for the next frame.
+
+        Yields
+        ------
+        Iterator[Tuple[int, np.ndarray]]
+            frame index and the frame view
+        """
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            slot, frame_idx, frame = item
+            try:
+                yield frame_idx, frame
+            finally:
+                self.release(slot)
+
+    def finish(self, num_consumers: int = 1) -> None:
+        """Signals every consumer that no more frames will be produced.
+
+        Parameters
+        ----------
+        num_consumers : int, optional
+            how many consumers read from this buffer, by default 1
+        """
+        for _ in range(num_consumers):
+            self._filled_q.put(END_OF_STREAM)
+
+    def close(self) -> None:
+        """Detaches from the shared memory, process which created the buffer
+        also releases the memory block.
+        """
+        self._slots = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            logger.debug(f'Released shared memory block {self._shm.name}.')
+
+    def __enter__(self) -> SharedFrameRingBuffer:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def get_video_frame_shape(video_path: Union[str, Path]) -> Tuple[int, int]:
+    """Reads height and width of the video frames.
+
+    Parameters
+    ----------
+    video_path : Union[str, Path]
+        path to the video
+
+    Returns
+    -------
+    Tuple[int, int]
+        height and width of the frame
+    """
+    capture = cv.VideoCapture(str(video_path))
+    height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+    width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+    capture.release()
+    return height, width
+
+
+def decode_video_to_buffer(
+    video_path: Union[str, Path],
+    buffer: SharedFrameRingBuffer,
+    every_nth: int = 1,
+    num_consumers: int = 1,
+) -> int:
+    """Decodes video and feeds every `every_nth` frame into the `buffer`.
+    Intended to be a target of the decoder process.
+
+    Parameters
+    ----------
+    video_path : Union[str, Path]
+        path to the video
+    buffer : SharedFrameRingBuffer
+        buffer to which frames are written
+    every_nth : int, optional
+        take every n-th frame, by default 1
+    num_consumers : int, optional
+        number of processes reading from the buffer, by default 1
+
+    Returns
+    -------
+    int
+        number of frames written to the buffer
+    """
+    capture = cv.VideoCapture(str(video_path))
+    frames_num = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+    written = 0
+    try:
+        for i in range(frames_num):
+            capture.grab()
+            if i % every_nth != 0:
+                continue
+            success, frame = capture.retrieve()
+            if not success:
+                continue
+            buffer.put(frame, i)
+            written += 1
+    finally:
+        capture.release()
+        buffer.finish(num_consumers)
+    return written
@@ -1,9 +1,19 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Union
+import threading
+from typing import Deque, Iterable, Iterator, Optional, Tuple, Union
 
 import cv2 as cv
 import numpy as np
+from PIL import Image as PILImage
+
+try:
+    from turbojpeg import TJPF_BGR, TJPF_GRAY, TurboJPEG
+    TURBOJPEG_INSTALLED = True
+except ImportError:
+    TURBOJPEG_INSTALLED = False
 
 from core.exception import (
     FileDoesNotExistsError,
@@ -12,13 +22,102 @@ from core.exception import (
 )
 from enums import IMAGE_FORMAT
 
+# decoding at 1/2, 1/4 or 1/8 of the size is done by the JPEG decoder
+# itself and is much faster than decoding whole image and resizing it
+REDUCE_FACTORS = (8, 4, 2)
+_REDUCED_FLAGS = {
+    (True, 2): cv.IMREAD_REDUCED_COLOR_2,
+    (True, 4): cv.IMREAD_REDUCED_COLOR_4,
+    (True, 8): cv.IMREAD_REDUCED_COLOR_8,
+    (False, 2): cv.IMREAD_REDUCED_GRAYSCALE_2,
+    (False, 4): cv.IMREAD_REDUCED_GRAYSCALE_4,
+    (False, 8): cv.IMREAD_REDUCED_GRAYSCALE_8,
+}
+_JPEG_EXTS = ('.jpg', '.jpeg')
+_EXIF_ORIENTATION = 0x0112
+# EXIF orientations which swap width and height of the image
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# TurboJPEG instance isn't shared between threads
+_turbojpeg = threading.local()
+
+
+def _get_turbojpeg() -> TurboJPEG:
+    if not hasattr(_turbojpeg, 'decoder'):
+        _turbojpeg.decoder = TurboJPEG()
+    return _turbojpeg.decoder
+
+
+def _read_jpeg_header(path: Path) -> Tuple[int, int, int]:
+    """Reads width, height and EXIF orientation of the JPEG image without
+    decoding it. Width and height are of the image after the orientation is
+    applied, same as `cv.imread` returns it.
+    """
+    with PILImage.open(path) as header:
+        width, height = header.size
+        orientation = header.getexif().get(_EXIF_ORIENTATION, 1)
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height, orientation
+
+
+def _apply_orientation(data: np.ndarray, orientation: int) -> np.ndarray:
+    """Rotates and flips decoded image according to the EXIF orientation,
+    for decoders which, unlike `cv.imread`, ignore it.
+    """
+    if orientation == 2:
+        return cv.flip(data, 1)
+    if orientation == 3:
+        return cv.rotate(data, cv.ROTATE_180)
+    if orientation == 4:
+        return cv.flip(data, 0)
+    if orientation == 5:
+        return cv.transpose(data)
+    if orientation == 6:
+        return cv.rotate(data, cv.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv.rotate(cv.transpose(data), cv.ROTATE_180)
+    if orientation == 8:
+        return cv.rotate(data, cv.ROTATE_90_COUNTERCLOCKWISE)
+    return data
+
+
+def reduce_factor(size: Tuple[int, int], max_pixels: int) -> int:
+    """Biggest factor from `REDUCE_FACTORS` by which the image of `size`
+    can be reduced and still have at least `max_pixels` pixels, so the
+    consumer which resizes image to `max_pixels` doesn't lose quality.
+
+    Parameters
+    ----------
+    size : Tuple[int, int]
+        width and height of the image
+    max_pixels : int
+        number of pixels the consumer needs
+
+    Returns
+    -------
+    int
+        reduce factor, 1 if image can't be reduced
+    """
+    width, height = size
+    for factor in REDUCE_FACTORS:
+        if (width // factor) * (height // factor) >= max_pixels:
+            return factor
+    return 1
+
 
 class Image:
     """Simple class for storing image data, format and other things of interest
     when dealing with images.
     """
 
-    def __init__(self, path: Path, data: np.ndarray) -> None:
+    def __init__(
+        self,
+        path: Path,
+        data: np.ndarray,
+        scale: float = 1.,
+        original_size: Optional[Tuple[int, int]] = None,
+    ) -> None:
         """Constructor.
 
         Parameters
@@ -27,6 +126,12 @@ class Image:
             path to the image
         data : np.ndarray
             image in an array format
+        scale : float, optional
+            size of the `data` relative to the size of the image on `path`,
+            less than 1 if image was decoded at reduced size, by default 1.
+        original_size : Optional[Tuple[int, int]], optional
+            width and height of the image on `path` if image was decoded at
+            reduced size, by default None
 
         Raises
         ------
@@ -40,6 +145,8 @@ class Image:
 
         self._path = path
         self._data = data
+        self._scale = scale
+        self._original_size = original_size
         self._format = IMAGE_FORMAT[ext.split('.')[1].upper()]
         self._name = path.stem
 
@@ -63,16 +170,72 @@ class Image:
     def name(self) -> str:
         return self._name
 
+    @property
+    def scale(self) -> float:
+        """Size of the `data` relative to the original image, coordinates
+        on the `data` are divided by it to get coordinates on the original
+        image.
+        """
+        return self._scale
+
+    @property
+    def original_shape(self) -> Tuple[int, ...]:
+        """Shape of the image on the disk, differs from `shape` only if
+        image was decoded at reduced size.
+        """
+        if self._original_size is None:
+            return self.shape
+        width, height = self._original_size
+        return (height, width, *self.shape[2:])
+
+    @staticmethod
+    def _decode(
+        path: Path,
+        color: bool,
+        factor: int,
+        orientation: int,
+    ) -> np.ndarray:
+        if TURBOJPEG_INSTALLED and path.suffix.lower() in _JPEG_EXTS:
+            with open(path, 'rb') as f:
+                buffer = f.read()
+            data = _get_turbojpeg().decode(
+                buffer,
+                pixel_format=TJPF_BGR if color else TJPF_GRAY,
+                scaling_factor=(1, factor),
+            )
+            # cv.imread applies EXIF orientation, TurboJPEG doesn't
+            return _apply_orientation(data, orientation)
+        if factor == 1:
+            flags = cv.IMREAD_COLOR if color else cv.IMREAD_GRAYSCALE
+        else:
+            flags = _REDUCED_FLAGS[(color, factor)]
+        return cv.imread(str(path), flags)
+
     @staticmethod
-    def load(path: Union[str, Path], color: bool = True) -> Image:
+    def load(
+        path: Union[str, Path],
+        color: bool = True,
+        max_pixels: Optional[int] = None,
+    ) -> Image:
         """Loads image from the provided `path`.
 
+        If the consumer of the image resizes it anyway, e.g. face detector,
+        `max_pixels` can be passed and JPEG image is decoded at the smallest
+        of 1/2, 1/4 or 1/8 of its size which still has that many pixels.
+        Other formats are always decoded at full size. Size of the decoded
+        image relative to the original is in `Image.scale`.
+        JPEG images are decoded with TurboJPEG if it's installed. EXIF
+        orientation is applied by both decoders.
+
         Parameters
         ----------
         path : Union[str, Path]
             path to the image
         color : bool, optional
             load image in color or grayscale, by default True
+        max_pixels : Optional[int], optional
+            number of pixels the consumer needs, by default None for the
+            full size
 
         Returns
         -------
@@ -95,9 +258,76 @@ class Image:
         if not path.is_file():
             raise NotFileError(path)
 
-        flags = cv.IMREAD_COLOR
-        if not color:
-            flags = cv.IMREAD_GRAYSCALE
+        factor = 1
+        orientation = 1
+        # only JPEG decoder can decode at reduced size, other formats would
+        # be decoded whole anyway
+        if path.suffix.lower() in _JPEG_EXTS \
+                and (max_pixels is not None or TURBOJPEG_INSTALLED):
+            width, height, orientation = _read_jpeg_header(path)
+            if max_pixels is not None:
+                factor = reduce_factor((width, height), max_pixels)
+
+        data = Image._decode(path, color, factor, orientation)
+        if factor == 1:
+            return Image(path, data)
+        return Image(path, data, data.shape[1] / width, (width, height))
+
+
+class ImagePrefetcher:
+    """Loads images in the background threads while the consumer processes
+    already loaded ones. Images are returned in the order of `paths`.
+    Decoding releases the GIL so images are really decoded in parallel.
+
+    Parameters
+    ----------
+    paths : Iterable[Union[str, Path]]
+        paths of the images
+    color : bool, optional
+        load images in color or grayscale, by default True
+    max_pixels : Optional[int], optional
+        see `Image.load`, by default None
+    num_workers : int, optional
+        number of decoding threads, by default 4
+    prefetch : int, optional
+        maximum number of loaded images waiting for the consumer, by
+        default 8
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Union[str, Path]],
+        color: bool = True,
+        max_pixels: Optional[int] = None,
+        num_workers: int = 4,
+        prefetch: int = 8,
+    ) -> None:
+        self._paths = paths
+        self._color = color
+        self._max_pixels = max_pixels
+        self._num_workers = num_workers
+        self._prefetch = max(prefetch, 1)
 
-        data = cv.imread(str(path), flags)
-        return Image(path, data)
+    def __iter__(self) -> Iterator[Image]:
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(
+            self._num_workers,
+            thread_name_prefix='image_prefetcher',
+        ) as pool:
+            try:
+                for path in self._paths:
+                    pending.append(pool.submit(
+                        Image.load,
+                        path,
+                        self._color,
+                        self._max_pixels,
+                    ))
+                    if len(pending) >= self._prefetch:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # consumer stopped early, images which weren't started
+                # aren't loaded
+                for future in pending:
+                    future.cancel()
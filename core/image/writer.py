@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import threading
+from typing import List, Optional, Union
+
+import cv2 as cv
+import numpy as np
+
+from enums import IMAGE_FORMAT
+
+
+def imwrite_params(image_format: IMAGE_FORMAT, quality: int) -> List[int]:
+    """OpenCV `imwrite` parameters for the quality of the `image_format`.
+
+    Parameters
+    ----------
+    image_format : IMAGE_FORMAT
+        format of the written images
+    quality : int
+        JPEG quality in 0..100 range or PNG compression level in 0..9
+            range, lower level is faster and makes bigger files
+
+    Returns
+    -------
+    List[int]
+        `imwrite` parameters
+    """
+    if image_format == IMAGE_FORMAT.JPG:
+        return [cv.IMWRITE_JPEG_QUALITY, quality]
+    return [cv.IMWRITE_PNG_COMPRESSION, quality]
+
+
+class AsyncImageWriter:
+    """Writes images in a thread pool so the caller doesn't wait for the
+    encoding and disk. Number of images waiting to be written is bounded,
+    `write` blocks when the limit is reached so memory stays constant.
+
+    Args:
+        num_workers (int, optional): number of writer threads, by default 2
+        max_in_flight (int, optional): maximal number of images waiting to
+            be written, by default 64
+    """
+
+    def __init__(self, num_workers: int = 2, max_in_flight: int = 64) -> None:
+        self._executor = ThreadPoolExecutor(num_workers)
+        self._slots = threading.Semaphore(max_in_flight)
+        self._error = None
+
+    def _write(self, path: str, image: np.ndarray, params: List[int]) -> None:
+        try:
+            if not cv.imwrite(path, image, params):
+                raise IOError(f'Unable to write image: {path}.')
+        except Exception as e:
+            self._error = e
+        finally:
+            self._slots.release()
+
+    def write(
+        self,
+        path: Union[str, Path],
+        image: np.ndarray,
+        params: Optional[List[int]] = None,
+    ) -> None:
+        """Schedules image write, `image` must not be modified afterwards.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            where image is saved
+        image : np.ndarray
+            image to save
+        params : Optional[List[int]], optional
+            OpenCV `imwrite` parameters, by default None
+        """
+        if self._error is not None:
+            raise self._error
+        self._slots.acquire()
+        self._executor.submit(self._write, str(path), image, params or [])
+
+    def close(self) -> None:
+        """Waits for all scheduled writes to finish.
+
+        Raises
+        ------
+        Exception
+            first error which happened while writing
+        """
+        self._executor.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -1,7 +1,6 @@
 from typing import Tuple, Union
 
 import cv2 as cv
-from numba import jit
 import numpy as np
 import torch
 
@@ -104,140 +103,64 @@ def crop(
     return newImg
 
 
-@jit(nopython=True)
-def transform_np(
-    point: np.ndarray,
-    center: np.ndarray,
-    scale: float,
-    resolution: float,
-    invert: bool = False,
-) -> np.ndarray:
-    """Generate an affine transformation matrix. Given a set of points, a
-    center, a scale and a targer resolution, the function generates and
-    affine transformation matrix. If invert is ``True`` it will produce
-    the inverse transformation.
-
-    Parameters
-    ----------
-    point : np.ndarray
-        the input 2D point
-    center : np.ndarray
-        the center around which to perform the transformations
-    scale : float
-        the scale of the face/object
-    resolution : float
-        the output resolution
-    invert : bool, optional
-        should transformation be inverted, by default False
-
-    Returns
-    -------
-    np.ndarray
-        transformation matrix
-    """
-    _pt = np.ones(3)
-    _pt[0] = point[0]
-    _pt[1] = point[1]
-
-    h = 200.0 * scale
-    t = np.eye(3)
-    t[0, 0] = resolution / h
-    t[1, 1] = resolution / h
-    t[0, 2] = resolution * (-center[0] / h + 0.5)
-    t[1, 2] = resolution * (-center[1] / h + 0.5)
-
-    if invert:
-        t = np.ascontiguousarray(np.linalg.pinv(t))
-
-    new_point = np.dot(t, _pt)[0:2]
-
-    return new_point.astype(np.int32)
-
-
 def get_preds_fromhm(
     hm: np.ndarray,
-    center: torch.Tensor = None,
-    scale: float = None,
+    center: Union[np.ndarray, torch.Tensor] = None,
+    scale: Union[float, np.ndarray] = None,
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """Obtain (x,y) coordinates given a set of N heatmaps. If the center
     and the scale is provided the function will return the points also in
     the original coordinate frame.
 
+    Decoding is vectorized over all heatmaps: position of the maximum of
+    every heatmap is moved by a quarter of a pixel towards its higher
+    neighbour and points are mapped back to the original frame with the
+    inverse of the `crop` transformation of every face.
+
     Parameters
     ----------
     hm : np.ndarray
-        the predicted heatmaps, of shape [B, N, W, H]
-    center : torch.Tensor, optional
-        the center of the bounding box, by default None
-    scale : float, optional
-        face scale, by default None
+        the predicted heatmaps, of shape [B, N, H, W]
+    center : Union[np.ndarray, torch.Tensor], optional
+        the center of the bounding box, of shape [2] or [B, 2] for one
+        center per face, by default None
+    scale : Union[float, np.ndarray], optional
+        face scale, one or one per face, by default None
 
     Returns
     -------
     Tuple[np.ndarray, np.ndarray, np.ndarray]
-        landmarks from heatmap
+        landmarks in heatmap coordinates and in the original frame, both
+            of shape [B, N, 2], and the heatmap maximums of shape [B, N]
     """
     B, C, H, W = hm.shape
     hm_reshape = hm.reshape(B, C, H * W)
     idx = np.argmax(hm_reshape, axis=-1)
-    scores = np.take_along_axis(hm_reshape, np.expand_dims(
-        idx, axis=-1), axis=-1).squeeze(-1)
-    preds, preds_orig = _get_preds_fromhm(hm, idx, center, scale)
-
-    return preds, preds_orig, scores
-
-
-@jit(nopython=True)
-def _get_preds_fromhm(
-    hm: np.ndarray,
-    idx: torch.Tensor,
-    center: torch.Tensor = None,
-    scale: float = None,
-) -> Tuple[np.ndarray, np.ndarray]:
-    """Obtain (x,y) coordinates given a set of N heatmaps and the
-    coresponding locations of the maximums. If the center and the scale is
-    provided the function will return the points also in the original
-    coordinate frame.
-
-    Parameters
-    ----------
-    hm : np.ndarray
-        the predicted heatmaps, of shape [B, N, W, H]
-    idx : np.ndarray
-        index
-    center : torch.Tensor, optional
-        the center of the bounding box, by default None
-    scale : float, optional
-        face scale, by default None
-
-    Returns
-    -------
-    Tuple[np.ndarray, np.ndarray]
-        landmarks from heatmap
-    """
-    B, C, H, W = hm.shape
-    idx += 1
-    preds = idx.repeat(2).reshape(B, C, 2).astype(np.float32)
-    preds[:, :, 0] = (preds[:, :, 0] - 1) % W + 1
-    preds[:, :, 1] = np.floor((preds[:, :, 1] - 1) / H) + 1
-
-    for i in range(B):
-        for j in range(C):
-            hm_ = hm[i, j, :]
-            pX, pY = int(preds[i, j, 0]) - 1, int(preds[i, j, 1]) - 1
-            if pX > 0 and pX < 63 and pY > 0 and pY < 63:
-                diff = np.array(
-                    [hm_[pY, pX + 1] - hm_[pY, pX - 1],
-                     hm_[pY + 1, pX] - hm_[pY - 1, pX]])
-                preds[i, j] += np.sign(diff) * 0.25
-
+    scores = np.take_along_axis(hm_reshape, idx[..., np.newaxis], axis=-1)
+    scores = scores.squeeze(-1)
+
+    x, y = idx % W, idx // W
+    # neighbours of the maximums on the border are clipped into the heatmap
+    # and their shift is discarded
+    inner = (x > 0) & (x < W - 1) & (y > 0) & (y < H - 1)
+    xc, yc = np.clip(x, 1, W - 2), np.clip(y, 1, H - 2)
+    b, c = np.ogrid[:B, :C]
+    diff = np.stack(
+        [
+            hm[b, c, yc, xc + 1] - hm[b, c, yc, xc - 1],
+            hm[b, c, yc + 1, xc] - hm[b, c, yc - 1, xc],
+        ],
+        axis=-1,
+    )
+    preds = np.stack([x, y], axis=-1).astype(np.float32) + 1
+    preds += np.sign(diff) * 0.25 * inner[..., np.newaxis]
     preds -= 0.5
 
     preds_orig = np.zeros_like(preds)
     if center is not None and scale is not None:
-        for i in range(B):
-            for j in range(C):
-                preds_orig[i, j] = transform_np(
-                    preds[i, j], center, scale, H, True)
+        center = np.asarray(center, dtype=np.float32).reshape(-1, 1, 2)
+        h = 200.0 * np.asarray(scale, dtype=np.float32).reshape(-1, 1, 1)
+        # inverse of the `transform` with resolution H
+        preds_orig[:] = np.trunc(preds * h / H + center - h / 2)
 
-    return preds, preds_orig
+    return preds, preds_orig, scores
@@ -1,3 +1,4 @@
+import cv2 as cv
 import numpy as np
 
 _mean_face_x = np.array([
@@ -48,11 +49,26 @@ class Landmarks:
             68 landmarks detected by landmark detection algorithm
         """
         self._dots = landmarks.astype(int)
+        self._hull = None
 
     @property
     def dots(self) -> np.ndarray:
         return self._dots
 
+    @property
+    def hull(self) -> np.ndarray:
+        """Convex polygon around all landmarks, calculated once.
+
+        Returns
+        -------
+        np.ndarray
+            int32 hull points of shape (N, 1, 2)
+        """
+        # landmarks pickled before the hull was cached don't have it
+        if getattr(self, '_hull', None) is None:
+            self._hull = cv.convexHull(self._dots.astype(np.int32))
+        return self._hull
+
     @property
     def face(self) -> np.ndarray:
         return self.dots[self._face_dots]
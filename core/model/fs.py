@@ -1,11 +1,43 @@
+import logging
+from typing import Optional
+
 import torch
 import torch.nn as nn
 
+from configs.app_config import APP_CONFIG
 from core.model.fs_networks import GeneratorAdainUpsample
 from core.model.pg_modules.blocks import IRBlock
 from core.model.pg_modules.projected_discriminator import \
     ProjectedDiscriminator
 from core.model.resnet import ResNet
+from enums import DEVICE
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_device(device: Optional[DEVICE] = None) -> DEVICE:
+    """Picks device for the model, falls back to the CPU if requested device
+    is not available on this machine.
+
+    Parameters
+    ----------
+    device : Optional[DEVICE], optional
+        requested device, if not provided, device selected in the
+        application is used, by default None
+
+    Returns
+    -------
+    DEVICE
+        device which can be used
+    """
+    if device is None:
+        device = APP_CONFIG.app.core.selected_device
+    if device not in APP_CONFIG.app.core.devices:
+        logger.warning(
+            f'Device {device.value} is not available, using CPU instead.'
+        )
+        device = DEVICE.CPU
+    return device
 
 
 class FS(nn.Module):
@@ -16,7 +48,20 @@ class FS(nn.Module):
         super().__init__()
 
     def initialize(self, opt):
+        """Constructs networks of the model.
+
+        Besides the model hyperparameters, `opt` can contain:
+            device (DEVICE): where networks are placed, by default device
+                selected in the application, CPU if it's not available
+            arc_path (Optional[Path]): ArcFace checkpoint, if `None`,
+                ArcFace is randomly initialized which is only useful for
+                profiling
+            pretrained_backbone (bool): whether feature network of the
+                projected discriminator uses pretrained weights, by
+                default True
+        """
         self._train = opt['train']
+        self.device = torch.device(resolve_device(opt.get('device')).value)
 
         # Generator network
         self.netG = GeneratorAdainUpsample(
@@ -26,17 +71,23 @@ class FS(nn.Module):
             n_blocks=9,
             deep=opt['gdeep'],
         )
-        self.netG.cuda()
+        self.netG.to(self.device)
 
-        netArc_checkpoint = torch.load(
-            opt['arc_path'],
-            map_location=torch.device('cpu'),
-        )
         self.netArc = ResNet(IRBlock, [3, 4, 23, 3])
         self.netArc.eval()
         self.netArc.requires_grad_(False)
-        self.netArc.load_state_dict(netArc_checkpoint['model'])
-        self.netArc = self.netArc.cuda()
+        arc_path = opt.get('arc_path')
+        if arc_path is not None:
+            netArc_checkpoint = torch.load(
+                arc_path,
+                map_location=torch.device('cpu'),
+            )
+            self.netArc.load_state_dict(netArc_checkpoint['model'])
+        else:
+            logger.warning(
+                'ArcFace checkpoint not provided, using random weights.'
+            )
+        self.netArc = self.netArc.to(self.device)
         # TODO try this
         if not self._train:
             pretrained_path = opt['checkpoints_dir']
@@ -46,8 +97,10 @@ class FS(nn.Module):
                 opt['which_epoch'],
                 pretrained_path)
             return
-        self.netD = ProjectedDiscriminator()
-        self.netD.cuda()
+        self.netD = ProjectedDiscriminator(
+            pretrained_backbone=opt.get('pretrained_backbone', True),
+        )
+        self.netD.to(self.device)
 
         if self._train:
             self.criterionFeat = nn.L1Loss()
@@ -63,4 +116,5 @@ class FS(nn.Module):
                 betas=(opt['beta1'], 0.99),
             )
 
-        torch.cuda.empty_cache()
+        if self.device.type == DEVICE.CUDA.value:
+            torch.cuda.empty_cache()
@@ -195,10 +195,10 @@ class MultiScaleD(nn.Module):
 
 class ProjectedDiscriminator(torch.nn.Module):
 
-    def __init__(self):
+    def __init__(self, pretrained_backbone=True):
         super().__init__()
 
-        self.feature_network = F_RandomProj()
+        self.feature_network = F_RandomProj(pretrained=pretrained_backbone)
         self.discriminator = MultiScaleD(
             channels=self.feature_network.CHANNELS,
             resolutions=self.feature_network.RESOLUTIONS,
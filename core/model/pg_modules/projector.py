@@ -92,11 +92,12 @@ def calc_channels(pretrained, inp_res=224):
     return channels
 
 
-def _make_projector(im_res, cout, proj_type, expand=False):
+def _make_projector(im_res, cout, proj_type, expand=False, pretrained=True):
     assert proj_type in [0, 1, 2], "Invalid projection type"
 
-    # Build pretrained feature network
-    model = timm.create_model('tf_efficientnet_lite0', pretrained=True)
+    # Build pretrained feature network, random init is only useful for
+    # profiling without downloading the weights
+    model = timm.create_model('tf_efficientnet_lite0', pretrained=pretrained)
     pretrained = _make_efficientnet(model)
 
     # determine resolution of feature maps, this is later used to calculate
@@ -150,6 +151,7 @@ class F_RandomProj(nn.Module):
         cout=64,
         expand=True,
         proj_type=2,  # 0 = no projection, 1 = cross channel mixing, 2 = cross scale mixing
+        pretrained=True,
     ):
         super().__init__()
 
@@ -163,6 +165,7 @@ class F_RandomProj(nn.Module):
             cout=self.cout,
             proj_type=self.proj_type,
             expand=self.expand,
+            pretrained=pretrained,
         )
         self.CHANNELS = self.pretrained.CHANNELS
         self.RESOLUTIONS = self.pretrained.RESOLUTIONS
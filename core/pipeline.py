@@ -0,0 +1,392 @@
+"""Headless runner of the whole deepfake detection pipeline over a directory
+of videos. Runs the same functions the GUI workers run in their process
+pools, just without the Qt event loop, so it can be used on servers and
+benchmarked in isolation.
+
+Example:
+    python -m core.pipeline --input_dir data/videos --model MRI
+"""
+import argparse
+from dataclasses import dataclass
+import json
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import cv2 as cv
+
+from core.df_detection.mri_gan.data_utils.face_detection import (
+    crop_faces_from_video,
+    extract_landmarks_from_video,
+)
+from core.df_detection.mri_gan.deep_fake_detect.inference import (
+    load_df_detector_model,
+    predict_video,
+)
+from core.df_detection.mri_gan.mri_gan.inference import predict_mri_for_video
+from core.df_detection.mri_gan.mri_gan.model import get_MRI_GAN
+from enums import DEVICE, MRI_GAN_DATASET, VIDEO_FORMAT
+from utils import get_file_paths_from_dir
+
+logger = logging.getLogger(__name__)
+
+# models are loaded once per pool process by the pool initializers
+_process_model = None
+
+
+@dataclass
+class StageStats:
+    """Throughput of one pipeline stage."""
+    name: str
+    workers: int
+    videos: int = 0
+    frames: int = 0
+    elapsed: float = 0.
+
+    @property
+    def videos_per_second(self) -> float:
+        return self.videos / self.elapsed if self.elapsed else 0.
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.
+
+    def __str__(self) -> str:
+        return f'{self.name:>10} | {self.workers:>7} | {self.videos:>6} | ' + \
+            f'{self.frames:>7} | {self.elapsed:>9.2f} | ' + \
+            f'{self.videos_per_second:>7.2f} | {self.frames_per_second:>8.2f}'
+
+
+@dataclass
+class PipelineConfiguration:
+    """Configuration of the headless pipeline.
+
+    Args:
+        input_dir (Union[str, Path]): directory with videos
+        output_dir (Optional[Union[str, Path]]): directory where landmarks,
+            crops, MRIs and predictions are saved, if not provided
+            `pipeline` directory is made in `input_dir`, by default None
+        model (MRI_GAN_DATASET): which deepfake detector to use, by
+            default MRI_GAN_DATASET.MRI
+        device (DEVICE): device for the models, by default DEVICE.CPU
+        landmarks_workers (int): processes for the face and landmark
+            detection, by default 2
+        crop_workers (int): processes for the face cropping, by default 2
+        mri_workers (int): processes for the MRI prediction, by default 1
+        detect_workers (int): processes for the deepfake detection, by
+            default 1
+        batch_size (int): batch size for the models, by default 8
+        fake_threshold (float): probability above which frame is fake, by
+            default 0.5
+        fake_fraction (float): fraction of fake frames needed to consider
+            whole video fake, by default 0.5
+    """
+    input_dir: Union[str, Path]
+    output_dir: Optional[Union[str, Path]] = None
+    model: MRI_GAN_DATASET = MRI_GAN_DATASET.MRI
+    device: DEVICE = DEVICE.CPU
+    landmarks_workers: int = 2
+    crop_workers: int = 2
+    mri_workers: int = 1
+    detect_workers: int = 1
+    batch_size: int = 8
+    fake_threshold: float = 0.5
+    fake_fraction: float = 0.5
+
+    def __post_init__(self) -> None:
+        self.input_dir = Path(self.input_dir)
+        if self.output_dir is None:
+            self.output_dir = self.input_dir / 'pipeline'
+        self.output_dir = Path(self.output_dir)
+
+
+def _count_files(directory: Path) -> int:
+    if not directory.is_dir():
+        return 0
+    return len(os.listdir(directory))
+
+
+def _landmarks_job(video_path: Path, landmarks_dir: Path) -> int:
+    extract_landmarks_from_video(
+        video_path,
+        landmarks_dir,
+        overwrite=True,
+        inference=True,
+    )
+    capture = cv.VideoCapture(str(video_path))
+    frames_num = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return frames_num
+
+
+def _crop_job(video_path: Path, landmarks_dir: Path, crops_dir: Path) -> int:
+    crop_faces_from_video(
+        video_path,
+        landmarks_dir,
+        crops_dir,
+        overwrite=True,
+        inference=True,
+    )
+    return _count_files(crops_dir / video_path.stem)
+
+
+def _init_mri_process(device: DEVICE) -> None:
+    global _process_model
+    _process_model = get_MRI_GAN(load_from_gd=True, device=device)
+    _process_model.eval()
+
+
+def _mri_job(
+    video_path: Path,
+    crops_dir: Path,
+    mri_dir: Path,
+    batch_size: int,
+    device: DEVICE,
+) -> int:
+    frames_dir = crops_dir / video_path.stem
+    if not frames_dir.is_dir():
+        return 0
+    predict_mri_for_video(
+        mri_dir,
+        frames_dir,
+        batch_size,
+        device,
+        overwrite=True,
+        inference=True,
+        mri_generator=_process_model,
+    )
+    return _count_files(mri_dir / video_path.stem)
+
+
+def _init_detect_process(model: MRI_GAN_DATASET, device: DEVICE) -> None:
+    global _process_model
+    _process_model = load_df_detector_model(model, device)
+
+
+def _detect_job(
+    video_path: Path,
+    frames_dir: Path,
+    fake_threshold: float,
+    fake_fraction: float,
+    batch_size: int,
+    device: DEVICE,
+) -> Tuple[int, Optional[Dict[str, Any]]]:
+    frames_dir = frames_dir / video_path.stem
+    frames = _count_files(frames_dir)
+    if frames == 0:
+        return 0, None
+    output = predict_video(
+        _process_model,
+        frames_dir,
+        fake_threshold,
+        fake_fraction,
+        batch_size,
+        0,
+        device,
+    )
+    return frames, {k.value: v for k, v in output.items()}
+
+
+class Pipeline:
+    """Runs landmark extraction, face cropping, MRI prediction and deepfake
+    detection on every video of the input directory. Every stage has its own
+    pool of processes and stages are run one after another.
+
+    Args:
+        configuration (PipelineConfiguration): pipeline configuration
+    """
+
+    def __init__(self, configuration: PipelineConfiguration) -> None:
+        self._conf = configuration
+        self._landmarks_dir = configuration.output_dir / 'landmarks'
+        self._crops_dir = configuration.output_dir / 'crops'
+        self._mri_dir = configuration.output_dir / 'mri'
+        self._stats: List[StageStats] = []
+
+    @property
+    def stats(self) -> List[StageStats]:
+        return self._stats
+
+    def _run_stage(
+        self,
+        name: str,
+        workers: int,
+        fun: Callable,
+        args: List[Tuple],
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+    ) -> List[Any]:
+        """Runs `fun` for every argument tuple in `args` in the pool of
+        `workers` processes and records stage throughput. Every job should
+        return number of processed frames or tuple where the first element
+        is the number of processed frames.
+        """
+        logger.info(f'Stage {name} started with {workers} processes.')
+        stats = StageStats(name, workers)
+        start = time.perf_counter()
+        with multiprocessing.Pool(workers, initializer, initargs) as pool:
+            jobs = [pool.apply_async(fun, a) for a in args]
+            results = [job.get() for job in jobs]
+        stats.elapsed = time.perf_counter() - start
+        stats.videos = len(results)
+        stats.frames = sum(
+            r[0] if isinstance(r, tuple) else r for r in results
+        )
+        self._stats.append(stats)
+        logger.info(f'Stage {name} finished in {stats.elapsed:.2f}s.')
+        return results
+
+    def run(self) -> Dict[str, Any]:
+        """Runs the whole pipeline.
+
+        Returns
+        -------
+        Dict[str, Any]
+            prediction for every video
+        """
+        conf = self._conf
+        video_paths = get_file_paths_from_dir(
+            conf.input_dir,
+            [vf.value for vf in VIDEO_FORMAT],
+        )
+        if not video_paths:
+            logger.warning(
+                f'No supported videos in folder: {str(conf.input_dir)}.'
+            )
+            return {}
+        logger.info(f'Found {len(video_paths)} videos.')
+
+        for d in [self._landmarks_dir, self._crops_dir, self._mri_dir]:
+            d.mkdir(parents=True, exist_ok=True)
+
+        self._run_stage(
+            'landmarks',
+            conf.landmarks_workers,
+            _landmarks_job,
+            [(vp, self._landmarks_dir) for vp in video_paths],
+        )
+        self._run_stage(
+            'crop',
+            conf.crop_workers,
+            _crop_job,
+            [(vp, self._landmarks_dir, self._crops_dir) for vp in video_paths],
+        )
+
+        frames_dir = self._crops_dir
+        if conf.model == MRI_GAN_DATASET.MRI:
+            self._run_stage(
+                'mri',
+                conf.mri_workers,
+                _mri_job,
+                [
+                    (
+                        vp,
+                        self._crops_dir,
+                        self._mri_dir,
+                        conf.batch_size,
+                        conf.device,
+                    )
+                    for vp in video_paths
+                ],
+                _init_mri_process,
+                (conf.device,),
+            )
+            frames_dir = self._mri_dir
+
+        results = self._run_stage(
+            'detect',
+            conf.detect_workers,
+            _detect_job,
+            [
+                (
+                    vp,
+                    frames_dir,
+                    conf.fake_threshold,
+                    conf.fake_fraction,
+                    conf.batch_size,
+                    conf.device,
+                )
+                for vp in video_paths
+            ],
+            _init_detect_process,
+            (conf.model, conf.device),
+        )
+
+        predictions = {
+            vp.name: output for vp, (_, output) in zip(video_paths, results)
+        }
+        predictions_path = conf.output_dir / 'predictions.json'
+        with open(predictions_path, 'w') as f:
+            json.dump(predictions, f, indent=4)
+        logger.info(f'Predictions saved to {str(predictions_path)}.')
+
+        return predictions
+
+    def summary(self) -> str:
+        """Formats per-stage throughput as a table.
+
+        Returns
+        -------
+        str
+            throughput table
+        """
+        header = f'{"stage":>10} | {"workers":>7} | {"videos":>6} | ' + \
+            f'{"frames":>7} | {"time [s]":>9} | {"video/s":>7} | ' + \
+            f'{"frame/s":>8}'
+        lines = [header, '-' * len(header)]
+        lines.extend(str(s) for s in self._stats)
+        return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--input_dir',
+        type=str,
+        required=True,
+        help='Directory with videos.',
+    )
+    parser.add_argument(
+        '--output_dir',
+        type=str,
+        help='Directory where intermediate results and predictions are saved.',
+    )
+    parser.add_argument(
+        '--model',
+        choices=[m.value for m in MRI_GAN_DATASET],
+        default=MRI_GAN_DATASET.MRI.value,
+        help='Deepfake detector trained on MRI or plain faces.',
+    )
+    parser.add_argument(
+        '--device',
+        choices=[d.value for d in DEVICE],
+        default=DEVICE.CPU.value,
+    )
+    parser.add_argument('--landmarks_workers', type=int, default=2)
+    parser.add_argument('--crop_workers', type=int, default=2)
+    parser.add_argument('--mri_workers', type=int, default=1)
+    parser.add_argument('--detect_workers', type=int, default=1)
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--fake_threshold', type=float, default=0.5)
+    parser.add_argument('--fake_fraction', type=float, default=0.5)
+
+    args = vars(parser.parse_args())
+    args['model'] = MRI_GAN_DATASET(args['model'])
+    args['device'] = DEVICE(args['device'])
+
+    logging.basicConfig(level=logging.INFO)
+
+    pipeline = Pipeline(PipelineConfiguration(**args))
+    predictions = pipeline.run()
+
+    for name, output in predictions.items():
+        print(f'{name}: {output}')
+    print(pipeline.summary())
+
+
+if __name__ == '__main__':
+    main()
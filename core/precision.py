@@ -0,0 +1,203 @@
+"""Precision and memory format policy shared by trainers and inference.
+
+One `PrecisionPolicy` decides whether forward passes run under
+`torch.autocast` (fp16 on CUDA, bfloat16 on CPU), whether models and input
+batches use `channels_last` memory format and whether losses are scaled by
+the `GradScaler`. Default policy is plain fp32 NCHW, so code which uses it
+behaves exactly as before unless policy is changed.
+"""
+from contextlib import nullcontext
+from dataclasses import dataclass
+import logging
+from typing import Any, ContextManager, Dict, Optional
+
+import torch
+from torch.nn import Module
+
+from enums import DEVICE, PRECISION
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = {
+    PRECISION.FP16: torch.float16,
+    PRECISION.BF16: torch.bfloat16,
+}
+
+
+@dataclass
+class PrecisionPolicy:
+    """Precision and memory format policy.
+
+    Args:
+        device (DEVICE): device where models run, by default DEVICE.CPU
+        precision (PRECISION): precision of the autocast regions, fp32
+            disables autocast, fp16 on CPU falls back to bf16, by default
+            PRECISION.FP32
+        channels_last (bool): whether models and 4D inputs use
+            `torch.channels_last` memory format, by default False
+    """
+    device: DEVICE = DEVICE.CPU
+    precision: PRECISION = PRECISION.FP32
+    channels_last: bool = False
+
+    def __post_init__(self) -> None:
+        if self.device == DEVICE.CUDA and not torch.cuda.is_available():
+            logger.warning('CUDA is not available, using CPU instead.')
+            self.device = DEVICE.CPU
+        if self.device == DEVICE.CPU and self.precision == PRECISION.FP16:
+            logger.warning(
+                'CPU autocast supports bfloat16, using it instead of fp16.'
+            )
+            self.precision = PRECISION.BF16
+        self._scaler = torch.cuda.amp.GradScaler(enabled=self.use_scaler)
+
+    @staticmethod
+    def from_params(
+        params: Dict[str, Any],
+        device: Optional[DEVICE] = None,
+    ) -> 'PrecisionPolicy':
+        """Makes policy from the model parameters of the configuration.
+        Reads `precision` and `channels_last` keys. Without `precision`,
+        legacy apex flags are honoured, `fp16` flag means `precision: fp16`
+        only with the mixed precision `opt_level` (O1, O2 or O3), apex O0
+        is pure fp32.
+
+        Parameters
+        ----------
+        params : Dict[str, Any]
+            model parameters
+        device : Optional[DEVICE], optional
+            device where models run, if not provided, CUDA is used when
+            available, by default None
+
+        Returns
+        -------
+        PrecisionPolicy
+            policy described by the parameters
+        """
+        if device is None:
+            device = DEVICE.CUDA if torch.cuda.is_available() else DEVICE.CPU
+        precision = params.get('precision')
+        if precision is None:
+            mixed = params.get('opt_level', 'O0') in ('O1', 'O2', 'O3')
+            precision = 'fp16' if params.get('fp16', False) and mixed \
+                else 'fp32'
+        return PrecisionPolicy(
+            device,
+            PRECISION(precision),
+            bool(params.get('channels_last', False)),
+        )
+
+    @property
+    def torch_device(self) -> torch.device:
+        return torch.device(self.device.value)
+
+    @property
+    def autocast_enabled(self) -> bool:
+        return self.precision != PRECISION.FP32
+
+    @property
+    def use_scaler(self) -> bool:
+        # bfloat16 has the range of fp32 so only fp16 needs loss scaling
+        return self.device == DEVICE.CUDA and \
+            self.precision == PRECISION.FP16
+
+    @property
+    def scaler(self) -> torch.cuda.amp.GradScaler:
+        return self._scaler
+
+    @property
+    def memory_format(self) -> torch.memory_format:
+        if self.channels_last:
+            return torch.channels_last
+        return torch.contiguous_format
+
+    def autocast(self) -> ContextManager:
+        """Context in which forward passes and losses are calculated.
+
+        Returns
+        -------
+        ContextManager
+            autocast context or no-op context for fp32
+        """
+        if not self.autocast_enabled:
+            return nullcontext()
+        return torch.autocast(
+            device_type=self.device.value,
+            dtype=_DTYPES[self.precision],
+        )
+
+    def prepare_model(self, model: Module) -> Module:
+        """Moves model to the device and memory format of the policy.
+
+        Parameters
+        ----------
+        model : Module
+            model to prepare
+
+        Returns
+        -------
+        Module
+            same model, moved in place
+        """
+        model = model.to(self.torch_device)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        return model
+
+    def prepare_input(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Moves input batch to the device and memory format of the policy,
+        memory format is changed only for the 4D tensors.
+
+        Parameters
+        ----------
+        tensor : torch.Tensor
+            input batch
+
+        Returns
+        -------
+        torch.Tensor
+            batch ready for the model
+        """
+        tensor = tensor.to(self.torch_device, non_blocking=True)
+        if self.channels_last and tensor.dim() == 4:
+            tensor = tensor.contiguous(memory_format=torch.channels_last)
+        return tensor
+
+    def backward(self, loss: torch.Tensor) -> None:
+        """Backward pass of the loss, scaled if policy uses `GradScaler`.
+
+        Parameters
+        ----------
+        loss : torch.Tensor
+            loss calculated in the autocast context
+        """
+        self._scaler.scale(loss).backward()
+
+    def step(self, optimizer: torch.optim.Optimizer) -> None:
+        """Optimizer step, skipped by the `GradScaler` if gradients
+        overflowed.
+
+        Parameters
+        ----------
+        optimizer : torch.optim.Optimizer
+            optimizer to step
+        """
+        self._scaler.step(optimizer)
+
+    def update(self) -> None:
+        """Updates loss scale, should be called once per iteration after
+        all optimizers stepped.
+        """
+        self._scaler.update()
+
+    def state_dict(self) -> Dict[str, Any]:
+        return self._scaler.state_dict()
+
+    def load_state_dict(self, state_dict: Dict[str, Any]) -> None:
+        if state_dict:
+            self._scaler.load_state_dict(state_dict)
+
+    def __str__(self) -> str:
+        memory_format = 'channels_last' if self.channels_last else 'NCHW'
+        return f'{self.device.value}/{self.precision.value}/{memory_format}'
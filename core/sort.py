@@ -1,76 +1,332 @@
-from typing import Callable, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import cv2 as cv
-import imagehash
-from PIL import Image
+import numpy as np
 
 from core.face import Face
 
+# hashes are 64 bit, 8x8 differences of the neighbouring pixels
+HASH_SIZE = 8
+# above this radius BK-tree visits most of its nodes and simple vectorized
+# scan is faster
+BK_TREE_MAX_RADIUS = 10
 
-def _calculate_hashes(
-    faces: List[Face],
-    hash_functions: List[Callable],
-) -> List[Tuple]:
-    """Calculates image hashes which are passed as an argument for all faces.
+_POPCOUNT_TABLE = np.array(
+    [bin(i).count('1') for i in range(256)],
+    dtype=np.uint8,
+)
+
+
+def popcount(x: np.ndarray) -> np.ndarray:
+    """Counts set bits of every element of the uint64 array.
+
+    Args:
+        x (np.ndarray): uint64 array
+
+    Returns:
+        np.ndarray: number of set bits, same shape as `x`
+    """
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x).astype(np.int64)
+    counts = _POPCOUNT_TABLE[x.view(np.uint8)]
+    return counts.reshape(*x.shape, 8).sum(axis=-1, dtype=np.int64)
+
+
+def hamming_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Hamming distance between packed hashes, broadcasts like any other
+    numpy binary operation.
+
+    Args:
+        a (np.ndarray): uint64 hashes
+        b (np.ndarray): uint64 hashes
+
+    Returns:
+        np.ndarray: number of differing bits
+    """
+    return popcount(np.bitwise_xor(a, b))
+
+
+def _pack_bits(bits: np.ndarray) -> np.uint64:
+    return np.packbits(bits.reshape(-1)).view('>u8')[0].astype(np.uint64)
+
+
+def dhash(image: np.ndarray) -> Tuple[np.uint64, np.uint64]:
+    """Horizontal and vertical difference hash of the image packed into
+    64 bit integers. Same algorithm as `imagehash.dhash` and
+    `imagehash.dhash_vertical`, just without going through PIL.
+
+    Args:
+        image (np.ndarray): BGR or grayscale image
+
+    Returns:
+        Tuple[np.uint64, np.uint64]: horizontal hash, vertical hash
+    """
+    if image.ndim == 3:
+        image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    horizontal = cv.resize(
+        image,
+        (HASH_SIZE + 1, HASH_SIZE),
+        interpolation=cv.INTER_AREA,
+    )
+    vertical = cv.resize(
+        image,
+        (HASH_SIZE, HASH_SIZE + 1),
+        interpolation=cv.INTER_AREA,
+    )
+    return (
+        _pack_bits(horizontal[:, 1:] > horizontal[:, :-1]),
+        _pack_bits(vertical[1:, :] > vertical[:-1, :]),
+    )
+
+
+def compute_hashes(
+    images: Sequence[np.ndarray],
+    num_workers: Optional[int] = None,
+) -> np.ndarray:
+    """Calculates horizontal and vertical difference hashes of the images
+    in a thread pool, OpenCV releases GIL so threads run in parallel.
 
     Args:
-        faces (List[Face]): list of `Face` metadata objects for which image
-            hashes are calculated
-        hash_functions (List[Callable]): list of image hash functions
+        images (Sequence[np.ndarray]): BGR or grayscale images
+        num_workers (Optional[int], optional): number of threads, if not
+            provided, number of CPUs is used. Defaults to None.
 
     Returns:
-        List[Tuple]: list of tuples for every face where tuple contains hash
-            for every image hash function
+        np.ndarray: uint64 array of shape (len(images), 2)
     """
-    hashes = []
-    for face in faces:
-        rgb = cv.cvtColor(face.detected_face, cv.COLOR_BGR2RGB)
-        image = Image.fromarray(rgb)
-        curr_hashes = tuple(hf(image) for hf in hash_functions)
-        hashes.append(curr_hashes)
+    hashes = np.zeros((len(images), 2), dtype=np.uint64)
+    if len(images) == 0:
+        return hashes
+    num_workers = num_workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(num_workers) as executor:
+        for i, h in enumerate(executor.map(dhash, images)):
+            hashes[i] = h
     return hashes
 
 
-def sort_faces_by_image_hash(
-    faces: List[Face],
+class BKTree:
+    """Burkhard-Keller tree over 64 bit hashes for the radius queries in the
+    Hamming space. Every child of the node is stored under its distance from
+    that node, so by the triangle inequality query only needs to visit the
+    children whose distance is within the radius of the query distance.
+
+    Args:
+        hashes (Sequence[int], optional): hashes to add, index of the hash in
+            this sequence is returned by queries. Defaults to ().
+    """
+
+    def __init__(self, hashes: Sequence[int] = ()) -> None:
+        # node is [hash, indices with that hash, children by distance]
+        self._root = None
+        self._size = 0
+        for h in hashes:
+            self.add(int(h))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, h: int, index: Optional[int] = None) -> None:
+        """Adds hash to the tree.
+
+        Args:
+            h (int): 64 bit hash
+            index (Optional[int], optional): index returned by queries, if
+                not provided, insertion order is used. Defaults to None.
+        """
+        if index is None:
+            index = self._size
+        self._size += 1
+        node = [h, [index], {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            d = bin(current[0] ^ h).count('1')
+            if d == 0:
+                # same hash, no need for the new node
+                current[1].append(index)
+                return
+            child = current[2].get(d)
+            if child is None:
+                current[2][d] = node
+                return
+            current = child
+
+    def query(self, h: int, radius: int) -> List[int]:
+        """Finds all hashes within the `radius` from the `h`.
+
+        Args:
+            h (int): 64 bit hash
+            radius (int): maximal Hamming distance
+
+        Returns:
+            List[int]: indices of the found hashes
+        """
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_hash, indices, children = stack.pop()
+            d = bin(node_hash ^ h).count('1')
+            if d <= radius:
+                found.extend(indices)
+            for child_d, child in children.items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return found
+
+
+def cluster_hashes(
+    hashes: np.ndarray,
+    radius: int,
+    use_tree: Optional[bool] = None,
+) -> np.ndarray:
+    """Greedy leader clustering of the hashes. First hash which is not
+    assigned yet becomes leader of the new cluster and every unassigned hash
+    within the `radius` from it joins the cluster. When more than one hash
+    per item is passed, item is close to the leader if any of its hashes is
+    close to the leader's hash of the same kind.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes of shape (N,) or (N, K)
+        radius (int): maximal Hamming distance to the cluster leader
+        use_tree (Optional[bool], optional): whether to search neighbours
+            with `BKTree` or with vectorized scan, if not provided, tree is
+            used for radius up to `BK_TREE_MAX_RADIUS`. Defaults to None.
+
+    Returns:
+        np.ndarray: index of the cluster leader for every hash
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if hashes.ndim == 1:
+        hashes = hashes[:, None]
+    n = len(hashes)
+    labels = np.full(n, -1, dtype=np.int64)
+    if use_tree is None:
+        use_tree = radius <= BK_TREE_MAX_RADIUS
+
+    if use_tree:
+        trees = [
+            BKTree(hashes[:, k].tolist()) for k in range(hashes.shape[1])
+        ]
+        for i in range(n):
+            if labels[i] >= 0:
+                continue
+            neighbours = set()
+            for k, tree in enumerate(trees):
+                neighbours.update(tree.query(int(hashes[i, k]), radius))
+            neighbours = np.fromiter(neighbours, dtype=np.int64)
+            neighbours = neighbours[labels[neighbours] < 0]
+            labels[neighbours] = i
+            labels[i] = i
+        return labels
+
+    unassigned = np.arange(n)
+    while len(unassigned):
+        leader = unassigned[0]
+        distances = hamming_distance(hashes[unassigned], hashes[leader])
+        close = (distances <= radius).any(axis=1)
+        close[0] = True
+        labels[unassigned[close]] = leader
+        unassigned = unassigned[~close]
+    return labels
+
+
+def deduplicate_hashes(
+    hashes: np.ndarray,
+    radius: int,
+) -> Tuple[List[int], List[int]]:
+    """Keeps one item from every cluster of the near duplicates.
+
+    Args:
+        hashes (np.ndarray): uint64 hashes of shape (N,) or (N, K)
+        radius (int): maximal Hamming distance between duplicates
+
+    Returns:
+        Tuple[List[int], List[int]]: indices of the kept items, indices of
+            the duplicates
+    """
+    labels = cluster_hashes(hashes, radius)
+    keep = labels == np.arange(len(labels))
+    return np.flatnonzero(keep).tolist(), np.flatnonzero(~keep).tolist()
+
+
+def cluster_sizes(labels: np.ndarray) -> Dict[int, int]:
+    """Number of the members of every cluster.
+
+    Args:
+        labels (np.ndarray): cluster leader for every item
+
+    Returns:
+        Dict[int, int]: cluster size by cluster leader
+    """
+    leaders, counts = np.unique(labels, return_counts=True)
+    return dict(zip(leaders.tolist(), counts.tolist()))
+
+
+def sort_images_by_image_hash(
+    images: Sequence[np.ndarray],
     eps: int,
 ) -> Tuple[List[int], List[int]]:
-    """Sorts face metadata objects from the list `faces` Metadata is
-    read from the directory, image hashes are calculated and only ones that
-    don't differ to much from the previous one are marked as satisfactory.
+    """Sorts images by the difference to the previously accepted one, see
+    `sort_faces_by_image_hash`.
 
     Args:
-        faces (List[Face]): list of `Face` metadata objects
+        images (Sequence[np.ndarray]): BGR images, usually face thumbnails
         eps (int): constant which limits dissimilarity between two hashes
 
     Returns:
         Tuple[List[int], List[int]]: list of indices that satisfy, list of
             indices that do not satisfy
     """
-    hashes = _calculate_hashes(
-        faces,
-        [imagehash.dhash, imagehash.dhash_vertical],
-    )
+    if len(images) == 0:
+        return [], []
+    hashes = compute_hashes(images)
 
-    old_v, old_h = hashes[0]
+    old = hashes[0]
     # images satisfying image hash similarity and difference between current
     # and previous one is less than eps
     indices_ok = []
     indices_not_ok = []
     for i, hash in enumerate(hashes):
-        hash_v, hash_h = hash
-        # difference between old hash and current one
-        diff_v = abs(old_v - hash_v)
-        diff_h = abs(old_h - hash_h)
+        # difference between old hash and current one, horizontal and
+        # vertical
+        diff = hamming_distance(old, hash)
 
-        if diff_v <= eps or diff_h <= eps:
+        if (diff <= eps).any():
             indices_ok.append(i)
             # replacing old value with new one because of the flow of the
             # video, reasoning here is that frames change little from one
             # frame to another
-            old_v = hash_v
-            old_h = hash_h
+            old = hash
         else:
             indices_not_ok.append(i)
 
     return indices_ok, indices_not_ok
+
+
+def sort_faces_by_image_hash(
+    faces: List[Face],
+    eps: int,
+) -> Tuple[List[int], List[int]]:
+    """Sorts face metadata objects from the list `faces` Metadata is
+    read from the directory, image hashes are calculated and only ones that
+    don't differ to much from the previous one are marked as satisfactory.
+
+    Args:
+        faces (List[Face]): list of `Face` metadata objects
+        eps (int): constant which limits dissimilarity between two hashes
+
+    Returns:
+        Tuple[List[int], List[int]]: list of indices that satisfy, list of
+            indices that do not satisfy
+    """
+    return sort_images_by_image_hash(
+        [face.detected_face for face in faces],
+        eps,
+    )
@@ -0,0 +1,256 @@
+"""Persistent cache of small face thumbnails. Decoding face pickles and
+aligning faces is slow, so every face is aligned once, encoded as a small
+JPEG and stored in a single sqlite file keyed by the face path, modification
+time and thumbnail size. Changed or moved faces simply miss the cache.
+"""
+from dataclasses import dataclass
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+
+from core.face import Face
+from core.face_alignment.face_aligner import FaceAligner
+from serializer.face_serializer import FaceSerializer
+from variables import THUMBNAIL_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMBNAIL_SIZE = 64
+DEFAULT_JPEG_QUALITY = 90
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS thumbnails (
+    path TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    image BLOB NOT NULL,
+    PRIMARY KEY (path, size)
+)
+"""
+
+
+@dataclass
+class Thumbnail:
+    """Small aligned face image together with the path of the face metadata
+    file it was made from, full `Face` is loaded only when needed.
+
+    Args:
+        path (Path): path of the face metadata file
+        name (str): name of the image face was detected on
+        image (np.ndarray): BGR thumbnail of the aligned face
+    """
+    path: Path
+    name: str
+    image: np.ndarray
+
+
+def make_thumbnail(
+    face: Face,
+    path: Path,
+    size: int = DEFAULT_THUMBNAIL_SIZE,
+) -> Thumbnail:
+    """Aligns face to the `size x size` image.
+
+    Parameters
+    ----------
+    face : Face
+        face with landmarks
+    path : Path
+        path of the face metadata file
+    size : int, optional
+        thumbnail size, by default DEFAULT_THUMBNAIL_SIZE
+
+    Returns
+    -------
+    Thumbnail
+        thumbnail of the face
+    """
+    FaceAligner.align_face(face, size)
+    return Thumbnail(Path(path), face.raw_image.name, face.aligned_image)
+
+
+class ThumbnailCache:
+    """Sqlite store of JPEG encoded face thumbnails. Can be shared between
+    threads, every thread gets its own connection and database runs in WAL
+    mode so readers don't block the writer.
+
+    Args:
+        db_path (Union[str, Path], optional): path of the sqlite file, by
+            default THUMBNAIL_CACHE_PATH
+        size (int, optional): thumbnail size, by default
+            DEFAULT_THUMBNAIL_SIZE
+        quality (int, optional): JPEG quality of the stored thumbnails, by
+            default DEFAULT_JPEG_QUALITY
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path] = THUMBNAIL_CACHE_PATH,
+        size: int = DEFAULT_THUMBNAIL_SIZE,
+        quality: int = DEFAULT_JPEG_QUALITY,
+    ) -> None:
+        self._db_path = Path(db_path)
+        self._size = size
+        self._quality = quality
+        self._local = threading.local()
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._db_path), timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _encode(self, image: np.ndarray) -> bytes:
+        _, buffer = cv.imencode(
+            '.jpg',
+            image,
+            [cv.IMWRITE_JPEG_QUALITY, self._quality],
+        )
+        return buffer.tobytes()
+
+    @staticmethod
+    def _decode(data: bytes) -> np.ndarray:
+        return cv.imdecode(
+            np.frombuffer(data, dtype=np.uint8),
+            cv.IMREAD_COLOR,
+        )
+
+    def get_many(self, paths: Iterable[Path]) -> Dict[Path, Thumbnail]:
+        """Fetches valid thumbnails of the `paths`, thumbnails of the faces
+        changed after caching are left out.
+
+        Parameters
+        ----------
+        paths : Iterable[Path]
+            paths of the face metadata files
+
+        Returns
+        -------
+        Dict[Path, Thumbnail]
+            cached thumbnails by face path
+        """
+        mtimes = {}
+        for p in paths:
+            mtime = self._mtime(p)
+            if mtime is not None:
+                mtimes[str(p)] = (Path(p), mtime)
+        keys = list(mtimes.keys())
+        found = {}
+        # sqlite limits number of the query parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._connection.execute(
+                'SELECT path, mtime, name, image FROM thumbnails '
+                f'WHERE size = ? AND path IN ({",".join("?" * len(chunk))})',
+                [self._size, *chunk],
+            ).fetchall()
+            for path, mtime, name, image in rows:
+                p, current_mtime = mtimes[path]
+                if mtime == current_mtime:
+                    found[p] = Thumbnail(p, name, self._decode(image))
+        return found
+
+    def put_many(self, thumbnails: List[Thumbnail]) -> None:
+        """Stores thumbnails in the cache, existing entries are replaced.
+
+        Parameters
+        ----------
+        thumbnails : List[Thumbnail]
+            thumbnails to store
+        """
+        rows = []
+        for t in thumbnails:
+            mtime = self._mtime(t.path)
+            if mtime is None:
+                continue
+            rows.append(
+                (str(t.path), mtime, self._size, t.name, self._encode(t.image))
+            )
+        with self._connection as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def load(self, paths: List[Path]) -> Tuple[List[Thumbnail], List[Path]]:
+        """Loads thumbnails of the `paths`, faces missing from the cache are
+        decoded, aligned and cached.
+
+        Parameters
+        ----------
+        paths : List[Path]
+            paths of the face metadata files
+
+        Returns
+        -------
+        Tuple[List[Thumbnail], List[Path]]
+            thumbnails in the order of `paths`, paths which could not be
+            loaded
+        """
+        cached = self.get_many(paths)
+        missing = []
+        failed = []
+        for p in paths:
+            p = Path(p)
+            if p in cached:
+                continue
+            try:
+                face = FaceSerializer.load(p)
+                missing.append(make_thumbnail(face, p, self._size))
+            except Exception as e:
+                logger.warning(f'Unable to make thumbnail for {str(p)}: {e}.')
+                failed.append(p)
+        if missing:
+            self.put_many(missing)
+            cached.update({t.path: t for t in missing})
+        thumbnails = [cached[Path(p)] for p in paths if Path(p) in cached]
+        return thumbnails, failed
+
+    def prefetch(self, paths: List[Path]) -> int:
+        """Makes sure thumbnails of the `paths` are in the cache.
+
+        Parameters
+        ----------
+        paths : List[Path]
+            paths of the face metadata files
+
+        Returns
+        -------
+        int
+            number of newly cached thumbnails
+        """
+        cached = self.get_many(paths)
+        missing = [p for p in paths if Path(p) not in cached]
+        if missing:
+            self.load(missing)
+        return len(missing)
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
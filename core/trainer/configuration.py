@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Tuple
 
 from torch.nn.modules.loss import _Loss
@@ -6,6 +6,7 @@ from torch.nn.modules.loss import _Loss
 from core.dataset.configuration import DatasetConfiguration
 from core.model.configuration import ModelConfiguration
 from core.optimizer.configuration import OptimizerConfiguration
+from core.trainer.tensorboard_handlers import LoggingBudget
 from enums import DEVICE
 from gui.widgets.preview.configuration import PreviewConfiguration
 
@@ -22,3 +23,4 @@ class TrainerConfiguration:
     preview_conf: PreviewConfiguration
     log_dir: str = 'tensorboard_log'
     checkpoints_dir: str = 'models'
+    logging_budget: LoggingBudget = field(default_factory=LoggingBudget)
@@ -1,3 +1,4 @@
+from pathlib import Path
 import random
 import threading
 from typing import List
@@ -7,6 +8,7 @@ import torch.nn.functional as F
 import torchvision
 import wandb
 
+from core.checkpoint import atomic_save
 from core.trainer.trainer import StepTrainer, StepTrainerConfiguration
 from variables import IMAGENET_MEAN, IMAGENET_STD
 
@@ -47,31 +49,43 @@ class FSTrainer(StepTrainer):
         self._optim_g = self._model.optimizer_G
         self._optim_d = self._model.optimizer_D
         self._model.netD.feature_network.requires_grad_(False)
+        self._precision.prepare_model(self._model.netG)
+        self._precision.prepare_model(self._model.netD)
+        self._precision.prepare_model(self._model.netArc)
 
     def post_init_logging(self) -> None:
         if self._conf.df_logger.use_wandb:
             wandb.config.update({'steps': self._conf.steps})
 
+    def _on_checkpoint_saved(self, save_path: Path) -> None:
+        # called from the writer thread, latest checkpoint file points only
+        # to the fully written checkpoints
+        self._logger.debug(f'Saved model checkpoint: {str(save_path)}.')
+        chkpt_fp = self._conf.df_logger.latest_checkpoints_file_path
+        atomic_save(
+            str(save_path),
+            chkpt_fp,
+            lambda path, f: f.write(path.encode()),
+        )
+        self._logger.debug(
+            f'Saved latest checkpoint path to the file: {str(chkpt_fp)}.'
+        )
+
     def save_checkpoint(self) -> None:
         save_path = self._checkpoint_dir / \
             f'step_{self._current_step + 1}_checkpoint.pt'
-        torch.save(
+        self._checkpoint_writer.save(
             {
                 'netG': self._model.netG.state_dict(),
                 'netD': self._model.netD.state_dict(),
                 'optim_g': self._optim_g.state_dict(),
                 'optim_d': self._optim_d.state_dict(),
                 'current_step': self._current_step + 1,
+                'scaler': self._precision.state_dict(),
             },
             save_path,
+            callback=self._on_checkpoint_saved,
         )
-        self._logger.debug(f'Saved model checkpoint: {str(save_path)}.')
-        chkpt_fp = self._conf.df_logger.latest_checkpoints_file_path
-        with open(chkpt_fp, 'wt') as f:
-            f.write(str(save_path))
-            self._logger.debug(
-                f'Saved latest checkpoint path to the file: {str(chkpt_fp)}.'
-            )
 
     def load_checkpoint(self) -> None:
         chkpt_fp = self._conf.df_logger.latest_checkpoints_file_path
@@ -92,6 +106,7 @@ class FSTrainer(StepTrainer):
         self._model.netD.load_state_dict(checkpoint['netD'])
         self._optim_g.load_state_dict(checkpoint['optim_g'])
         self._optim_d.load_state_dict(checkpoint['optim_d'])
+        self._precision.load_state_dict(checkpoint.get('scaler'))
         current_step = checkpoint['current_step']
         self._starting_step = current_step
         self._logger.debug('Model checkpoint loaded.')
@@ -114,8 +129,8 @@ class FSTrainer(StepTrainer):
 
         for idx in range(2):
             img_1, img_2 = self.get_batch_of_data()
-            img_1: torch.Tensor = img_1.to(self._device)
-            img_2: torch.Tensor = img_2.to(self._device)
+            img_1: torch.Tensor = self._precision.prepare_input(img_1)
+            img_2: torch.Tensor = self._precision.prepare_input(img_2)
             randindex = list(range(self._conf.batch_size))
             random.shuffle(randindex)
             if self._current_step % 2 == 0:
@@ -123,67 +138,73 @@ class FSTrainer(StepTrainer):
             else:
                 img_id = img_2[randindex]
 
-            latent_id = self._make_latent_id(img_id)
-
             if idx:
-                img_fake = self._model.netG(img_1, latent_id)
-                gen_logits, _ = self._model.netD(img_fake.detach(), None)
-                loss_Dgen = (
-                    F.relu(torch.ones_like(gen_logits) + gen_logits)
-                ).mean()
-                self.update_meter('loss_Dgen', loss_Dgen.item())
-
-                real_logits, _ = self._model.netD(img_2, None)
-                loss_Dreal = (
-                    F.relu(torch.ones_like(real_logits) - real_logits)
-                ).mean()
-                self.update_meter('loss_Dreal', loss_Dreal.item())
-
-                loss_D = loss_Dgen + loss_Dreal
-                self.update_meter('loss_D', loss_D.item())
+                with self._precision.autocast():
+                    latent_id = self._make_latent_id(img_id)
+                    img_fake = self._model.netG(img_1, latent_id)
+                    gen_logits, _ = self._model.netD(img_fake.detach(), None)
+                    loss_Dgen = (
+                        F.relu(torch.ones_like(gen_logits) + gen_logits)
+                    ).mean()
+
+                    real_logits, _ = self._model.netD(img_2, None)
+                    loss_Dreal = (
+                        F.relu(torch.ones_like(real_logits) - real_logits)
+                    ).mean()
+
+                    loss_D = loss_Dgen + loss_Dreal
+                self.update_meter('loss_Dgen', loss_Dgen)
+                self.update_meter('loss_Dreal', loss_Dreal)
+                self.update_meter('loss_D', loss_D)
 
                 self._optim_d.zero_grad()
-                loss_D.backward()
-                self._optim_d.step()
+                self._precision.backward(loss_D)
+                self._precision.step(self._optim_d)
             else:
-                img_fake = self._model.netG(img_1, latent_id)
-                gen_logits, feat = self._model.netD(img_fake, None)
-                loss_Gmain = (-gen_logits).mean()
-                self.update_meter('loss_Gmain', loss_Gmain.item())
-
-                latent_fake = self._make_latent_id(img_fake)
-                loss_G_ID = (1 - self._cos(latent_fake, latent_id)).mean()
-                self.update_meter('loss_G_ID', loss_G_ID.item())
-
-                real_feat = self._model.netD.get_feature(img_1)
-                feat_match_loss = self._model.criterionFeat(
-                    feat["3"],
-                    real_feat["3"],
-                )
-                self.update_meter('feat_match_loss', feat_match_loss.item())
-
-                loss_G = loss_Gmain \
-                    + loss_G_ID * self._lambda_id \
-                    + feat_match_loss * self._lambda_feat
-
+                with self._precision.autocast():
+                    latent_id = self._make_latent_id(img_id)
+                    img_fake = self._model.netG(img_1, latent_id)
+                    gen_logits, feat = self._model.netD(img_fake, None)
+                    loss_Gmain = (-gen_logits).mean()
+
+                    latent_fake = self._make_latent_id(img_fake)
+                    loss_G_ID = (1 - self._cos(latent_fake, latent_id)).mean()
+
+                    real_feat = self._model.netD.get_feature(img_1)
+                    feat_match_loss = self._model.criterionFeat(
+                        feat["3"],
+                        real_feat["3"],
+                    )
+
+                    loss_G = loss_Gmain \
+                        + loss_G_ID * self._lambda_id \
+                        + feat_match_loss * self._lambda_feat
+
+                    if self._current_step % 2 == 0:
+                        loss_G_Rec = self._model.criterionRec(
+                            img_fake,
+                            img_1,
+                        ) * self._conf.model_config.options['lambda_rec']
+                        loss_G += loss_G_Rec
+                self.update_meter('loss_Gmain', loss_Gmain)
+                self.update_meter('loss_G_ID', loss_G_ID)
+                self.update_meter('feat_match_loss', feat_match_loss)
                 if self._current_step % 2 == 0:
-                    loss_G_Rec = self._model.criterionRec(
-                        img_fake,
-                        img_1,
-                    ) * self._conf.model_config.options['lambda_rec']
-                    self.update_meter('loss_G_Rec', loss_G_Rec.item())
-                    loss_G += loss_G_Rec
+                    self.update_meter('loss_G_Rec', loss_G_Rec)
 
                 self._optim_g.zero_grad()
-                loss_G.backward()
-                self._optim_g.step()
+                self._precision.backward(loss_G)
+                self._precision.step(self._optim_g)
+
+        # one scale update per step, shared by both optimizers
+        self._precision.update()
 
         if (self._current_step + 1) % self._sample_freq == 0:
             self._model.netG.eval()
             bs = self._conf.batch_size
-            with torch.no_grad():
+            with torch.no_grad(), self._precision.autocast():
                 imgs = [torch.zeros_like(img_1[0]).cpu()]
-                save_img = img_1.cpu() * self._imagenet_std + \
+                save_img = img_1.float().cpu() * self._imagenet_std + \
                     self._imagenet_mean
                 imgs.extend([img for img in save_img])
 
@@ -194,7 +215,7 @@ class FSTrainer(StepTrainer):
                     img_fake = self._model.netG(
                         img_1[i].repeat(bs, 1, 1, 1),
                         id_vector_src1,
-                    ).cpu()
+                    ).float().cpu()
                     img_fake = img_fake * self._imagenet_std + \
                         self._imagenet_mean
                     imgs.extend([img for img in img_fake])
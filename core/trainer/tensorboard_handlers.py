@@ -0,0 +1,234 @@
+"""Tensorboard handlers for the ignite `Trainer` with a logging budget.
+
+Logging scalars of every weight and gradient each epoch costs a device sync
+and a tensorboard write per parameter. Handlers here log only a sampled
+subset of parameters, compute all norms in one fused pass, log histograms
+only every few epochs and leave writing of the event files to a background
+thread. Time spent on the training thread and time spent writing are both
+measured, so the cost of logging is visible.
+"""
+from dataclasses import dataclass
+import logging
+from queue import Queue
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import torch
+from torch.nn import Module
+from torch.utils.tensorboard import SummaryWriter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoggingBudget:
+    """How much is logged to tensorboard.
+
+    Args:
+        max_params (Optional[int]): number of parameters whose norms and
+            histograms are logged, `None` logs all of them. Defaults to 16.
+        scalars_every (int): log weight and gradient norms every this many
+            epochs. Defaults to 1.
+        histograms_every (int): log histograms of the sampled parameters
+            every this many epochs, 0 disables histograms. Defaults to 10.
+        grad_norms (bool): log norm of all gradients and norms of the
+            sampled gradients. Defaults to True.
+        seed (int): seed of the parameter sampling, same seed logs same
+            parameters across runs. Defaults to 0.
+    """
+    max_params: Optional[int] = 16
+    scalars_every: int = 1
+    histograms_every: int = 10
+    grad_norms: bool = True
+    seed: int = 0
+
+
+def sample_parameters(
+    model: Module,
+    max_params: Optional[int],
+    seed: int = 0,
+) -> List[Tuple[str, torch.nn.Parameter]]:
+    """Picks trainable parameters to log, order of the model is kept.
+
+    Args:
+        model (Module): model whose parameters are sampled
+        max_params (Optional[int]): number of parameters, `None` for all
+        seed (int, optional): sampling seed. Defaults to 0.
+
+    Returns:
+        List[Tuple[str, torch.nn.Parameter]]: names and parameters
+    """
+    params = [
+        (name, p) for name, p in model.named_parameters() if p.requires_grad
+    ]
+    if max_params is None or len(params) <= max_params:
+        return params
+    rng = random.Random(seed)
+    indices = sorted(rng.sample(range(len(params)), max_params))
+    return [params[i] for i in indices]
+
+
+def foreach_norm(tensors: List[torch.Tensor]) -> torch.Tensor:
+    """L2 norms of all tensors as one tensor, computed with the fused kernel
+    where torch provides it.
+
+    Args:
+        tensors (List[torch.Tensor]): tensors on the same device
+
+    Returns:
+        torch.Tensor: norms of shape (len(tensors),)
+    """
+    if hasattr(torch, '_foreach_norm'):
+        norms = torch._foreach_norm(tensors)
+    else:
+        norms = [t.norm() for t in tensors]
+    return torch.stack(norms)
+
+
+class AsyncTensorboardWriter:
+    """`SummaryWriter` whose writes are done by the background thread.
+    Values have to be on the CPU and must not change after they are
+    enqueued.
+
+    Args:
+        log_dir (str): directory of the event files
+    """
+
+    def __init__(self, log_dir: str) -> None:
+        self._writer = SummaryWriter(log_dir=log_dir)
+        self._q = Queue()
+        self._write_time = 0.
+        self._writes = 0
+        self._thread = threading.Thread(
+            target=self._run,
+            name='tensorboard_writer',
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def write_time(self) -> float:
+        """Total seconds spent writing, in the background thread."""
+        return self._write_time
+
+    @property
+    def writes(self) -> int:
+        return self._writes
+
+    def add_scalar(self, tag: str, value: float, step: int) -> None:
+        self._q.put(('add_scalar', tag, value, step))
+
+    def add_histogram(self, tag: str, values: torch.Tensor, step: int) -> None:
+        self._q.put(('add_histogram', tag, values, step))
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is None:
+                break
+            method, tag, value, step = item
+            start = time.perf_counter()
+            try:
+                getattr(self._writer, method)(tag, value, step)
+            except Exception as e:
+                logger.warning(f'Failed to write {tag} to tensorboard: {e}.')
+            self._write_time += time.perf_counter() - start
+            self._writes += 1
+        self._writer.flush()
+
+    def close(self) -> None:
+        self._q.put(None)
+        self._thread.join()
+        self._writer.close()
+
+
+class BudgetedModelLogger:
+    """Logs weights and gradients of the model within the `LoggingBudget`.
+    Attach `__call__` to `Events.EPOCH_COMPLETED`.
+
+    Args:
+        model (Module): model being trained
+        writer (AsyncTensorboardWriter): where values are written
+        budget (LoggingBudget): what is logged and how often
+    """
+
+    def __init__(
+        self,
+        model: Module,
+        writer: AsyncTensorboardWriter,
+        budget: LoggingBudget,
+    ) -> None:
+        self._model = model
+        self._writer = writer
+        self._budget = budget
+        self._sampled = sample_parameters(
+            model,
+            budget.max_params,
+            budget.seed,
+        )
+        # time spent on the training thread computing and enqueueing
+        self._log_time = 0.
+        logger.debug(
+            f'Logging {len(self._sampled)} parameters to tensorboard.'
+        )
+
+    @property
+    def log_time(self) -> float:
+        return self._log_time
+
+    def _log_weight_norms(self, epoch: int) -> None:
+        names = [name for name, _ in self._sampled]
+        weights = [p.detach() for _, p in self._sampled]
+        norms = foreach_norm(weights).cpu().tolist()
+        for name, norm in zip(names, norms):
+            self._writer.add_scalar(f'weights/norm/{name}', norm, epoch)
+
+    def _log_grad_norms(self, epoch: int) -> None:
+        grads = [
+            p.grad.detach() for p in self._model.parameters()
+            if p.grad is not None
+        ]
+        if not grads:
+            return
+        sampled = [
+            (name, p.grad.detach()) for name, p in self._sampled
+            if p.grad is not None
+        ]
+        # total norm and sampled norms in one device to host transfer
+        values = torch.cat([
+            foreach_norm(grads).norm().unsqueeze(0),
+            foreach_norm([g for _, g in sampled]) if sampled
+            else grads[0].new_empty(0),
+        ]).cpu().tolist()
+        self._writer.add_scalar('grads/total_norm', values[0], epoch)
+        for (name, _), norm in zip(sampled, values[1:]):
+            self._writer.add_scalar(f'grads/norm/{name}', norm, epoch)
+
+    def _log_histograms(self, epoch: int) -> None:
+        for name, p in self._sampled:
+            # copy, parameters keep changing while the writer works
+            values = p.detach().to('cpu', copy=True)
+            self._writer.add_histogram(f'weights/{name}', values, epoch)
+
+    def __call__(self, engine) -> None:
+        epoch = engine.state.epoch
+        start = time.perf_counter()
+        with torch.no_grad():
+            if epoch % max(1, self._budget.scalars_every) == 0:
+                self._log_weight_norms(epoch)
+                if self._budget.grad_norms:
+                    self._log_grad_norms(epoch)
+            if self._budget.histograms_every > 0 and \
+                    epoch % self._budget.histograms_every == 0:
+                self._log_histograms(epoch)
+        self._log_time += time.perf_counter() - start
+
+    def report(self) -> str:
+        return (
+            'Tensorboard logging: '
+            f'{self._log_time * 1000:.1f} ms on the training thread, '
+            f'{self._writer.write_time * 1000:.1f} ms writing '
+            f'{self._writer.writes} values in background.'
+        )
@@ -4,7 +4,7 @@ import threading
 import time
 from dataclasses import dataclass, field
 from numbers import Number
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 import enlighten
 import torch
@@ -13,7 +13,16 @@ from torch.backends import cudnn
 from torch.nn import Module
 from torch.utils.data import DataLoader
 
+from core.checkpoint import CheckpointWriter
+from core.precision import PrecisionPolicy
+from df_logging.metrics import (
+    JSONLSink,
+    MetricsLogger,
+    TensorboardSink,
+    WandbSink,
+)
 from df_logging.model_logging import DFLogger
+from enums import DEVICE
 
 
 @dataclass
@@ -33,6 +42,7 @@ class BaseTrainerConfiguration:
     device: torch.device
     use_cudnn_benchmark: bool
     name: str
+    precision_policy: Optional[PrecisionPolicy] = None
 
     def __str__(self) -> str:
         val = f'{self.name} TRAINER CONFIGURATION\n'
@@ -42,6 +52,7 @@ class BaseTrainerConfiguration:
         val += f'resume_run:          {self.resume_run}\n'
         val += f'use_cudnn_benchmark: {self.use_cudnn_benchmark}\n'
         val += f'device:              {self.device}\n'
+        val += f'precision policy:    {self.precision_policy}\n'
         val += f'model options:\n'
         longest_key = max([len(k) for k in self.model_config.options.keys()])
         for k, v in self.model_config.options.items():
@@ -62,6 +73,7 @@ class EpochIterConfiguration(BaseTrainerConfiguration):
         resume_run: bool = False,
         device: torch.device = torch.device('cuda'),
         use_cudnn_benchmark: bool = False,
+        precision_policy: Optional[PrecisionPolicy] = None,
     ) -> None:
         super().__init__(
             train_data_loader,
@@ -72,6 +84,7 @@ class EpochIterConfiguration(BaseTrainerConfiguration):
             device,
             use_cudnn_benchmark,
             'EPOCH',
+            precision_policy,
         )
 
         self._epochs = epochs
@@ -93,6 +106,7 @@ class StepTrainerConfiguration(BaseTrainerConfiguration):
         resume_run: bool = False,
         device: torch.device = torch.device('cuda'),
         use_cudnn_benchmark: bool = False,
+        precision_policy: Optional[PrecisionPolicy] = None,
     ) -> None:
         super().__init__(
             train_data_loader,
@@ -104,6 +118,7 @@ class StepTrainerConfiguration(BaseTrainerConfiguration):
             device,
             use_cudnn_benchmark,
             'STEP',
+            precision_policy,
         )
 
 
@@ -119,14 +134,18 @@ class BaseTrainer:
         self._steps = conf.steps
         self._conf = conf
         self._device = conf.device
+        if conf.precision_policy is not None:
+            self._precision = conf.precision_policy
+        else:
+            self._precision = PrecisionPolicy(DEVICE(self._device.type))
         self._train_data_loader = conf.train_data_loader
-        self._meters: Dict[str, Number] = {}
         self._log_freq = self._conf.df_logger.log_frequency
         self._save_freq = conf.df_logger.checkpoint_frequency
         self._sample_freq = conf.df_logger.sample_frequency
         self._checkpoint_dir = conf.df_logger.checkpoints_dir
         self._samples_dir = conf.df_logger.samples_dir
         self._use_wandb = self._conf.df_logger.use_wandb
+        self._metrics = self._init_metrics()
         cudnn.benchmark = conf.use_cudnn_benchmark
         self._enligten_manager = enlighten.get_manager()
         self._run_name = conf.df_logger.run_name
@@ -136,6 +155,7 @@ class BaseTrainer:
         else:
             self._stop_event = threading.Event()
         self._progress_q = Queue()
+        self._checkpoint_writer = CheckpointWriter()
 
     def stop(self) -> None:
         self._stop_event.set()
@@ -157,11 +177,21 @@ class BaseTrainer:
         pass
 
     def register_meters(self, meters: List[str]) -> None:
-        for m in meters:
-            self._meters[m] = 0
+        self._metrics.register(meters)
+
+    def _init_metrics(self) -> MetricsLogger:
+        run_log_dir = self._conf.df_logger.run_log_dir
+        sinks = [
+            JSONLSink(run_log_dir / 'metrics.jsonl'),
+            TensorboardSink(run_log_dir / 'tensorboard'),
+        ]
+        if self._use_wandb:
+            sinks.append(WandbSink(self._conf.df_logger))
+        return MetricsLogger(sinks, self._log_freq)
 
     def _init_logging(self) -> None:
-        self._init_wandb()
+        if self._use_wandb:
+            self._init_wandb()
 
     def _init_wandb(self) -> None:
         wandb.config.update(
@@ -176,17 +206,21 @@ class BaseTrainer:
         pass
 
     @property
-    def meters(self) -> Dict[str, str]:
-        return self._meters
+    def meters(self) -> Dict[str, float]:
+        """Meter averages from the latest log step."""
+        return self._metrics.last
 
     @property
     def progress_q(self) -> Queue:
         return self._progress_q
 
-    def update_meter(self, name: str, value: Number) -> None:
-        if name not in self._meters:
-            raise Exception(f'meter: {name} not registered')
-        self._meters[name] = value
+    def update_meter(
+        self,
+        name: str,
+        value: Union[torch.Tensor, Number],
+    ) -> None:
+        # tensors are accumulated on the device, no sync happens here
+        self._metrics.update(name, value)
 
     def save_checkpoint(self) -> None:
         pass
@@ -204,17 +238,9 @@ class BaseTrainer:
         self._progress_q.put(step)
 
     def log(self) -> None:
-        if (self._current_step + 1) % self._log_freq == 0 and self._use_wandb:
-            self._conf.df_logger.update_wandb_last_step(
-                self._current_step + 1
-            )
-            if self._current_step + 1 > \
-                    self._conf.df_logger.wandb_last_step:
-                wandb.log(
-                    data=self._meters,
-                    step=self._current_step + 1,
-                )
-            # TODO log to file
+        # meters are synced with the CPU only every `log_frequency` steps
+        # and written by the background thread
+        self._metrics.step(self._current_step)
 
     def start(self) -> None:
         self.init_model()
@@ -231,10 +257,14 @@ class BaseTrainer:
             print('Received stop signal, exiting...')
         finally:
             self._enligten_manager.stop()
+            # remaining metrics have to be written before wandb is closed
+            self._metrics.close(self._current_step)
             if self._use_wandb:
                 self._logger.debug('Closing wandb.')
                 wandb.finish()
             self.post_training()
+            self._logger.debug('Waiting for checkpoints to be written.')
+            self._checkpoint_writer.close()
             self._logger.info('Training finished.')
 
 
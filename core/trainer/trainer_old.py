@@ -4,9 +4,8 @@ from typing import Any, Callable, Mapping, Optional, Sequence, Tuple, Union
 
 import enlighten
 import torch
-from ignite.contrib.handlers.tensorboard_logger import (
-    GradsScalarHandler, TensorboardLogger, WeightsScalarHandler,
-    global_step_from_engine)
+from ignite.contrib.handlers.tensorboard_logger import \
+    global_step_from_engine
 from ignite.engine import Engine, Events  # create_supervised_evaluator,
 from ignite.engine.events import EventEnum
 from ignite.handlers import ModelCheckpoint
@@ -17,7 +16,11 @@ from torch.utils.data.dataloader import DataLoader
 
 from common_structures import CommObject
 from core.model.model import DeepfakeModel
+from core.trainer.tensorboard_handlers import (AsyncTensorboardWriter,
+                                               BudgetedModelLogger,
+                                               LoggingBudget)
 from enums import DEVICE
+from utils import tensor_to_uint8_images
 
 logger = logging.getLogger(__name__)
 
@@ -165,6 +168,7 @@ class Trainer:
         checkpoints_dir: str,
         show_preview: bool,
         show_preview_comm: CommObject,
+        logging_budget: Optional[LoggingBudget] = None,
     ) -> None:
         self.model = model
         self.data_loader = data_loader
@@ -176,6 +180,7 @@ class Trainer:
         self.checkpoints_dir = checkpoints_dir
         self.show_preview = show_preview
         self.show_preview_comm = show_preview_comm
+        self.logging_budget = logging_budget or LoggingBudget()
         self._stop_training = False
 
     def _refresh_preview(
@@ -188,14 +193,17 @@ class Trainer:
         y_pred_B_A,
     ) -> None:
         if self.show_preview:
+            # images are converted here so the gui thread only paints them
             self.show_preview_comm.data_sig.emit(
                 [
-                    warped_A,
-                    y_pred_A_A,
-                    y_pred_A_B,
-                    warped_B,
-                    y_pred_B_B,
-                    y_pred_B_A,
+                    tensor_to_uint8_images(images) for images in [
+                        warped_A,
+                        y_pred_A_A,
+                        y_pred_A_B,
+                        warped_B,
+                        y_pred_B_B,
+                        y_pred_B_A,
+                    ]
                 ]
             )
 
@@ -287,25 +295,23 @@ class Trainer:
         def on_iteration_completed(engine: Engine):
             iteration_pbar.update()
 
-        tb_logger = TensorboardLogger(log_dir=self.log_dir)
-        tb_logger.attach_output_handler(
-            trainer,
-            event_name=Events.EPOCH_COMPLETED,
-            tag="training",
+        tb_writer = AsyncTensorboardWriter(self.log_dir)
+
+        @trainer.on(Events.EPOCH_COMPLETED)
+        def log_batchloss(engine: Engine):
             # tuple unpacking is not possible, last element is loss
-            output_transform=lambda out: {"batchloss": out[-1]},
-            metric_names="all",
-        )
-        tb_logger.attach(
-            trainer,
-            log_handler=WeightsScalarHandler(self.model),
-            event_name=Events.EPOCH_COMPLETED,
-        )
-        tb_logger.attach(
-            trainer,
-            log_handler=GradsScalarHandler(self.model),
-            event_name=Events.EPOCH_COMPLETED,
+            tb_writer.add_scalar(
+                'training/batchloss',
+                engine.state.output[-1],
+                engine.state.epoch,
+            )
+
+        model_logger = BudgetedModelLogger(
+            self.model,
+            tb_writer,
+            self.logging_budget,
         )
+        trainer.add_event_handler(Events.EPOCH_COMPLETED, model_logger)
 
         # def score_function(engine: Engine):
         #     return engine.state.metrics["accuracy"]
@@ -335,9 +341,11 @@ class Trainer:
         #     {"model": self.model},
         # )
 
-        trainer.run(self.data_loader, max_epochs=self.epochs)
-
-        tb_logger.close()
+        try:
+            trainer.run(self.data_loader, max_epochs=self.epochs)
+        finally:
+            tb_writer.close()
+            logger.info(model_logger.report())
         manager.stop()
 
     def stop(self) -> None:
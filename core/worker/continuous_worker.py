@@ -31,11 +31,14 @@ class ContinuousWorker(Worker):
         while True:
             try:
                 self._current_job = self._job_q.get(timeout=1)
+                self._start_profiling()
                 try:
                     self.run_job()
                 except Exception:
                     traceback.print_exc(file=sys.stdout)
                     break
+                finally:
+                    self._finish_profiling()
             except Empty:
                 if self.should_exit():
                     break
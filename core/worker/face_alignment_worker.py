@@ -0,0 +1,58 @@
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+import PyQt6.QtCore as qtc
+
+from core.aligner import Aligner, AlignerConfiguration
+from core.worker import Worker
+from enums import IMAGE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+
+class FaceAlignmentWorker(Worker):
+    """Worker for exporting aligned faces of the `Face` metadata objects
+    as images.
+
+    Parameters
+    ----------
+    metadata_dir : Union[Path, str]
+        directory with `Face` metadata objects and `alignments.json`
+    face_size : int
+        size of the exported faces
+    output_dir : Optional[Union[Path, str]], optional
+        where to save aligned faces, if not provided, `aligned_<face_size>`
+        directory will be made in `metadata_dir`, by default None
+    image_format : IMAGE_FORMAT, optional
+        format of the exported faces, by default IMAGE_FORMAT.PNG
+    message_worker_sig : Optional[qtc.pyqtSignal], optional
+        signal to the message worker, by default None
+    """
+
+    def __init__(
+        self,
+        metadata_dir: Union[Path, str],
+        face_size: int,
+        output_dir: Optional[Union[Path, str]] = None,
+        image_format: IMAGE_FORMAT = IMAGE_FORMAT.PNG,
+        message_worker_sig: Optional[qtc.pyqtSignal] = None,
+    ) -> None:
+        super().__init__(message_worker_sig)
+        self._aligner = Aligner(AlignerConfiguration(
+            metadata_dir,
+            face_size,
+            message_worker_sig,
+            image_format=image_format,
+        ))
+        self._output_dir = output_dir
+
+    def run_job(self) -> None:
+        logger.info('Aligned faces export started, please wait...')
+        self.running.emit()
+        with self.stage('align'):
+            exported = self._aligner.align_faces(
+                self._output_dir,
+                should_stop=self.should_exit,
+            )
+        logger.info(f'Aligned faces export done, {exported} faces exported.')
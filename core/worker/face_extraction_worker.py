@@ -7,10 +7,9 @@ import PyQt6.QtCore as qtc
 from core.dictionary import Dictionary
 from core.face import Face
 from core.face_alignment.face_aligner import FaceAligner
-from core.face_alignment.utils import get_face_mask
 from core.face_detection.algorithms.faceboxes.faceboxes_fdm import FaceboxesFDM
 from core.face_detection.algorithms.s3fd.s3fd_fdm import S3FDFDM
-from core.image.image import Image
+from core.image.image import Image, ImagePrefetcher
 from core.landmark_detection.algorithms.fan.fan_ldm import FANLDM
 from core.worker import Worker
 from enums import (
@@ -116,7 +115,7 @@ class FaceExtractionWorker(Worker):
         """
         landmarks = self._ldm.detect_landmarks(face)
         face.landmarks = landmarks
-        face.mask = get_face_mask(face.raw_image.data, landmarks.dots)
+        face.compute_mask()
 
     def run_job(self) -> None:
         image_paths = get_image_paths_from_dir(self._input_dir)
@@ -142,21 +141,33 @@ class FaceExtractionWorker(Worker):
         )
         self.send_message(msg)
 
-        for idx, i_p in enumerate(image_paths):
+        # images are decoded in the background, at full size because
+        # landmarks are detected on almost every frame, detector downscales
+        # them in memory, decode stage is the time spent waiting
+        images = iter(ImagePrefetcher(image_paths))
+        for idx in range(len(image_paths)):
 
             if self.should_exit():
                 logger.info('Face extraction worker received stop signal.')
                 break
 
-            image = Image.load(i_p)
-            faces = self._detect_faces(image)
+            with self.stage('decode'):
+                image = next(images)
+            with self.stage('detect'):
+                faces = self._detect_faces(image)
+            self.profiler.count('faces', len(faces))
 
             for f in faces:
-                self._detect_landmarks(f)
-                FaceSerializer.save(f, self._output_dir)
+                with self.stage('landmark'):
+                    self._detect_landmarks(f)
+                with self.stage('serialize'):
+                    FaceSerializer.save(f, self._output_dir)
                 landmarks.add(f.name, f.landmarks.dots)
-                FaceAligner.calculate_alignment(f)
+                with self.stage('align'):
+                    FaceAligner.calculate_alignment(f)
                 alignments.add(f.name, f.alignment)
+                # frame is loaded again from the disk if it's needed later
+                f.release_raw_image()
 
             self.report_progress(
                 SIGNAL_OWNER.FACE_EXTRACTION_WORKER,
@@ -164,6 +175,7 @@ class FaceExtractionWorker(Worker):
                 idx,
                 len(image_paths),
             )
+        images.close()
 
         logger.debug('Saving landmarks.')
         landmarks.save(self._output_dir / 'landmarks.json')
@@ -8,6 +8,7 @@ import PyQt6.QtCore as qtc
 from core.worker import Worker
 from enums import JOB_NAME, JOB_TYPE, SIGNAL_OWNER, WIDGET
 from message.message import Messages
+from utils import get_file_paths_from_dir
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,13 @@ class FramesExtractionWorker(Worker):
         )
         self.send_message(msg)
 
+        # frames from the previous run are kept, directory is listed once
+        # instead of checking every frame path
+        existing = set(
+            p.name for p in
+            get_file_paths_from_dir(self._frames_directory) or []
+        )
+
         success, image = vidcap.read()
         count = 0
         while success:
@@ -71,9 +79,10 @@ class FramesExtractionWorker(Worker):
                 logger.info('Frames extraction worker received stop signal.')
                 break
 
-            path = self._frames_directory / f'frame_{count}.png'
-            if not path.exists():
-                cv.imwrite(str(path), image)
+            name = f'frame_{count}.png'
+            if name not in existing:
+                with self.stage('write'):
+                    cv.imwrite(str(self._frames_directory / name), image)
 
             self.report_progress(
                 SIGNAL_OWNER.FRAMES_EXTRACTION_WORKER,
@@ -83,8 +92,9 @@ class FramesExtractionWorker(Worker):
             )
             count += 1
 
-            for _ in range(self._every_nth - 1):
+            with self.stage('decode'):
+                for _ in range(self._every_nth - 1):
+                    success, image = vidcap.read()
                 success, image = vidcap.read()
-            success, image = vidcap.read()
 
         logger.info('Frames extraction finished.')
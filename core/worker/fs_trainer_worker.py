@@ -8,14 +8,15 @@ import torch
 from torch.utils.data import DataLoader
 import torchvision.transforms as T
 
+from configs.app_config import APP_CONFIG
 from core.dataset.dataset import FSDataset
 from core.model.configuration import ModelConfig
 from core.trainer.fs_trainer import FSTrainer
-from core.model.fs import FS
+from core.model.fs import FS, resolve_device
 from core.trainer.trainer import StepTrainerConfiguration
 from core.worker import Worker
 from df_logging.model_logging import DFLogger
-from enums import JOB_NAME, JOB_TYPE, SIGNAL_OWNER, WIDGET
+from enums import DEVICE, JOB_NAME, JOB_TYPE, SIGNAL_OWNER, WIDGET
 from message.message import Messages
 from variables import IMAGENET_MEAN, IMAGENET_STD
 
@@ -39,6 +40,8 @@ class FSTrainerWorker(Worker):
         checkpoint_frequency: int,
         resume: bool,
         resume_run_name: Optional[str] = None,
+        device: Optional[DEVICE] = None,
+        arc_path: Optional[Union[str, Path]] = None,
         message_worker_sig: Optional[qtc.pyqtSignal] = None,
     ) -> None:
         super().__init__(message_worker_sig)
@@ -61,7 +64,10 @@ class FSTrainerWorker(Worker):
             self._resume_run_name = resume_run_name
         else:
             self._resume_run_name = None
-        self._device = torch.device('cuda')
+        self._device = resolve_device(device)
+        if arc_path is None:
+            arc_path = APP_CONFIG.app.core.face_swap.models.fs.arc_path
+        self._arc_path = Path(arc_path)
 
     def run_job(self) -> None:
         transforms = T.Compose([
@@ -75,7 +81,7 @@ class FSTrainerWorker(Worker):
             batch_size=self._batch_size,
             shuffle=True,
             num_workers=8,
-            pin_memory=True,
+            pin_memory=self._device == DEVICE.CUDA,
             drop_last=True,
             persistent_workers=True,
         )
@@ -83,7 +89,8 @@ class FSTrainerWorker(Worker):
         model_options = {
             'train': True,
             'gdeep': self._gdeep,
-            'arc_path': r'C:\Users\tonkec\Documents\SimSwap-main\arcface_model\new_arc.tar',
+            'arc_path': self._arc_path,
+            'device': self._device,
             'lr': self._lr,
             'beta1': self._beta1,
             'lambda_id': self._lambda_id,
@@ -109,7 +116,7 @@ class FSTrainerWorker(Worker):
             model_config=model_conf,
             df_logger=df_logger,
             resume_run=self._resume,
-            device=self._device,
+            device=torch.device(self._device.value),
             use_cudnn_benchmark=self._use_cudnn_bench,
         )
         trainer = FSTrainer(conf, self.stop_event)
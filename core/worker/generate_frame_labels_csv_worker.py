@@ -9,7 +9,7 @@ import pandas as pd
 import PyQt6.QtCore as qtc
 
 from core.df_detection.mri_gan.data_utils.utils import (
-    filter_dfdc_dirs,
+    get_dfdc_dirs,
     get_metadata_file_paths,
 )
 from core.worker import MRIGANWorker, WorkerWithPool
@@ -22,6 +22,7 @@ from enums import (
     WIDGET,
 )
 from message.message import Messages
+from utils import scan_dir
 
 logger = logging.getLogger(__name__)
 
@@ -163,14 +164,9 @@ class GenerateFrameLabelsCSVWorker(MRIGANWorker, WorkerWithPool):
             ]
         )
 
-        dfdc_dirs = filter_dfdc_dirs(os.listdir(crop_path))
         crop_id_paths = []
-        [
-            crop_id_paths.extend(
-                [crop_path / d / id for id in os.listdir(crop_path / d)]
-            )
-            for d in dfdc_dirs
-        ]
+        for d in get_dfdc_dirs(crop_path):
+            crop_id_paths.extend(scan_dir(d, directories=True))
 
         logger.info(f'Found {len(crop_id_paths)} video directories.')
 
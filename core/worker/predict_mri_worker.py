@@ -1,22 +1,16 @@
 import logging
 import multiprocessing
-import os
 from pathlib import Path
 from typing import List, Optional
 
-from PIL import Image
 import PyQt6.QtCore as qtc
-import torch
-from torchvision.transforms import transforms
-from torchvision.utils import save_image
 
-from configs.mri_gan_config import MRIGANConfig
-from core.df_detection.mri_gan.data_utils.utils import filter_dfdc_dirs
-from core.df_detection.mri_gan.mri_gan.model import get_MRI_GAN
+from core.df_detection.mri_gan.data_utils.utils import get_dfdc_dirs
+from core.df_detection.mri_gan.mri_gan.inference import predict_mri_for_video
 from core.worker import MRIGANWorker, WorkerWithPool
 from enums import DATA_TYPE, DEVICE, JOB_NAME, JOB_TYPE, SIGNAL_OWNER, WIDGET
 from message.message import Messages
-from utils import batchify
+from utils import scan_dir
 
 logger = logging.getLogger(__name__)
 
@@ -66,18 +60,9 @@ class PredictMRIWorker(MRIGANWorker, WorkerWithPool):
         List[Path]
             list of video paths
         """
-        dirs = os.listdir(crops_path)
-        dirs = filter_dfdc_dirs(dirs)
-        dirs = [crops_path / d for d in dirs]
         file_dirs = []
-        [
-            file_dirs.extend(
-                [
-                    directory / file for file in os.listdir(directory)
-                ]
-            )
-            for directory in dirs
-        ]
+        for directory in get_dfdc_dirs(crops_path):
+            file_dirs.extend(scan_dir(directory, directories=True))
         return file_dirs
 
     @staticmethod
@@ -105,46 +90,16 @@ class PredictMRIWorker(MRIGANWorker, WorkerWithPool):
         overwrite : bool, optional
             should already predicted MRIs be overwritten, by default False
         """
-        logger.debug(f'Predicting MRI for video {str(v_d)}.')
-        video_id = v_d.parts[-1]
-        if inference:
-            part = ''
-        else:
-            part = v_d.parts[-2]
-        vid_mri_path = mri_path / part / video_id
-        if not overwrite and vid_mri_path.is_dir():
-            return
-
-        vid_mri_path.mkdir(exist_ok=True)
-        frame_paths = [v_d / file for file in os.listdir(v_d)]
-
-        im_size = MRIGANConfig \
-            .get_instance() \
-            .get_mri_gan_model_params()['imsize']
-        transforms_ = transforms.Compose([
-            transforms.Resize((im_size, im_size)),
-            transforms.ToTensor(),
-            transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
-        ])
-
-        mri_generator = get_MRI_GAN(
-            load_from_gd=load_model_from_gd,
-            device=device,
+        predict_mri_for_video(
+            mri_path,
+            v_d,
+            batch_size,
+            device,
+            load_model_from_gd,
+            overwrite,
+            inference,
         )
 
-        for frame_names in batchify(frame_paths, batch_size):
-            frames = list(
-                map(lambda fn: transforms_(Image.open(fn)), frame_names)
-            )
-            frames = torch.stack(frames)
-            frames = frames.to(device.value)
-            mri_images = mri_generator(frames)
-            for idx in range(mri_images.shape[0]):
-                save_path = vid_mri_path / frame_names[idx].parts[-1]
-                save_image(mri_images[idx], save_path)
-
-        logger.debug(f'MRI prediction done for video {str(v_d)}.')
-
     def run_job(self) -> None:
         logger.info('MRI prediction started.')
 
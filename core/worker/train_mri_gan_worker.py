@@ -10,18 +10,28 @@ import numpy as np
 import PyQt6.QtCore as qtc
 from pytorch_msssim import SSIM
 import torch
-from torch.utils.data import DataLoader
 import torchvision
 from torchvision.transforms import transforms
 from torchvision.utils import save_image
 from tqdm import tqdm
 
+from core.checkpoint import AppendOnlyLog, CheckpointWriter
+from core.dataset.loader import (
+    RealFakePairSampler,
+    cycle,
+    default_num_workers,
+    make_loader,
+)
 from core.df_detection.mri_gan.mri_gan.dataset import MRIDataset
 from core.df_detection.mri_gan.mri_gan.model import (
     Discriminator,
     GeneratorUNet,
     weights_init_normal,
 )
+from core.df_detection.mri_gan.mri_gan.training import (
+    LOSS_COLUMNS,
+    losses_log_path,
+)
 from core.worker.worker import Worker
 from configs.mri_gan_config import MRIGANConfig, print_line
 from enums import DEVICE, JOB_NAME, JOB_TYPE, SIGNAL_OWNER, WIDGET
@@ -102,7 +112,6 @@ class TrainMRIGANWorker(Worker):
             lr=self._lr,
             betas=(m_p['b1'], m_p['b2']),
         )
-        losses = []
         # ssim_report = []
         global_batches_done = 0
         start_epoch = 0
@@ -160,6 +169,18 @@ class TrainMRIGANWorker(Worker):
         #     m_p['model_name'] / m_p['ssim_report_file']
 
         m_p['log_dir'] = self._log_dir
+
+        def checkpoint_state(epoch):
+            return {
+                'epoch': epoch,
+                'model_params': m_p,
+                'log_dir': str(self._log_dir),
+                'generator_state_dict': generator.state_dict(),
+                'discriminator_state_dict': discriminator.state_dict(),
+                'optimizer_G_state_dict': optimizer_G.state_dict(),
+                'optimizer_D_state_dict': optimizer_D.state_dict(),
+            }
+
         checkpoint_best_G_path = self._log_dir / \
             m_p['model_name'] / 'checkpoint_best_G.chkpt'
         checkpoint_best_D_path = self._log_dir / \
@@ -184,229 +205,214 @@ class TrainMRIGANWorker(Worker):
         )
         self.send_message(conf_wgt_msg)
 
-        for e in range(self._epochs):
-
-            if self.should_exit():
-                logger.info('Received stop signal, exiting now.')
-                return
-
-            if e < start_epoch:
-                logger.debug(f'Skipping epoch {e}.')
-                continue
-
-            # we are creating dataloader at each epoch as we want to sample new
-            # fake image randomly as each epoch. We have lesser real image and
-            # more fake. We can get more real images but that would impose a
-            # lot of computation power need considering the dataset size we
-            # have.
-
-            logger.debug(f'Creating data loaders for epoch: {e}.')
-            train_dataset = MRIDataset(
-                mode='train',
-                transforms=data_transforms,
-                frac=m_p['frac'],
-            )
-            test_dataset = MRIDataset(
-                mode='test',
-                transforms=data_transforms,
-                frac=m_p['frac'],
-            )
-
-            num_workers = 8
-            # num_workers = 0
-            train_dataloader = DataLoader(
-                train_dataset,
-                batch_size=self._batch_size,
-                shuffle=True,
-                num_workers=num_workers,
-            )
-
-            test_dataloader = DataLoader(
-                test_dataset,
-                batch_size=self._batch_size,
-                shuffle=True,
-                num_workers=num_workers,
-            )
-
-            desc = '[e:{}/{}] [G_loss:{}] [D_loss:{}]' \
-                .format(e, self._epochs, 'N/A', 'N/A')
-            pbar = tqdm(train_dataloader, desc=desc)
-
-            for local_batch_num, batch in enumerate(pbar):
+        # datasets and loaders are created once, workers persist between the
+        # epochs. We have lesser real images and more fake, the sampler picks
+        # new fake images randomly every epoch instead of creating the datasets
+        # again.
+        train_dataset = MRIDataset(
+            mode='train',
+            transforms=data_transforms,
+            frac=m_p['frac'],
+        )
+        test_dataset = MRIDataset(
+            mode='test',
+            transforms=data_transforms,
+            frac=m_p['frac'],
+        )
+        train_dataloader = make_loader(
+            train_dataset,
+            batch_size=self._batch_size,
+            sampler=RealFakePairSampler(
+                train_dataset.real_indices,
+                train_dataset.fake_indices,
+            ),
+        )
+        # small loader of the test set which only feeds sample generation,
+        # its iterator is kept instead of starting new one for every sample
+        sample_dataloader = make_loader(
+            test_dataset,
+            batch_size=self._batch_size,
+            sampler=RealFakePairSampler(
+                test_dataset.real_indices,
+                test_dataset.fake_indices,
+            ),
+            num_workers=min(1, default_num_workers()),
+            drop_last=True,
+        )
+        sample_batches = cycle(sample_dataloader)
+
+        # queued checkpoints and losses are written even if training fails
+        with AppendOnlyLog(
+            losses_log_path(str(losses_file)),
+            LOSS_COLUMNS,
+        ) as losses_log, CheckpointWriter() as checkpoint_writer:
+            # log directory is shared by the runs of the same gui session,
+            # rows of the previous run are dropped
+            losses_log.truncate(global_batches_done)
+
+            for e in range(self._epochs):
 
                 if self.should_exit():
                     logger.info('Received stop signal, exiting now.')
                     return
 
-                generator.train()
-                discriminator.train()
-                real_A = batch['A'].to(device)
-                real_B = batch['B'].to(device)
-
-                valid = torch.ones((real_A.size(0), *patch)).to(device)
-                fake = torch.zeros((real_A.size(0), *patch)).to(device)
-
-                #  Train Generator
-                optimizer_G.zero_grad()
-
-                # GAN loss
-                fake_B = generator(real_A)
-                pred_fake = discriminator(fake_B, real_A)
-                loss_GAN = criterion_GAN(pred_fake, valid)
-                # Pixel-wise loss
-                loss_pixel = criterion_pixelwise(fake_B, real_B)
-                fake_B_dn = denormalize(fake_B)
-                real_B_dn = denormalize(real_B)
-                # SSIM loss
-                loss_ssim = torch.sqrt(
-                    1 - criterion_ssim(fake_B_dn, real_B_dn)
-                )
-                # Total generator loss
-                loss_G = loss_GAN + m_p['lambda_pixel'] * (
-                    m_p['tau'] * loss_pixel +
-                    (1 - m_p['tau']) * loss_ssim)
-
-                loss_G.backward()
-                optimizer_G.step()
-
-                #  Train Discriminator
-                optimizer_D.zero_grad()
-
-                # Real loss
-                pred_real = discriminator(real_B, real_A)
-                loss_real = criterion_GAN(pred_real, valid)
-                # Fake loss
-                pred_fake = discriminator(fake_B.detach(), real_A)
-                loss_fake = criterion_GAN(pred_fake, fake)
-                # Total discriminator loss
-                loss_D = 0.5 * (loss_real + loss_fake)
-
-                loss_D.backward()
-                optimizer_D.step()
+                if e < start_epoch:
+                    logger.debug(f'Skipping epoch {e}.')
+                    continue
 
                 desc = '[e:{}/{}] [G_loss:{}] [D_loss:{}]' \
-                    .format(e, self._epochs, loss_G.item(), loss_D.item())
-                pbar.set_description(desc=desc, refresh=True)
-
-                losses.append(
-                    [
-                        e,
-                        local_batch_num,
-                        global_batches_done,
-                        loss_G.item(),
-                        loss_GAN.item(),
-                        loss_pixel.item(),
-                        loss_ssim.item(),
-                        loss_D.item(),
-                        loss_real.item(),
-                        loss_fake.item(),
-                    ]
-                )
-
-                mri_gan_metadata['global_batches_done'] = global_batches_done
-                mri_gan_metadata['model_params'] = m_p
-
-                global_batches_done += 1
-
-                if global_batches_done % m_p['sample_gen_freq'] == 0:
-                    try:
-                        generator.eval()
-                        imgs = next(iter(test_dataloader))
-                        rand_start = random.randint(
-                            0,
-                            self._batch_size -
-                            m_p['test_sample_size'],
-                        )
-                        rand_end = rand_start + \
-                            m_p['test_sample_size']
-                        real_A = imgs['A'][rand_start:rand_end].to(device)
-                        real_B = imgs['B'][rand_start:rand_end].to(device)
-                        fake_B = generator(real_A)
-                        img_sample = torch.cat(
-                            (real_A.data, real_B.data, fake_B.data),
-                            -2,
-                        )
-                        os.makedirs(
-                            generated_samples_path / str(e),
-                            exist_ok=True,
-                        )
-                        img_path = '{}/{}/{}.png'.format(
-                            str(generated_samples_path),
+                    .format(e, self._epochs, 'N/A', 'N/A')
+                pbar = tqdm(train_dataloader, desc=desc)
+
+                for local_batch_num, batch in enumerate(pbar):
+
+                    if self.should_exit():
+                        logger.info('Received stop signal, exiting now.')
+                        return
+
+                    generator.train()
+                    discriminator.train()
+                    real_A = batch['A'].to(device)
+                    real_B = batch['B'].to(device)
+
+                    valid = torch.ones((real_A.size(0), *patch)).to(device)
+                    fake = torch.zeros((real_A.size(0), *patch)).to(device)
+
+                    #  Train Generator
+                    optimizer_G.zero_grad()
+
+                    # GAN loss
+                    fake_B = generator(real_A)
+                    pred_fake = discriminator(fake_B, real_A)
+                    loss_GAN = criterion_GAN(pred_fake, valid)
+                    # Pixel-wise loss
+                    loss_pixel = criterion_pixelwise(fake_B, real_B)
+                    fake_B_dn = denormalize(fake_B)
+                    real_B_dn = denormalize(real_B)
+                    # SSIM loss
+                    loss_ssim = torch.sqrt(
+                        1 - criterion_ssim(fake_B_dn, real_B_dn)
+                    )
+                    # Total generator loss
+                    loss_G = loss_GAN + m_p['lambda_pixel'] * (
+                        m_p['tau'] * loss_pixel +
+                        (1 - m_p['tau']) * loss_ssim)
+
+                    loss_G.backward()
+                    optimizer_G.step()
+
+                    #  Train Discriminator
+                    optimizer_D.zero_grad()
+
+                    # Real loss
+                    pred_real = discriminator(real_B, real_A)
+                    loss_real = criterion_GAN(pred_real, valid)
+                    # Fake loss
+                    pred_fake = discriminator(fake_B.detach(), real_A)
+                    loss_fake = criterion_GAN(pred_fake, fake)
+                    # Total discriminator loss
+                    loss_D = 0.5 * (loss_real + loss_fake)
+
+                    loss_D.backward()
+                    optimizer_D.step()
+
+                    loss_G_val = loss_G.item()
+                    loss_D_val = loss_D.item()
+                    desc = '[e:{}/{}] [G_loss:{}] [D_loss:{}]' \
+                        .format(e, self._epochs, loss_G_val, loss_D_val)
+                    pbar.set_description(desc=desc, refresh=True)
+
+                    losses_log.append(
+                        [
                             e,
                             local_batch_num,
+                            global_batches_done,
+                            loss_G_val,
+                            loss_GAN.item(),
+                            loss_pixel.item(),
+                            loss_ssim.item(),
+                            loss_D_val,
+                            loss_real.item(),
+                            loss_fake.item(),
+                        ]
+                    )
+
+                    mri_gan_metadata['global_batches_done'] = \
+                        global_batches_done
+                    mri_gan_metadata['model_params'] = m_p
+
+                    global_batches_done += 1
+
+                    if global_batches_done % m_p['sample_gen_freq'] == 0:
+                        try:
+                            generator.eval()
+                            imgs = next(sample_batches)
+                            rand_start = random.randint(
+                                0,
+                                self._batch_size -
+                                m_p['test_sample_size'],
+                            )
+                            rand_end = rand_start + \
+                                m_p['test_sample_size']
+                            real_A = imgs['A'][rand_start:rand_end].to(device)
+                            real_B = imgs['B'][rand_start:rand_end].to(device)
+                            fake_B = generator(real_A)
+                            img_sample = torch.cat(
+                                (real_A.data, real_B.data, fake_B.data),
+                                -2,
+                            )
+                            os.makedirs(
+                                generated_samples_path / str(e),
+                                exist_ok=True,
+                            )
+                            img_path = '{}/{}/{}.png'.format(
+                                str(generated_samples_path),
+                                e,
+                                local_batch_num,
+                            )
+                            save_image(
+                                img_sample,
+                                img_path,
+                                nrow=int(np.sqrt(m_p['test_sample_size'])),
+                                normalize=True,
+                            )
+                        except Exception as expn:
+                            print(f'Exception {expn}')
+                            pass
+
+                    if global_batches_done % m_p['chkpt_freq'] == 0:
+                        checkpoint_writer.save(
+                            checkpoint_state(e),
+                            checkpoint_path,
+                        )
+
+                    if loss_D_val < loss_D_lowest:
+                        loss_D_lowest = loss_D_val
+                        checkpoint_writer.save(
+                            checkpoint_state(e),
+                            checkpoint_best_D_path,
                         )
-                        save_image(
-                            img_sample,
-                            img_path,
-                            nrow=int(np.sqrt(m_p['test_sample_size'])),
-                            normalize=True,
+
+                    if loss_G_val < loss_G_lowest:
+                        loss_G_lowest = loss_G_val
+                        checkpoint_writer.save(
+                            checkpoint_state(e),
+                            checkpoint_best_G_path,
                         )
 
-                        # mean_ssim = get_ssim_report(
-                        #     global_batches_done - 1, model_params, imgs,
-                        #     generator, device, save_img=False)
-                        # ssim_report.append(
-                        #     [e, local_batch_num, global_batches_done,
-                        # mean_ssim])
-                        # pickle.dump(ssim_report, open(ssim_report_file,
-                        # "wb"))
-
-                        # generate_graphs(
-                        #     losses_file, ssim_report_file, model_params)
-                    except Exception as expn:
-                        print(f'Exception {expn}')
-                        pass
-
-                if global_batches_done % m_p['chkpt_freq'] == 0:
-                    check_point_dict = {
-                        'epoch': e,
-                        'model_params': m_p,
-                        'log_dir': str(self._log_dir),
-                        'generator_state_dict': generator.state_dict(),
-                        'discriminator_state_dict': discriminator.state_dict(),
-                        'optimizer_G_state_dict': optimizer_G.state_dict(),
-                        'optimizer_D_state_dict': optimizer_D.state_dict(),
-                    }
-                    torch.save(check_point_dict, checkpoint_path)
-
-                if loss_D.item() < loss_D_lowest:
-                    loss_D_lowest = loss_D.item()
-
-                    check_point_dict = {
-                        'epoch': e,
-                        'model_params': m_p,
-                        'log_dir': str(self._log_dir),
-                        'generator_state_dict': generator.state_dict(),
-                        'discriminator_state_dict': discriminator.state_dict(),
-                        'optimizer_G_state_dict': optimizer_G.state_dict(),
-                        'optimizer_D_state_dict': optimizer_D.state_dict(),
-                    }
-                    torch.save(check_point_dict, checkpoint_best_D_path)
-
-                if loss_G.item() < loss_G_lowest:
-                    loss_G_lowest = loss_G.item()
-
-                    check_point_dict = {
-                        'epoch': e,
-                        'model_params': m_p,
-                        'log_dir': str(self._log_dir),
-                        'generator_state_dict': generator.state_dict(),
-                        'discriminator_state_dict': discriminator.state_dict(),
-                        'optimizer_G_state_dict': optimizer_G.state_dict(),
-                        'optimizer_D_state_dict': optimizer_D.state_dict(),
-                    }
-                    torch.save(check_point_dict, checkpoint_best_G_path)
-
-                mri_gan_metadata['loss_D_lowest'] = loss_D_lowest
-                mri_gan_metadata['loss_G_lowest'] = loss_G_lowest
-                pickle.dump(losses, open(losses_file, 'wb'))
-                pickle.dump(mri_gan_metadata, open(metadata_file, 'wb'))
-
-            self.report_progress(
-                SIGNAL_OWNER.LANDMARK_EXTRACTION_WORKER,
-                JOB_TYPE.TRAIN_MRI_GAN,
-                e,
-                self._epochs,
-            )
+                    mri_gan_metadata['loss_D_lowest'] = loss_D_lowest
+                    mri_gan_metadata['loss_G_lowest'] = loss_G_lowest
+                    checkpoint_writer.save(
+                        mri_gan_metadata,
+                        metadata_file,
+                        save_fn=pickle.dump,
+                    )
+
+                self.report_progress(
+                    SIGNAL_OWNER.LANDMARK_EXTRACTION_WORKER,
+                    JOB_TYPE.TRAIN_MRI_GAN,
+                    e,
+                    self._epochs,
+                )
 
         logger.info('MRI GAN training finished.')
@@ -10,6 +10,7 @@ from torch.utils.data import DataLoader
 
 from core.aligner import Aligner, AlignerConfiguration
 from core.dataset.dataset_old import DeepfakeDataset
+from core.dataset.loader import main_process_loading, make_loader
 from core.model.model import DeepfakeModel
 from core.model.original_ae import OriginalAE
 from core.trainer.configuration import TrainerConfiguration
@@ -146,12 +147,13 @@ class TrainingWorker(qtc.QObject):
             transformations=conf.data_transforms,
             image_augmentations=conf.image_augmentations,
         )
-        data_loader = DataLoader(
-            dataset=dataset,
+        # worker processes are persistent so they are started only once for
+        # the whole training
+        data_loader = make_loader(
+            dataset,
             batch_size=conf.batch_size,
             shuffle=conf.shuffle,
-            # num_workers=self.num_workers,
-            num_workers=0,  # > 0 not working on Windows
+            num_workers=0 if main_process_loading() else conf.num_workers,
         )
         return data_loader
 
@@ -172,5 +174,6 @@ class TrainingWorker(qtc.QObject):
             checkpoints_dir=self._conf.checkpoints_dir,
             show_preview=self._conf.preview_conf.show_preview,
             show_preview_comm=self._conf.preview_conf.comm_object,
+            logging_budget=self._conf.logging_budget,
         )
         return trainer
@@ -1,25 +1,208 @@
+import cProfile
+from contextlib import contextmanager
+import json
 import logging
 from multiprocessing import Queue
 from multiprocessing.queues import Empty
 from datetime import timedelta
+import os
+from pathlib import Path
 import sys
 import threading
+import time
 import traceback
-from typing import Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import PyQt6.QtCore as qtc
 import enlighten
 from enlighten._counter import Counter
 
+from configs.app_config import APP_CONFIG
 from enums import (
     BODY_KEY,
     JOB_TYPE,
     MESSAGE_STATUS,
     MESSAGE_TYPE,
+    PROFILER,
     SIGNAL_OWNER,
 )
 from message.message import Body, Message, Messages
-from utils import format_timedelta
+from utils import format_timedelta, get_date_uid
+
+
+class StageProfiler:
+    """Lightweight instrumentation of the job stages. Time spent in every
+    stage is measured with the `stage` context manager and summed per stage
+    name, `count` can be used for counting arbitrary things like number of
+    detected faces. Optionally, `cProfile` or `torch.profiler` capture can
+    run for the whole job.
+
+    Args:
+        max_events (int, optional): maximum number of stage events kept for
+            the Chrome trace. Defaults to 100000.
+    """
+
+    def __init__(self, max_events: int = 100000) -> None:
+        self._max_events = max_events
+        self._lock = threading.Lock()
+        self._capture = None
+        self._capture_type = PROFILER.NONE
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears all timings, counters and events."""
+        with self._lock:
+            # stage name -> [total time, number of calls, min, max]
+            self._stages: Dict[str, List[float]] = {}
+            self._counters: Dict[str, int] = {}
+            self._events: List[Dict[str, Any]] = []
+            self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measures time spent inside of the `with` block.
+
+        Parameters
+        ----------
+        name : str
+            name of the stage, e.g. decode, detect, serialize
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, start, time.perf_counter())
+
+    def _add(self, name: str, start: float, end: float) -> None:
+        duration = end - start
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                self._stages[name] = [duration, 1, duration, duration]
+            else:
+                stats[0] += duration
+                stats[1] += 1
+                stats[2] = min(stats[2], duration)
+                stats[3] = max(stats[3], duration)
+            if len(self._events) < self._max_events:
+                self._events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': (start - self._t0) * 1e6,
+                    'dur': duration * 1e6,
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                })
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Increments counter `name` by `n`.
+
+        Parameters
+        ----------
+        name : str
+            name of the counter
+        n : int, optional
+            increment, by default 1
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregated timings of the stages, every stage contains total time,
+        number of calls, mean, min and max time in seconds and the share of
+        the total measured time.
+
+        Returns
+        -------
+        Dict[str, Any]
+            stage timings and counters
+        """
+        with self._lock:
+            measured = sum(s[0] for s in self._stages.values())
+            stages = {
+                name: {
+                    'total': total,
+                    'count': count,
+                    'mean': total / count,
+                    'min': s_min,
+                    'max': s_max,
+                    'share': total / measured if measured else 0.,
+                }
+                for name, (total, count, s_min, s_max) in self._stages.items()
+            }
+            return {
+                'elapsed': time.perf_counter() - self._t0,
+                'stages': stages,
+                'counters': dict(self._counters),
+            }
+
+    def start_capture(self, profiler: PROFILER) -> None:
+        """Starts profiler which captures whole call stacks.
+
+        Parameters
+        ----------
+        profiler : PROFILER
+            which profiler to use
+        """
+        self._capture_type = profiler
+        if profiler == PROFILER.CPROFILE:
+            self._capture = cProfile.Profile()
+            self._capture.enable()
+        elif profiler == PROFILER.TORCH:
+            # imported only when needed, torch is heavy for the workers which
+            # don't run any models
+            import torch.profiler
+            self._capture = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+            )
+            self._capture.__enter__()
+
+    def stop_capture(self, path: Union[str, Path]) -> None:
+        """Stops profiler started with `start_capture` and saves its output.
+        `cProfile` output is saved in `pstats` format, `torch.profiler` output
+        as Chrome trace.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            file path without extension
+        """
+        if self._capture is None:
+            return
+        path = str(path)
+        if self._capture_type == PROFILER.CPROFILE:
+            self._capture.disable()
+            self._capture.dump_stats(path + '.prof')
+        elif self._capture_type == PROFILER.TORCH:
+            self._capture.__exit__(None, None, None)
+            self._capture.export_chrome_trace(path + '.torch.json')
+        self._capture = None
+        self._capture_type = PROFILER.NONE
+
+    def dump(self, path: Union[str, Path]) -> None:
+        """Saves summary of stage timings as json file.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            path of the json file
+        """
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+    def dump_chrome_trace(self, path: Union[str, Path]) -> None:
+        """Saves stage events in Chrome trace format which can be opened in
+        `chrome://tracing` or Perfetto.
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            path of the json file
+        """
+        with self._lock:
+            events = list(self._events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events}, f)
 
 
 class Worker(qtc.QObject):
@@ -58,6 +241,12 @@ class Worker(qtc.QObject):
         self._forced_exit = False
         self._logger = logging.getLogger(type(self).__name__)
         self._stop_event = threading.Event()
+        self._profiler = StageProfiler()
+        self._profile_dir: Optional[Path] = None
+        self._profiler_type = PROFILER.NONE
+        profiling = APP_CONFIG.app.core.profiling
+        if profiling.enabled:
+            self.enable_profiling(profiling.directory, profiling.profiler)
 
     @property
     def conn_q(self) -> Queue:
@@ -75,6 +264,59 @@ class Worker(qtc.QObject):
     def ticks(self) -> Union[Counter, None]:
         return self._ticks
 
+    @property
+    def profiler(self) -> StageProfiler:
+        return self._profiler
+
+    def enable_profiling(
+        self,
+        profile_dir: Union[str, Path],
+        profiler: PROFILER = PROFILER.NONE,
+    ) -> None:
+        """After every job, stage timings summary and Chrome trace of the
+        stages are saved to `profile_dir`. Optionally, output of the
+        `profiler` which runs during the whole job is saved too.
+
+        Parameters
+        ----------
+        profile_dir : Union[str, Path]
+            directory where profiling results are saved
+        profiler : PROFILER, optional
+            additional profiler capturing whole job, by default PROFILER.NONE
+        """
+        self._profile_dir = Path(profile_dir)
+        self._profiler_type = profiler
+
+    def stage(self, name: str):
+        """Context manager which measures time spent in the stage `name` of
+        the current job.
+
+        Parameters
+        ----------
+        name : str
+            name of the stage
+        """
+        return self._profiler.stage(name)
+
+    def _start_profiling(self) -> None:
+        self._profiler.reset()
+        if self._profile_dir is not None:
+            self._profiler.start_capture(self._profiler_type)
+
+    def _finish_profiling(self) -> None:
+        if self._profile_dir is None:
+            return
+        try:
+            self._profile_dir.mkdir(parents=True, exist_ok=True)
+            path = self._profile_dir / \
+                f'{type(self).__name__}_{get_date_uid()}'
+            self._profiler.stop_capture(path)
+            self._profiler.dump(str(path) + '.stages.json')
+            self._profiler.dump_chrome_trace(str(path) + '.trace.json')
+            self._logger.info(f'Profiling results saved to {str(path)}.*')
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+
     def send_message(self, message: Message):
         """Send a message through message worker to wherever needed.
 
@@ -117,11 +359,13 @@ class Worker(qtc.QObject):
         thread when she starts and not by your explicit call.
         """
         self.started.emit()
+        self._start_profiling()
         try:
             self.run_job()
         except Exception:
             traceback.print_exc(file=sys.stdout)
         finally:
+            self._finish_profiling()
             self.finished.emit()
             self.send_message(Messages.JOB_EXIT())
             self._ticks = None
@@ -144,7 +388,8 @@ class Worker(qtc.QObject):
         part: int,
         total_parts: int,
     ) -> None:
-        """Used to report progress to the job widget.
+        """Used to report progress to the job widget. Message also carries
+        stage timings of the current job.
 
         Parameters
         ----------
@@ -171,11 +416,13 @@ class Worker(qtc.QObject):
                     BODY_KEY.PART: part,
                     BODY_KEY.TOTAL: total_parts,
                     BODY_KEY.ETA: self._calculate_eta(),
+                    BODY_KEY.STAGE_TIMINGS: self._profiler.summary(),
                 },
                 part == total_parts - 1,
             )
         )
-        self.send_message(job_prog_msg)
+        with self._profiler.stage('emit'):
+            self.send_message(job_prog_msg)
 
     def _init_ticks(self, length: int) -> None:
         """Initializes counter which tracks how much until job is finished.
@@ -0,0 +1,252 @@
+"""Training metrics which don't stall the training loop.
+
+Meter values are accumulated as detached tensors on the device they were
+computed on, so updating a meter never waits for the device. Every
+`sync_frequency` steps all meters are averaged and moved to the CPU in a
+single transfer and handed to the background thread which writes them to
+the sinks: local JSONL or CSV file, tensorboard and optionally wandb.
+"""
+import csv
+import json
+import logging
+from numbers import Number
+from pathlib import Path
+from queue import Queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Union
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+MeterValue = Union[torch.Tensor, Number]
+
+
+class MetricSink:
+    """Destination of the reduced metrics, `write` is always called from the
+    background thread of the `MetricsLogger`.
+    """
+
+    def write(self, step: int, metrics: Dict[str, float]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JSONLSink(MetricSink):
+    """Appends one JSON object per logged step to the file.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        path of the JSONL file
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._path, 'a')
+
+    def write(self, step: int, metrics: Dict[str, float]) -> None:
+        record = {'step': step, 'time': time.time(), **metrics}
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CSVSink(MetricSink):
+    """Appends one row per logged step to the CSV file, columns are fixed by
+    the meters registered before the first write.
+
+    Parameters
+    ----------
+    path : Union[str, Path]
+        path of the CSV file
+    columns : Sequence[str]
+        names of the meters
+    """
+
+    def __init__(self, path: Union[str, Path], columns: Sequence[str]) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._columns = list(columns)
+        new_file = not self._path.exists() or self._path.stat().st_size == 0
+        self._file = open(self._path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(['step', *self._columns])
+
+    def write(self, step: int, metrics: Dict[str, float]) -> None:
+        self._writer.writerow(
+            [step, *[metrics.get(c, '') for c in self._columns]]
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class TensorboardSink(MetricSink):
+    """Writes every meter as a scalar to tensorboard.
+
+    Parameters
+    ----------
+    log_dir : Union[str, Path]
+        directory of the tensorboard event files
+    """
+
+    def __init__(self, log_dir: Union[str, Path]) -> None:
+        from torch.utils.tensorboard import SummaryWriter
+        self._writer = SummaryWriter(log_dir=str(log_dir))
+
+    def write(self, step: int, metrics: Dict[str, float]) -> None:
+        for name, value in metrics.items():
+            self._writer.add_scalar(name, value, step)
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class WandbSink(MetricSink):
+    """Logs metrics to wandb, steps already logged in the resumed run are
+    skipped.
+
+    Parameters
+    ----------
+    df_logger : DFLogger
+        logger of the run which keeps track of the last wandb step
+    """
+
+    def __init__(self, df_logger) -> None:
+        self._df_logger = df_logger
+
+    def write(self, step: int, metrics: Dict[str, float]) -> None:
+        import wandb
+        self._df_logger.update_wandb_last_step(step)
+        if step > self._df_logger.wandb_last_step:
+            wandb.log(data=metrics, step=step)
+
+
+class MetricsLogger:
+    """Accumulates meters on the device and writes their averages to the
+    sinks every `sync_frequency` steps.
+
+    Parameters
+    ----------
+    sinks : List[MetricSink]
+        where reduced metrics are written
+    sync_frequency : int, optional
+        how often meters are synced with the CPU and logged, by default 100
+    """
+
+    def __init__(
+        self,
+        sinks: List[MetricSink],
+        sync_frequency: int = 100,
+    ) -> None:
+        self._sinks = sinks
+        self._sync_freq = max(1, sync_frequency)
+        self._sums: Dict[str, MeterValue] = {}
+        self._counts: Dict[str, int] = {}
+        self._last: Dict[str, float] = {}
+        self._q = Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='metrics_writer',
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def last(self) -> Dict[str, float]:
+        """Meter averages from the latest sync."""
+        return self._last
+
+    def register(self, names: Sequence[str]) -> None:
+        for name in names:
+            self._sums.setdefault(name, 0.)
+            self._counts.setdefault(name, 0)
+            self._last.setdefault(name, 0.)
+
+    def update(self, name: str, value: MeterValue) -> None:
+        """Adds value to the meter without synchronizing the device.
+
+        Parameters
+        ----------
+        name : str
+            registered meter name
+        value : MeterValue
+            scalar tensor or number
+        """
+        if name not in self._sums:
+            raise Exception(f'meter: {name} not registered')
+        if isinstance(value, torch.Tensor):
+            # fp32 accumulation, losses can come from the autocast region
+            value = value.detach().float()
+        self._sums[name] = self._sums[name] + value
+        self._counts[name] += 1
+
+    def step(self, step: int, force: bool = False) -> None:
+        """Syncs and logs meters if this is the sync step.
+
+        Parameters
+        ----------
+        step : int
+            current step, counted from 0
+        force : bool, optional
+            sync regardless of the step, by default False
+        """
+        if not force and (step + 1) % self._sync_freq != 0:
+            return
+        names = [n for n, c in self._counts.items() if c > 0]
+        if not names:
+            return
+        means = [self._sums[n] / self._counts[n] for n in names]
+        tensors = [m for m in means if isinstance(m, torch.Tensor)]
+        if tensors:
+            # single device to host transfer for all meters
+            values = iter(torch.stack(tensors).cpu().tolist())
+            means = [
+                next(values) if isinstance(m, torch.Tensor) else float(m)
+                for m in means
+            ]
+        metrics = dict(zip(names, means))
+        self._last.update(metrics)
+        for n in names:
+            self._sums[n] = 0.
+            self._counts[n] = 0
+        self._q.put((step + 1, metrics))
+
+    def _run(self) -> None:
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            step, metrics = item
+            for sink in self._sinks:
+                try:
+                    sink.write(step, metrics)
+                except Exception as e:
+                    logger.warning(
+                        f'{type(sink).__name__} failed to write metrics: {e}.'
+                    )
+
+    def close(self, step: Optional[int] = None) -> None:
+        """Logs remaining meters, waits for the writes and closes sinks.
+
+        Parameters
+        ----------
+        step : Optional[int], optional
+            last step, if provided, meters accumulated since the last sync
+            are logged, by default None
+        """
+        if step is not None:
+            self.step(step, force=True)
+        self._q.put(None)
+        self._thread.join()
+        for sink in self._sinks:
+            sink.close()
@@ -150,6 +150,7 @@ class JOB_TYPE(Enum):
     NEXT_ELEMENT = 'next_element'
     NO_JOB = 'no_job'
     LANDMARK_ALIGNMENT = 'landmark_alignment'
+    FACE_ALIGNMENT = 'face_alignment'
     LANDMARK_EXTRACTION = 'landmark_extraction'
     CROPPING_FACES = 'cropping_faces'
     GENERATE_MRI_DATASET = 'generate_mri_dataset'
@@ -193,6 +194,12 @@ class DEVICE(Enum):
     CUDA = 'cuda'
 
 
+class PRECISION(Enum):
+    FP32 = 'fp32'
+    FP16 = 'fp16'
+    BF16 = 'bf16'
+
+
 class BODY_KEY(Enum):
     IO_OPERATION_TYPE = 'io_operation_type'
     INPUT_DATA_DIRECTORY = 'input_data_directory'
@@ -224,6 +231,7 @@ class BODY_KEY(Enum):
     EVERY_N_TH_FRAME = 'every_n_th_frame'
     JOB_NAME = 'job_name'
     ETA = 'eta'
+    STAGE_TIMINGS = 'stage_timings'
 
 
 class MODEL(Enum):
@@ -249,6 +257,7 @@ class INDEX_TYPE(Enum):
 
 class IMAGE_SORT(Enum):
     IMAGE_HASH = 'image_hash'
+    IMAGE_HASH_DEDUPLICATION = 'image_hash_deduplication'
 
 
 class NUMBER_TYPE(Enum):
@@ -261,6 +270,11 @@ class MASK_DIM(Enum):
     THREE = 3
 
 
+class BLEND(Enum):
+    SEAMLESS = 'seamless'
+    FEATHER = 'feather'
+
+
 class LAYOUT(Enum):
     VERTICAL = 'vertical'
     HORIZONTAL = 'horizontal'
@@ -290,6 +304,7 @@ class JOB_NAME(Enum):
     FRAMES_EXTRACTION = 'extracting frames'
     LOADING = 'loading'
     ALIGNING_LANDMARKS = 'aligning landmarks'
+    ALIGNING_FACES = 'aligning faces'
     TRAIN_DF_DETECTOR = 'training df detector'
     IMAGE_SCRAPING = 'scraping images'
     FACE_EXTRACTION = 'extracting faces'
@@ -334,6 +349,12 @@ class OUTPUT_KEYS(Enum):
     PREDICTION = 'prediction'
 
 
+class PROFILER(Enum):
+    NONE = 'none'
+    CPROFILE = 'cprofile'
+    TORCH = 'torch'
+
+
 class FREQUENCY_UNIT(Enum):
     STEP = 'step'
     EPOCH = 'epoch'
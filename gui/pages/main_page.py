@@ -1,6 +1,6 @@
 import logging
 from queue import LifoQueue
-from typing import Dict
+from typing import Dict, List
 
 import PyQt6.QtGui as qtg
 import PyQt6.QtCore as qtc
@@ -19,7 +19,7 @@ from enums import (
     WORKER_THREAD,
     WIDGET,
 )
-from gui.widgets.console import Console
+from gui.widgets.console import Console, append_lines
 from gui.pages.detect_deepfake_page.detect_deepfake_page import \
     DetectDeepFakePage
 from gui.widgets.common import (
@@ -36,6 +36,7 @@ from gui.pages.start_page import StartPage
 from gui.templates.main_page import Ui_main_page
 from gui.workers.threads.message_worker_thread import MessageWorkerThread
 from message.message import Message
+from utils import format_stage_timings
 from variables import START_PAGE_NAME
 from variables import ETA_FORMAT, MRI_GAN_CONFIG_PATH
 
@@ -122,6 +123,9 @@ class MainPage(qwt.QMainWindow, Ui_main_page):
     def terminate_threads(self):
         """Closes running threads gracefully before exiting application.
         """
+        for page in self.m_pages.values():
+            if isinstance(page, Page):
+                page.stop()
         for k, thread in self._threads.items():
             thread.quit()
             thread.wait()
@@ -132,6 +136,10 @@ class MainPage(qwt.QMainWindow, Ui_main_page):
     def init_console(self):
         font = qtg.QFont(APP_CONFIG.app.gui.widgets.console.font_name)
         self.console.setFont(font)
+        # oldest lines are removed once the limit is reached
+        self.console.document().setMaximumBlockCount(
+            APP_CONFIG.app.gui.widgets.console.max_lines
+        )
         self.show_console(False)
         p = self.console.viewport().palette()
         p.setColor(self.console.viewport().backgroundRole(),
@@ -381,6 +389,7 @@ class MainPage(qwt.QMainWindow, Ui_main_page):
         self.app_status_label_sig.emit(APP_STATUS.NO_JOB.value)
         self.job_progress_value = 0
         self.eta_label.setText('')
+        self.eta_label.setToolTip('')
 
     @qtc.pyqtSlot(Message)
     def job_progress(self, msg: Message):
@@ -393,6 +402,9 @@ class MainPage(qwt.QMainWindow, Ui_main_page):
         eta = msg.body.data.get(BODY_KEY.ETA, None)
         if eta is not None:
             self.eta_label.setText(ETA_FORMAT.format(eta))
+        stage_timings = msg.body.data.get(BODY_KEY.STAGE_TIMINGS, None)
+        if stage_timings:
+            self.eta_label.setToolTip(format_stage_timings(stage_timings))
 
         if msg.body.finished:
             self._finish_job()
@@ -409,9 +421,9 @@ class MainPage(qwt.QMainWindow, Ui_main_page):
     def show_toolbar(self, show: bool):
         self.show_widget(self.toolbar, show)
 
-    @qtc.pyqtSlot(str)
-    def _console_print(self, msg: str):
-        self.console.append(msg)
+    @qtc.pyqtSlot(list)
+    def _console_print(self, lines: List[str]):
+        append_lines(self.console, lines)
 
     @qtc.pyqtSlot(str)
     def goto(self, name: str, add_to_nav: bool = True):
@@ -89,12 +89,15 @@ class MakeDeepfakePage(Page):
                 SIGNAL_OWNER.MESSAGE_WORKER
             ]
         }
-        inference_tab = InferenceTab(inference_tab_signals)
-        self.tab_wgt.addTab(inference_tab, 'Inference')
+        self.inference_tab = InferenceTab(inference_tab_signals)
+        self.tab_wgt.addTab(self.inference_tab, 'Inference')
         self.tab_wgt.setCurrentIndex(ind)
         layout.addWidget(self.tab_wgt)
         self.setLayout(layout)
 
+    def stop(self) -> None:
+        self.inference_tab.stop()
+
     def add_signals(self):
         msg = Message(
             MESSAGE_TYPE.REQUEST,
@@ -9,6 +9,7 @@ import PyQt6.QtWidgets as qwt
 from configs.app_config import APP_CONFIG
 from core.dictionary import Dictionary
 from core.worker import Worker
+from core.worker.face_alignment_worker import FaceAlignmentWorker
 from core.worker.face_extraction_worker import FaceExtractionWorker
 from enums import (
     BODY_KEY,
@@ -43,6 +44,7 @@ class DetectionAlgorithmTab(BaseWidget):
     input_picture_added_sig = qtc.pyqtSignal()
     output_picture_added_sig = qtc.pyqtSignal()
     stop_face_extraction_sig = qtc.pyqtSignal()
+    stop_face_alignment_sig = qtc.pyqtSignal()
 
     def __init__(
         self,
@@ -64,6 +66,8 @@ class DetectionAlgorithmTab(BaseWidget):
         self._landmarks = None
         self._alignments = None
         self._face_extraction_in_progress = False
+        self._aligned_face_size = 256
+        self._face_alignment_in_progress = False
 
         self.init_ui()
         self.add_signals()
@@ -143,6 +147,17 @@ class DetectionAlgorithmTab(BaseWidget):
         sort_gb_layout.addWidget(image_hash_rbtn)
         sort_bg.addButton(image_hash_rbtn)
 
+        image_hash_dedup_rbtn = qwt.QRadioButton(
+            text='deduplicate',
+            parent=sort_gb,
+        )
+        image_hash_dedup_rbtn.setToolTip(
+            'Keeps one face from every group of faces with similar ' +
+            'image hashes.'
+        )
+        sort_gb_layout.addWidget(image_hash_dedup_rbtn)
+        sort_bg.addButton(image_hash_dedup_rbtn)
+
         # some_other_rbtn = qwt.QRadioButton(text='some other', parent=sort_gb)
         # sort_gb_layout.addWidget(some_other_rbtn)
         # sort_bg.addButton(some_other_rbtn)
@@ -198,6 +213,25 @@ class DetectionAlgorithmTab(BaseWidget):
 
         left_part_layout.addWidget(button_row_wgt)
 
+        align_row_wgt = qwt.QWidget()
+        align_row_wgt_layout = qwt.QHBoxLayout()
+        align_row_wgt_layout.setContentsMargins(0, 0, 0, 0)
+        align_row_wgt.setLayout(align_row_wgt_layout)
+        align_row_wgt_layout.addWidget(qwt.QLabel(text='face size'))
+        self.face_size_edit = qwt.QLineEdit()
+        self.face_size_edit.setText(str(self._aligned_face_size))
+        align_row_wgt_layout.addWidget(self.face_size_edit)
+        self._face_alignment_btn = Button(text='export aligned')
+        self._face_alignment_btn.setToolTip(
+            'Exports aligned faces of the selected metadata directory ' +
+            'as images.'
+        )
+        # alignments.json has to be present in the selected directory
+        self.enable_widget(self._face_alignment_btn, False)
+        self._face_alignment_btn.clicked.connect(self._face_alignment)
+        align_row_wgt_layout.addWidget(self._face_alignment_btn)
+        left_part_layout.addWidget(align_row_wgt)
+
         size_policy = qwt.QSizePolicy(
             qwt.QSizePolicy.Policy.Fixed,
             qwt.QSizePolicy.Policy.Minimum,
@@ -316,7 +350,7 @@ class DetectionAlgorithmTab(BaseWidget):
                 f'{NUMBER_TYPE.INT.value}. Sorting will not be done.'
             )
             return
-        self.image_viewer_sorter.sort_sig.emit(eps)
+        self.image_viewer_sorter.sort(self.image_sort_method, eps)
 
     @qtc.pyqtSlot(int)
     def algorithm_selected(self, id: int) -> None:
@@ -342,6 +376,10 @@ class DetectionAlgorithmTab(BaseWidget):
         if id == -2:
             self.image_sort_method = IMAGE_SORT.IMAGE_HASH
             self.sort_method_wgt.setCurrentWidget(self.image_hash_method)
+        elif id == -3:
+            # deduplication uses same parameters as image hash sorting
+            self.image_sort_method = IMAGE_SORT.IMAGE_HASH_DEDUPLICATION
+            self.sort_method_wgt.setCurrentWidget(self.image_hash_method)
         # elif id == -3:
         #     # some other
         #     self.sort_method_wgt.setCurrentWidget(self.some_other_method)
@@ -404,6 +442,10 @@ class DetectionAlgorithmTab(BaseWidget):
             )
             self._alignments = Dictionary.load(self._alignments_dir)
             logger.debug('Alignments file loaded.')
+        self.enable_widget(
+            self._face_alignment_btn,
+            self._alignments_file_present,
+        )
 
     def _stop_face_extraction(self) -> None:
         """Sends signal to the face extraction worker to stop.
@@ -473,3 +515,70 @@ class DetectionAlgorithmTab(BaseWidget):
         self._face_extraction_btn.setIcon(PlayIcon())
         self._face_extraction_btn.setText('start extraction')
         self._face_extraction_in_progress = False
+
+    def _face_alignment(self) -> None:
+        """Starts or stops export of the aligned faces of the selected
+        metadata directory.
+        """
+        if self._face_alignment_in_progress:
+            logger.info('Requested stop of the face alignment, please wait...')
+            self.enable_widget(self._face_alignment_btn, False)
+            self.stop_face_alignment_sig.emit()
+            return
+
+        face_size = parse_number(self.face_size_edit.text())
+        if face_size is None or face_size <= 0:
+            logger.warning(
+                f'Unable to parse: "{self.face_size_edit.text()}" to ' +
+                'face size. Aligned faces will not be exported.'
+            )
+            return
+
+        thread = qtc.QThread()
+        worker = FaceAlignmentWorker(
+            self._input_dir,
+            face_size,
+            message_worker_sig=self.signals[SIGNAL_OWNER.MESSAGE_WORKER],
+        )
+        self.stop_face_alignment_sig.connect(
+            lambda: worker.conn_q.put(CONNECTION.STOP)
+        )
+        worker.moveToThread(thread)
+        self._threads[JOB_TYPE.FACE_ALIGNMENT] = (thread, worker)
+        thread.started.connect(worker.run)
+        worker.started.connect(self._on_face_alignment_worker_started)
+        worker.running.connect(self._on_face_alignment_worker_running)
+        worker.finished.connect(self._on_face_alignment_worker_finished)
+        thread.start()
+
+    @qtc.pyqtSlot()
+    def _on_face_alignment_worker_started(self) -> None:
+        """Disables button for exporting aligned faces while the worker
+        starts.
+        """
+        self.enable_widget(self._face_alignment_btn, False)
+        self._face_alignment_in_progress = True
+
+    @qtc.pyqtSlot()
+    def _on_face_alignment_worker_running(self) -> None:
+        """Turns export button into the stop button once worker starts
+        executing job.
+        """
+        self.enable_widget(self._face_alignment_btn, True)
+        self._face_alignment_btn.setIcon(StopIcon())
+        self._face_alignment_btn.setText('stop export')
+
+    @qtc.pyqtSlot()
+    def _on_face_alignment_worker_finished(self) -> None:
+        """Once worker finished, button is changed back to default and
+        thread is closed gracefully.
+        """
+        val = self._threads.pop(JOB_TYPE.FACE_ALIGNMENT, None)
+        if val is not None:
+            thread, _ = val
+            thread.quit()
+            thread.wait()
+        self.enable_widget(self._face_alignment_btn, True)
+        self._face_alignment_btn.setIcon(PlayIcon())
+        self._face_alignment_btn.setText('export aligned')
+        self._face_alignment_in_progress = False
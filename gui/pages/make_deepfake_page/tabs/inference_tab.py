@@ -2,9 +2,9 @@ import logging
 from pathlib import Path
 from typing import Dict, Optional
 
+import numpy as np
 import PyQt6.QtCore as qtc
 import PyQt6.QtWidgets as qwt
-import torch
 
 from configs.app_config import APP_CONFIG
 from core.image.image import Image
@@ -24,19 +24,15 @@ class InferenceTab(BaseWidget):
         signals: Optional[Dict[SIGNAL_OWNER, qtc.pyqtSignal]] = dict(),
     ):
         super().__init__(signals)
-        # self._start_inference_thread()
+        # worker thread is started when the worker is first needed
+        self._inference_worker = None
+        self._inference_thread = None
         self._widgets_to_disable_on_inference = []
         self._threads = []
         self._last_model_folder = None
         self._last_image_folder = None
         self._image_path = None
-        # self._inference_worker.inference_result.connect(self._inference_result)
-        # self._inference_worker.inference_started.connect(
-        #     self._on_inference_start
-        # )
-        # self._inference_worker.inference_finished.connect(
-        #     self._on_inference_finished
-        # )
+        self._video_source = None
         self._init_ui()
 
     def _init_ui(self):
@@ -64,6 +60,18 @@ class InferenceTab(BaseWidget):
         image_gb_layout.addWidget(image_select_btn)
         image_select_btn.clicked.connect(self._load_image)
 
+        video_gb = qwt.QGroupBox()
+        self._widgets_to_disable_on_inference.append(video_gb)
+        left_part.layout().addWidget(video_gb)
+        video_gb.setTitle('Video or folder selection')
+        video_gb_layout = qwt.QHBoxLayout(video_gb)
+        video_select_btn = qwt.QPushButton(text='video')
+        video_gb_layout.addWidget(video_select_btn)
+        video_select_btn.clicked.connect(self._select_video)
+        folder_select_btn = qwt.QPushButton(text='folder')
+        video_gb_layout.addWidget(folder_select_btn)
+        folder_select_btn.clicked.connect(self._select_folder)
+
         algorithm_gb = qwt.QGroupBox(
             title='Available face detection algorithms'
         )
@@ -106,6 +114,20 @@ class InferenceTab(BaseWidget):
         start_btn.clicked.connect(self._start_inference)
         left_part.layout().addWidget(start_btn)
 
+        start_video_btn = qwt.QPushButton(text='start video')
+        self._widgets_to_disable_on_inference.append(start_video_btn)
+        start_video_btn.clicked.connect(self._start_video_inference)
+        left_part.layout().addWidget(start_video_btn)
+
+        stop_video_btn = qwt.QPushButton(text='stop video')
+        stop_video_btn.clicked.connect(self._stop_video_inference)
+        left_part.layout().addWidget(stop_video_btn)
+
+        self.video_progressbar = qwt.QProgressBar()
+        self.video_progressbar.setMinimum(0)
+        self.video_progressbar.setFormat(' %v/%m (%p%)')
+        left_part.layout().addWidget(self.video_progressbar)
+
         right_part = VWidget()
         layout.addWidget(right_part)
 
@@ -127,14 +149,47 @@ class InferenceTab(BaseWidget):
         if self._image_path is None:
             return
         image = Image.load(self._image_path)
-        self._inference_worker.image_sig.emit(image)
+        self._get_inference_worker().image_sig.emit(image)
+
+    @qtc.pyqtSlot()
+    def _start_video_inference(self) -> None:
+        if self._video_source is None:
+            return
+        source = Path(self._video_source)
+        output_path = source.parent / f'{source.stem}_swapped.mp4'
+        self.video_progressbar.reset()
+        self._get_inference_worker().video_sig.emit(
+            str(source),
+            str(output_path),
+        )
+
+    @qtc.pyqtSlot()
+    def _stop_video_inference(self) -> None:
+        if self._inference_worker is not None:
+            self._inference_worker.stop()
+
+    @qtc.pyqtSlot(int, int)
+    def _video_progress(self, written: int, total: int) -> None:
+        # total is 0 if the number of frames is unknown
+        self.video_progressbar.setMaximum(max(total, written))
+        self.video_progressbar.setValue(written)
+
+    def stop(self) -> None:
+        """Stops the video swapping and the inference thread before the
+        application exits.
+        """
+        if self._inference_thread is None:
+            return
+        self._inference_worker.stop()
+        self._inference_thread.quit()
+        self._inference_thread.wait()
 
-    @qtc.pyqtSlot(torch.Tensor, torch.Tensor, torch.Tensor)
+    @qtc.pyqtSlot(np.ndarray, np.ndarray, np.ndarray)
     def _inference_result(
         self,
-        input_image: torch.Tensor,
-        predicted_image: torch.Tensor,
-        clone: torch.Tensor,
+        input_image: np.ndarray,
+        predicted_image: np.ndarray,
+        clone: np.ndarray,
     ) -> None:
         self.preview.refresh_data_sig.emit(
             [
@@ -148,7 +203,7 @@ class InferenceTab(BaseWidget):
     def _face_detection_algorithm_changed(self) -> None:
         sender = self.sender()
         if sender.isChecked():
-            self._inference_worker.algorithm_sig.emit(
+            self._get_inference_worker().algorithm_sig.emit(
                 FACE_DETECTION_ALGORITHM[sender.text().upper()]
             )
 
@@ -156,14 +211,27 @@ class InferenceTab(BaseWidget):
     def _device_changed(self) -> None:
         sender = self.sender()
         if sender.isChecked():
-            self._inference_worker.device_sig.emit(
+            self._get_inference_worker().device_sig.emit(
                 DEVICE[sender.text().upper()]
             )
 
+    def _get_inference_worker(self) -> InferenceWorker:
+        if self._inference_worker is None:
+            self._start_inference_thread()
+        return self._inference_worker
+
     def _start_inference_thread(self) -> None:
         self._inference_worker = InferenceWorker()
         self._inference_thread = qtc.QThread()
         self._inference_worker.moveToThread(self._inference_thread)
+        self._inference_worker.inference_result.connect(self._inference_result)
+        self._inference_worker.inference_started.connect(
+            self._on_inference_start
+        )
+        self._inference_worker.inference_finished.connect(
+            self._on_inference_finished
+        )
+        self._inference_worker.video_progress.connect(self._video_progress)
         self._inference_thread.start()
 
     def _load_model(self) -> None:
@@ -179,7 +247,7 @@ class InferenceTab(BaseWidget):
 
         logger.debug(f'Selected model path: {model_path}.')
         self._last_model_folder = str(Path(model_path).parent.absolute())
-        self._inference_worker.model_sig.emit(model_path)
+        self._get_inference_worker().model_sig.emit(model_path)
 
     def _load_image(self) -> None:
         image_path, _ = qwt.QFileDialog.getOpenFileName(
@@ -194,3 +262,30 @@ class InferenceTab(BaseWidget):
         logger.debug(f'Selected image: {image_path}')
         self._last_image_folder = str(Path(image_path).parent.absolute())
         self._image_path = image_path
+
+    def _select_video(self) -> None:
+        video_path, _ = qwt.QFileDialog.getOpenFileName(
+            self, 'Select video file', self._last_image_folder
+            if self._last_image_folder is not None else './',
+            'Video files (*.mp4)',
+        )
+        if not video_path:
+            logger.warning('No video was selected.')
+            return
+
+        logger.debug(f'Selected video: {video_path}')
+        self._last_image_folder = str(Path(video_path).parent.absolute())
+        self._video_source = video_path
+
+    def _select_folder(self) -> None:
+        folder = qwt.QFileDialog.getExistingDirectory(
+            self, 'Select folder with frames', self._last_image_folder
+            if self._last_image_folder is not None else './',
+        )
+        if not folder:
+            logger.warning('No folder was selected.')
+            return
+
+        logger.debug(f'Selected folder with frames: {folder}')
+        self._last_image_folder = folder
+        self._video_source = folder
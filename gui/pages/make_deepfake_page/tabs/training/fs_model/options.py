@@ -6,13 +6,14 @@ import PyQt6.QtCore as qtc
 import PyQt6.QtWidgets as qwt
 
 from core.model.fs import FS
-from enums import FREQUENCY_UNIT, WIDGET_TYPE
+from enums import DEVICE, FREQUENCY_UNIT, WIDGET_TYPE
 from gui.pages.make_deepfake_page.tabs.training.widgets import (
     LoggingConfig,
     SelectDirRow,
 )
 from gui.widgets.base_widget import BaseWidget
 from gui.widgets.common import (
+    DeviceRow,
     GroupBox,
     HWidget,
     InfoIconButton,
@@ -77,6 +78,9 @@ class Options(BaseWidget):
         )
         train_options_gb.layout().addWidget(self._use_cudnn_bench)
 
+        self._device_row = DeviceRow()
+        train_options_gb.layout().addWidget(self._device_row)
+
         model_gb = GroupBox('Model options')
         layout.addWidget(model_gb)
 
@@ -161,6 +165,10 @@ class Options(BaseWidget):
     def lambda_rec(self) -> float:
         return float(self._lambda_rec.value)
 
+    @property
+    def device(self) -> DEVICE:
+        return self._device_row.device
+
     @property
     def use_cudnn(self) -> bool:
         return str_to_bool(self._use_cudnn_bench.value)
@@ -796,6 +796,7 @@ class TrainingTab(BaseWidget):
                 checkpoint_frequency=self._fs_options.checkpoint_frequency,
                 resume=self._fs_options.resume,
                 resume_run_name=self._fs_options.resume_run_name,
+                device=self._fs_options.device,
                 message_worker_sig=self.signals[SIGNAL_OWNER.MESSAGE_WORKER],
             )
             self.stop_training_sig.connect(lambda: worker.stop())
@@ -43,3 +43,8 @@ class Page(BaseWidget):
 
     def goto(self, name):
         self.goto_sig.emit(name)
+
+    def stop(self) -> None:
+        """Stops background work of the page before the application exits.
+        """
+        pass
@@ -1,6 +1,14 @@
 from __future__ import annotations
 
+from collections import deque
+from dataclasses import dataclass
+import threading
+import time
+from typing import Deque, List
+
 import PyQt6.QtCore as qtc
+import PyQt6.QtGui as qtg
+import PyQt6.QtWidgets as qwt
 
 from configs.app_config import APP_CONFIG
 from enums import (
@@ -13,14 +21,32 @@ console_message_template = '<span style="font-size:{}pt; ' + \
     'color:{}; white-space:pre;">{}<span>'
 
 
+@dataclass
+class _Record:
+    date: str
+    name: str
+    source_type: str
+    level: LEVEL
+    msg: str
+
+    def same_message(self, other: _Record) -> bool:
+        return self.msg == other.msg and self.name == other.name and \
+            self.level == other.level
+
+
 class Console(qtc.QObject):
     """Class used for printing to console in gui. Messages are formatted based
     on the type of the `LEVEL`.
+
+    Records are buffered and flushed by the background thread every
+    `flush_interval_ms` milliseconds as one chunk of lines, so logging from
+    many workers doesn't flood the Qt event loop. Consecutive repeated
+    messages are collapsed into one line and if more than `max_lines`
+    records arrive between two flushes, only the newest ones are kept.
     """
 
     __instance = None
-    _int_print_sig = qtc.pyqtSignal(str, str, str, LEVEL, str)
-    print_sig = qtc.pyqtSignal(str)
+    print_sig = qtc.pyqtSignal(list)
 
     def __init__(self) -> None:
         if Console.__instance is not None:
@@ -28,7 +54,19 @@ class Console(qtc.QObject):
         else:
             super().__init__()
             Console.__instance = self
-            self._int_print_sig.connect(self._print)
+            conf = APP_CONFIG.app.gui.widgets.console
+            self._flush_interval = conf.flush_interval_ms / 1000
+            self._records: Deque[_Record] = deque(maxlen=conf.max_lines)
+            self._lock = threading.Lock()
+            self._dropped = 0
+            self._received = 0
+            self._flushed = 0
+            self._thread = threading.Thread(
+                target=self._run,
+                name='console_flusher',
+                daemon=True,
+            )
+            self._thread.start()
 
     @staticmethod
     def get_instance() -> Console:
@@ -36,6 +74,16 @@ class Console(qtc.QObject):
             Console()
         return Console.__instance
 
+    @property
+    def received(self) -> int:
+        """Number of records received so far."""
+        return self._received
+
+    @property
+    def flushed(self) -> int:
+        """Number of records flushed so far, including dropped ones."""
+        return self._flushed
+
     @staticmethod
     def print(
             date: str,
@@ -44,30 +92,66 @@ class Console(qtc.QObject):
             level: LEVEL,
             msg: str,
     ) -> None:
-        Console.get_instance()._int_print_sig.emit(
-            date,
-            name,
-            source_type,
-            level,
-            msg,
+        Console.get_instance()._put(
+            _Record(date, name, source_type, level, msg)
         )
 
-    @qtc.pyqtSlot(str, str, str, LEVEL, str)
-    def _print(
-        self,
-        date: str,
-        name: str,
-        source_type: str,
-        level: LEVEL,
-        msg: str,
-    ) -> None:
-        prefix = self._get_prefix(date, name, source_type, level)
+    def _put(self, record: _Record) -> None:
+        with self._lock:
+            if len(self._records) == self._records.maxlen:
+                # oldest record is pushed out of the ring buffer
+                self._dropped += 1
+            self._records.append(record)
+            self._received += 1
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Sends all buffered records to the gui as one chunk of lines."""
+        with self._lock:
+            if not self._records:
+                return
+            records = list(self._records)
+            self._records.clear()
+            dropped, self._dropped = self._dropped, 0
+        lines = []
+        if dropped:
+            lines.append(self._format(_Record(
+                records[0].date,
+                Console.__name__,
+                'widget',
+                LEVEL.WARNING,
+                f'{dropped} messages skipped',
+            )))
+        last, count = records[0], 0
+        for record in records:
+            if record.same_message(last):
+                count += 1
+                continue
+            lines.append(self._format(last, count))
+            last, count = record, 1
+        lines.append(self._format(last, count))
+        self.print_sig.emit(lines)
+        with self._lock:
+            self._flushed += len(records) + dropped
+
+    def _format(self, record: _Record, count: int = 1) -> str:
+        prefix = self._get_prefix(
+            record.date,
+            record.name,
+            record.source_type,
+            record.level,
+        )
+        msg = record.msg if count == 1 else f'{record.msg} (x{count})'
         msg = console_message_template.format(
             APP_CONFIG.app.gui.widgets.console.text_size,
             COLOR.WHITE.value,
             msg
         )
-        self.print_sig.emit(prefix + msg)
+        return prefix + msg
 
     @staticmethod
     def _get_prefix(
@@ -82,3 +166,27 @@ class Console(qtc.QObject):
             f'[{date}] - [{source_type}] - {name} - {level.value} - '
         )
         return prefix
+
+
+def append_lines(text_edit: qwt.QTextEdit, lines: List[str]) -> None:
+    """Appends chunk of lines to the console widget in one edit, every line
+    is separate block so the maximum block count of the document limits
+    number of rendered lines.
+
+    Args:
+        text_edit (qwt.QTextEdit): console widget
+        lines (List[str]): lines formatted by the `Console`
+    """
+    document = text_edit.document()
+    scroll_bar = text_edit.verticalScrollBar()
+    at_bottom = scroll_bar.value() == scroll_bar.maximum()
+    cursor = qtg.QTextCursor(document)
+    cursor.movePosition(qtg.QTextCursor.MoveOperation.End)
+    cursor.beginEditBlock()
+    for i, line in enumerate(lines):
+        if i > 0 or not document.isEmpty():
+            cursor.insertBlock()
+        cursor.insertHtml(line)
+    cursor.endEditBlock()
+    if at_bottom:
+        scroll_bar.setValue(scroll_bar.maximum())
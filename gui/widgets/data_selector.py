@@ -180,7 +180,7 @@ class DataSelector(BaseWidget):
 
         self.preview_widget.setCurrentWidget(self.picture_viewer)
 
-        image_paths = get_file_paths_from_dir(directory)
+        image_paths = get_file_paths_from_dir(directory, use_cache=True)
         if len(image_paths) == 0:
             logger.warning(
                 f'No supported pictures were found in: {directory}.'
@@ -1,3 +1,4 @@
+import functools
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
@@ -9,6 +10,7 @@ import PyQt6.QtWidgets as qwt
 
 from core.face import Face
 from core.face_alignment.face_aligner import FaceAligner
+from core.thumbnail_cache import Thumbnail, ThumbnailCache
 from common_structures import DialogMessages
 from enums import (
     BODY_KEY,
@@ -29,6 +31,11 @@ from utils import np_array_to_qicon
 
 DEFAULT_ROLE = qtc.Qt.ItemDataRole.UserRole + 1
 
+# how many thumbnails loader emits at once
+LOADER_CHUNK_SIZE = 256
+# how many pages before and after the current one are prefetched
+PREFETCH_PAGES = 2
+
 
 class LoaderWorker(qtc.QObject):
 
@@ -39,24 +46,43 @@ class LoaderWorker(qtc.QObject):
         data_paths: List[Path],
         data_sig: qtc.pyqtSignal,
         message_worker_sig: qtc.pyqtSignal,
+        thumbnail_cache: ThumbnailCache,
+        chunk_size: int = LOADER_CHUNK_SIZE,
     ):
+        """Loads thumbnails of the faces from the `data_paths` and emits them
+        in chunks. Thumbnails are read from the cache and only faces missing
+        from the cache are decoded and aligned.
+
+        Args:
+            data_paths (List[Path]): paths of the face metadata files
+            data_sig (qtc.pyqtSignal): signal where thumbnails are emitted
+            message_worker_sig (qtc.pyqtSignal): message worker signal
+            thumbnail_cache (ThumbnailCache): cache of the thumbnails
+            chunk_size (int, optional): how many thumbnails are emitted at
+                once. Defaults to LOADER_CHUNK_SIZE.
+        """
         super().__init__()
         self._data_paths = data_paths
         self._data_sig = data_sig
         self._message_worker_sig = message_worker_sig
+        self._thumbnail_cache = thumbnail_cache
+        self._chunk_size = chunk_size
 
     def run(self) -> None:
+        total = len(self._data_paths)
         conf_wgt_msg = Messages.CONFIGURE_WIDGET(
             SIGNAL_OWNER.IMAGE_VIEWER,
             WIDGET.JOB_PROGRESS,
             'setMaximum',
-            [len(self._data_paths)],
+            [total],
             JOB_NAME.LOADING,
         )
         self._message_worker_sig.emit(conf_wgt_msg)
-        for idx, i_p in enumerate(self._data_paths):
-            face = FaceSerializer.load(i_p)
-            self._data_sig.emit([face])
+        for idx in range(0, total, self._chunk_size):
+            chunk = self._data_paths[idx:idx + self._chunk_size]
+            thumbnails, _ = self._thumbnail_cache.load(chunk)
+            self._data_sig.emit(thumbnails)
+            part = min(idx + self._chunk_size, total)
             job_prog_msg = Message(
                 MESSAGE_TYPE.ANSWER,
                 MESSAGE_STATUS.OK,
@@ -65,17 +91,55 @@ class LoaderWorker(qtc.QObject):
                 Body(
                     JOB_TYPE.IO_OPERATION,
                     {
-                        BODY_KEY.PART: idx,
-                        BODY_KEY.TOTAL: len(self._data_paths),
+                        BODY_KEY.PART: part - 1,
+                        BODY_KEY.TOTAL: total,
                         BODY_KEY.JOB_NAME: 'image loading'
                     },
-                    idx == len(self._data_paths) - 1,
+                    part == total,
                 )
             )
             self._message_worker_sig.emit(job_prog_msg)
         self.finished.emit()
 
 
+class PrefetchWorker(qtc.QObject):
+
+    finished = qtc.pyqtSignal()
+
+    def __init__(
+        self,
+        data_paths: List[Path],
+        thumbnail_cache: ThumbnailCache,
+        chunk_size: int = LOADER_CHUNK_SIZE,
+    ):
+        """Fills thumbnail cache in the background so pages next to the
+        currently shown one load from the cache.
+
+        Args:
+            data_paths (List[Path]): paths of the face metadata files
+            thumbnail_cache (ThumbnailCache): cache of the thumbnails
+            chunk_size (int, optional): how many faces are cached at once.
+                Defaults to LOADER_CHUNK_SIZE.
+        """
+        super().__init__()
+        self._data_paths = data_paths
+        self._thumbnail_cache = thumbnail_cache
+        self._chunk_size = chunk_size
+        self._stopped = False
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def run(self) -> None:
+        for idx in range(0, len(self._data_paths), self._chunk_size):
+            if self._stopped:
+                break
+            self._thumbnail_cache.prefetch(
+                self._data_paths[idx:idx + self._chunk_size]
+            )
+        self.finished.emit()
+
+
 @dataclass
 class ImageViewerAction:
     """Class for specifying action for the context menu of the `ImageViewer`
@@ -94,6 +158,7 @@ class StandardItem(qtg.QStandardItem):
     DataRole = DEFAULT_ROLE
     NameRole = qtc.Qt.ItemDataRole.UserRole + 2
     FaceRole = qtc.Qt.ItemDataRole.UserRole + 3
+    PathRole = qtc.Qt.ItemDataRole.UserRole + 4
 
     def __init__(self) -> None:
         """Single item displayed in `ImageViewer`. Serves also as a container
@@ -109,11 +174,16 @@ class StandardItem(qtg.QStandardItem):
         other, these items are fetched and their `Face` objects are extracted
         and then these "filtered" `Face` objects can be saved to desired
         location.
+
+        Items made from thumbnails only know the path of the `Face`
+        metadata, `Face` is loaded from that path the first time it's
+        requested.
         """
         super().__init__()
         self.name = ''
         self.image = ''
         self.face = None
+        self.path = None
 
     def setData(self, value, role: qtc.Qt.ItemDataRole = DEFAULT_ROLE) -> None:
         if role == StandardItem.NameRole:
@@ -122,6 +192,8 @@ class StandardItem(qtg.QStandardItem):
             self.image = value
         elif role == StandardItem.FaceRole:
             self.face = value
+        elif role == StandardItem.PathRole:
+            self.path = value
         else:
             qtg.QStandardItem.setData(self, value, role)
 
@@ -131,7 +203,11 @@ class StandardItem(qtg.QStandardItem):
         elif role == StandardItem.DataRole:
             return self.image
         elif role == StandardItem.FaceRole:
+            if self.face is None and self.path is not None:
+                self.face = FaceSerializer.load(self.path)
             return self.face
+        elif role == StandardItem.PathRole:
+            return self.path
         return qtg.QStandardItem.data(self, role)
 
     def type(self):
@@ -239,6 +315,8 @@ class ImageViewer(BaseWidget):
         self._image_start_idx = 0
         self._current_page = 0
         self._threads = []
+        self._prefetch_threads = []
+        self._thumbnail_cache = ThumbnailCache(size=icon_size[0])
         self._images_loading = False
         self._image_id_counter = 0
         self._context_menu_disabled = disable_context_menu
@@ -417,14 +495,15 @@ class ImageViewer(BaseWidget):
         from the disk.
         """
         # TODO this role may need to be changed in the future
+        # paths are used so faces which were not needed so far don't have to
+        # be loaded just to be deleted
         data = self.get_data_from_selected_indices(
-            StandardItem.FaceRole
+            StandardItem.PathRole
         )
         self.remove_selected()
-        faces: List[Face] = data[1]
-        face_paths = list(map(lambda f: Path(f.path), faces))
+        face_paths = [Path(p) for p in data[1] if p is not None]
         self.removed_image_paths_sig.emit(face_paths)
-        for face in faces:
+        for face_path in face_paths:
             msg = Message(
                 MESSAGE_TYPE.REQUEST,
                 MESSAGE_STATUS.OK,
@@ -434,14 +513,14 @@ class ImageViewer(BaseWidget):
                     JOB_TYPE.IO_OPERATION,
                     data={
                         BODY_KEY.IO_OPERATION_TYPE: IO_OPERATION_TYPE.DELETE,
-                        BODY_KEY.FILE_PATH: face.path,
+                        BODY_KEY.FILE_PATH: face_path,
                     }
                 )
             )
             self.signals[SIGNAL_OWNER.MESSAGE_WORKER].emit(msg)
             # TODO fix issue with removing entry from paths when image is
             # deleted in other image viewer
-            idx = self._data_paths.index(Path(face.path))
+            idx = self._data_paths.index(face_path)
             self._data_paths.pop(idx)
             self._image_start_idx -= 1
         # def remove_fn(remove: bool) -> None:
@@ -518,12 +597,14 @@ class ImageViewer(BaseWidget):
         """
         # remove all data from image viewer
         self.clear()
+        self._stop_prefetch()
         self.images_loading = True
         thread = qtc.QThread()
         worker = LoaderWorker(
             data_paths,
             self.images_added_sig,
             self.signals[SIGNAL_OWNER.MESSAGE_WORKER],
+            self._thumbnail_cache,
         )
         self._threads.append((thread, worker))
         worker.moveToThread(thread)
@@ -553,24 +634,82 @@ class ImageViewer(BaseWidget):
             thread.wait()
         self._threads = []
         self.images_loading = False
+        self._prefetch_neighbouring_pages()
+
+    def _prefetch_neighbouring_pages(self) -> None:
+        """Starts thread in the background which caches thumbnails of the
+        pages around the current one, next pages first.
+        """
+        start = self._image_start_idx
+        per_page = self._images_per_page
+        after = self._data_paths[
+            start + per_page:start + (PREFETCH_PAGES + 1) * per_page
+        ]
+        before = self._data_paths[
+            max(start - PREFETCH_PAGES * per_page, 0):start
+        ]
+        data_paths = [*after, *before[::-1]]
+        if not data_paths:
+            return
+        thread = qtc.QThread()
+        worker = PrefetchWorker(data_paths, self._thumbnail_cache)
+        pair = (thread, worker)
+        self._prefetch_threads.append(pair)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(
+            functools.partial(self._prefetch_finished, pair)
+        )
+        thread.start()
+
+    def _prefetch_finished(self, pair: Tuple[qtc.QThread, PrefetchWorker]):
+        # references are kept until the thread finishes so it isn't
+        # destroyed while running
+        if pair in self._prefetch_threads:
+            self._prefetch_threads.remove(pair)
+
+    def _stop_prefetch(self) -> None:
+        """Stops prefetching so it doesn't compete with loading of the page
+        which is actually shown. Workers only get the stop request and
+        finish after the chunk they are caching, gui thread doesn't wait
+        for them.
+        """
+        for _, worker in self._prefetch_threads:
+            worker.stop()
 
     @qtc.pyqtSlot(list)
-    def _images_added(self, images: List[Union[np.ndarray, Face]]):
+    def _images_added(
+        self,
+        images: List[Union[np.ndarray, Face, Thumbnail]],
+    ):
         """`qtc.pyqtSlot` which triggers when new images in form of an
-        `np.ndarray` or `Face` object are emitted to show in `ImageViewer`.
+        `np.ndarray`, `Face` or `Thumbnail` object are emitted to show in
+        `ImageViewer`.
 
         Parameters
         ----------
-        images : List[Union[np.ndarray, Face]]
-            list of `np.ndarray` images of `Face` faces
+        images : List[Union[np.ndarray, Face, Thumbnail]]
+            list of `np.ndarray` images, `Face` faces or face thumbnails
         """
+        if not images:
+            return
+        items = []
         for image in images:
             item = StandardItem()
-            if isinstance(image, Face):
+            if isinstance(image, Thumbnail):
+                item.setData(image.path, StandardItem.PathRole)
+                item.setData(image.name, StandardItem.NameRole)
+                item.setData(image.image, StandardItem.DataRole)
+            elif isinstance(image, Face):
                 name = image.raw_image.name
                 item.setData(image, StandardItem.FaceRole)
                 item.setData(name, StandardItem.NameRole)
-                FaceAligner.align_face(image, 64)
+                if image.path is not None:
+                    item.setData(Path(image.path), StandardItem.PathRole)
+                FaceAligner.align_face(image, self._thumbnail_cache.size)
                 item.setData(
                     image.aligned_image,
                     StandardItem.DataRole,
@@ -580,16 +719,21 @@ class ImageViewer(BaseWidget):
                 self._image_id_counter += 1
                 item.setData(name, StandardItem.NameRole)
                 item.setData(image, StandardItem.DataRole)
+            items.append(item)
 
-            if self._page_limit:
-                row_count = self.ui_image_viewer.model().rowCount()
-                if row_count >= self._page_limit:
-                    # remove last entry
-                    self.ui_image_viewer.model().removeRow(row_count - 1)
-            # insert face or image on the first position
-            self.ui_image_viewer.model().insertRow(0, item)
-            # update number of images of the ImageViewer
-            self.number_of_images = self.ui_image_viewer.model().rowCount()
+        model = self.ui_image_viewer.model()
+        if self._page_limit:
+            items = items[-self._page_limit:]
+            row_count = model.rowCount()
+            overflow = row_count + len(items) - self._page_limit
+            if overflow > 0:
+                # remove last entries
+                model.removeRows(row_count - overflow, overflow)
+        # every new face or image goes to the first position, so the whole
+        # chunk is inserted at once in the reversed order
+        model.invisibleRootItem().insertRows(0, items[::-1])
+        # update number of images of the ImageViewer
+        self.number_of_images = model.rowCount()
 
     def eventFilter(self, source: qtc.QObject, event: qtc.QEvent) -> bool:
         if source == self.ui_image_viewer.viewport():
@@ -1,4 +1,3 @@
-from operator import itemgetter
 from pathlib import Path
 from typing import Dict, List, Optional
 
@@ -6,8 +5,13 @@ import PyQt6.QtCore as qtc
 import PyQt6.QtWidgets as qwt
 
 from core.face import Face
-from core.sort import sort_faces_by_image_hash
-from enums import SIGNAL_OWNER
+from core.sort import (
+    compute_hashes,
+    deduplicate_hashes,
+    sort_images_by_image_hash,
+)
+from core.thumbnail_cache import Thumbnail
+from enums import IMAGE_SORT, SIGNAL_OWNER
 from gui.widgets.base_widget import BaseWidget
 from gui.widgets.image_viewer.image_viewer import (
     ImageViewer,
@@ -21,6 +25,7 @@ from gui.widgets.image_viewer.image_viewer_with_images_count import \
 class ImageViewerSorter(BaseWidget):
 
     sort_sig = qtc.pyqtSignal(int)
+    deduplicate_sig = qtc.pyqtSignal(int)
     data_paths_sig = qtc.pyqtSignal(list)
 
     def __init__(
@@ -35,6 +40,7 @@ class ImageViewerSorter(BaseWidget):
         super().__init__(signals)
         self._init_ui()
         self.sort_sig.connect(self._sort)
+        self.deduplicate_sig.connect(self._deduplicate)
         self.data_paths_sig.connect(self._data_paths_changed)
 
     def _init_ui(self):
@@ -133,41 +139,87 @@ class ImageViewerSorter(BaseWidget):
         """
         self.image_viewer_images_not_ok.clear()
 
+    def _all_thumbnails(self) -> List[Thumbnail]:
+        """Thumbnails of all faces from both `ImageViewer` widgets, left
+        ones first. Thumbnails are already in the items so no face has to
+        be loaded.
+
+        Returns:
+            List[Thumbnail]: thumbnails of all faces
+        """
+        thumbnails = []
+        for viewer in (
+            self.image_viewer_images_ok,
+            self.image_viewer_images_not_ok,
+        ):
+            paths = viewer.get_all_data(StandardItem.PathRole)
+            names = viewer.get_all_data(StandardItem.NameRole)
+            images = viewer.get_all_data(StandardItem.DataRole)
+            thumbnails.extend(
+                Thumbnail(p, n, i) for p, n, i in zip(paths, names, images)
+            )
+        return thumbnails
+
+    def _show_sorted(
+        self,
+        thumbnails: List[Thumbnail],
+        indices_ok: List[int],
+        indices_not_ok: List[int],
+    ) -> None:
+        """Shows thumbnails on `indices_ok` in the left `ImageViewer` and
+        thumbnails on `indices_not_ok` in the right one.
+        """
+        self.image_viewer_images_ok.clear()
+        self.image_viewer_images_not_ok.clear()
+        if len(indices_ok) > 0:
+            self.image_viewer_images_ok.images_added_sig.emit(
+                [thumbnails[i] for i in indices_ok]
+            )
+        if len(indices_not_ok) > 0:
+            self.image_viewer_images_not_ok.images_added_sig.emit(
+                [thumbnails[i] for i in indices_not_ok]
+            )
+
     @qtc.pyqtSlot(int)
     def _sort(self, eps: int) -> None:
-        """Sorts `Face` metadata objects by some image sorting method.
+        """Sorts `Face` metadata objects by the difference of the image hash
+        to the previously accepted face.
 
         Args:
-            eps (int): [description]
+            eps (int): maximal difference of the image hashes
         """
-        ok_images = self.image_viewer_images_ok.get_all_data(
-            StandardItem.FaceRole
-        )
-        not_ok_images = self.image_viewer_images_not_ok.get_all_data(
-            StandardItem.FaceRole
-        )
-        all_data = [*ok_images, *not_ok_images]
+        thumbnails = self._all_thumbnails()
         # TODO implement other sorting methods and make this more generic
-        indices_ok, indices_not_ok = sort_faces_by_image_hash(
-            all_data,
+        indices_ok, indices_not_ok = sort_images_by_image_hash(
+            [t.image for t in thumbnails],
             eps,
         )
-        self.image_viewer_images_ok.clear()
-        self.image_viewer_images_not_ok.clear()
-        if len(indices_ok) > 0:
-            faces_ok = itemgetter(*indices_ok)(all_data)
-            if not isinstance(faces_ok, tuple):
-                faces_ok = [faces_ok]
-            else:
-                faces_ok = list(faces_ok)
-            self.image_viewer_images_ok.images_added_sig.emit(faces_ok)
-        if len(indices_not_ok) > 0:
-            faces_not_ok = itemgetter(*indices_not_ok)(all_data)
-            if not isinstance(faces_not_ok, tuple):
-                faces_not_ok = [faces_not_ok]
-            else:
-                faces_not_ok = list(faces_not_ok)
-            self.image_viewer_images_not_ok.images_added_sig.emit(faces_not_ok)
+        self._show_sorted(thumbnails, indices_ok, indices_not_ok)
+
+    @qtc.pyqtSlot(int)
+    def _deduplicate(self, eps: int) -> None:
+        """Keeps only one face from every group of the faces whose image
+        hashes are within `eps`, duplicates are moved to the right side.
+
+        Args:
+            eps (int): maximal difference of the image hashes
+        """
+        thumbnails = self._all_thumbnails()
+        hashes = compute_hashes([t.image for t in thumbnails])
+        indices_ok, indices_not_ok = deduplicate_hashes(hashes, eps)
+        self._show_sorted(thumbnails, indices_ok, indices_not_ok)
+
+    def sort(self, method: IMAGE_SORT, eps: int) -> None:
+        """Sorts faces with the selected sorting method.
+
+        Args:
+            method (IMAGE_SORT): sorting method
+            eps (int): maximal difference of the image hashes
+        """
+        if method == IMAGE_SORT.IMAGE_HASH_DEDUPLICATION:
+            self.deduplicate_sig.emit(eps)
+        else:
+            self.sort_sig.emit(eps)
 
     @qtc.pyqtSlot(list)
     def _data_paths_changed(self, data_paths: List[Path]) -> None:
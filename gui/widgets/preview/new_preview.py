@@ -1,107 +1,133 @@
-import sys
-import traceback
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from matplotlib.animation import TimedAnimation
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
+import numpy as np
 import PyQt6.QtCore as qtc
+import PyQt6.QtGui as qtg
 import PyQt6.QtWidgets as qwt
-import torch
 
 from gui.widgets.base_widget import BaseWidget
-from utils import tensor_to_np_image
 
+Cell = Tuple[int, int]
 
-class CustomFigCanvas(FigureCanvasQTAgg, TimedAnimation):
 
-    def __init__(self, columns: List[str], num_of_rows: int):
-        self._new_data: List[torch.Tensor] = []
-        self._columns = columns
-        self.num_of_rows = num_of_rows
-        self.num_of_cols = len(self._columns)
-        fig = Figure(figsize=(5, 5), dpi=100)
-        self.axes = [
-            fig.add_subplot(self.num_of_rows, self.num_of_cols, i + 1)
-            for i in range(self.num_of_rows * self.num_of_cols)
-        ]
-        self._hide_axes()
-        self._refresh_axes_titles()
-
-        FigureCanvasQTAgg.__init__(self, fig)
-        TimedAnimation.__init__(self, fig, interval=200, blit=True)
-
-    def _hide_axes(self):
-        """Hides axes and axe values from every single image displayed.
-        """
-        for axis in self.axes:
-            axis.axes.get_xaxis().set_visible(False)
-            axis.axes.get_yaxis().set_visible(False)
-
-    def new_frame_seq(self):
-        return iter(range(self.num_of_rows))
-
-    def _step(self, *args):
-        try:
-            TimedAnimation._step(self, *args)
-        except Exception:
-            print(traceback.format_exc())
-            TimedAnimation._stop(self)
-            sys.exit(0)
-
-    def _refresh_axes_titles(self):
-        """Sets titles on axes after they have been refreshed.
+class ImageCell(qwt.QWidget):
+    """Cell of the preview grid which paints one image scaled to the cell
+    with kept aspect ratio. Image is painted only when the cell is repainted,
+    e.g. when it gets new image or the widget is resized.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        # array is kept because `QImage` doesn't copy its buffer
+        self._array: Optional[np.ndarray] = None
+        self._image: Optional[qtg.QImage] = None
+        self.setMinimumSize(32, 32)
+        self.setSizePolicy(
+            qwt.QSizePolicy.Policy.Expanding,
+            qwt.QSizePolicy.Policy.Expanding,
+        )
+
+    def set_image(self, image: np.ndarray) -> None:
+        """Shows new image.
+
+        Args:
+            image (np.ndarray): RGB uint8 image of shape (H, W, 3)
         """
-        for i in range(len(self._columns)):
-            self.axes[i].set_title(self._columns[i])
-
-    def _draw_frame(self, framedata):
-        while len(self._new_data) > 0:
-            # get oldest data sent to preview widget
-            images = self._new_data[0]
-            # iterate through every row
-            for row in range(self.num_of_rows):
-                # through every column
-                for col in range(self.num_of_cols):
-                    # get corresponding axe from an array
-                    axe = self.axes[row * self.num_of_cols + col]
-                    try:
-                        # convert tensor from model or model input to "normal"
-                        # image which can be displayed in matplotlib canvas
-                        img = images[col][row]
-                        img_input = tensor_to_np_image(img)
-                        axe.cla()
-                        axe.imshow(img_input, animated=True)
-                    except IndexError:
-                        ...
-            del self._new_data[0]
-
-            self._refresh_axes_titles()
-
-    def add_data(self, data: List[torch.Tensor]):
-        self._new_data.append(data)
+        image = np.ascontiguousarray(image)
+        self._array = image
+        self._image = qtg.QImage(
+            image.data,
+            image.shape[1],
+            image.shape[0],
+            image.strides[0],
+            qtg.QImage.Format.Format_RGB888,
+        )
+        self.update()
+
+    def paintEvent(self, event: qtg.QPaintEvent) -> None:
+        if self._image is None:
+            return
+        painter = qtg.QPainter(self)
+        size = self._image.size().scaled(
+            self.size(),
+            qtc.Qt.AspectRatioMode.KeepAspectRatio,
+        )
+        target = qtc.QRect(qtc.QPoint(0, 0), size)
+        target.moveCenter(self.rect().center())
+        painter.drawImage(target, self._image)
+        painter.end()
 
 
 class Preview(BaseWidget):
+    """Grid of images where every column shows one kind of image, e.g.
+    input of the model and output of the model, and every row one sample.
+
+    Data is emitted through `refresh_data_sig` as the list of columns where
+    every column is sequence of RGB uint8 images, one for each row. Images
+    should be converted to uint8 by the sender, e.g. with
+    `utils.tensor_to_uint8_images`, so nothing heavy runs in the gui thread.
+    Column can be `None` and can have less images than rows, only cells with
+    new images are repainted. Grid is updated when data arrives, if data
+    arrives faster than it's painted, only the newest images are shown.
+
+    Args:
+        columns (List[str]): titles of the columns
+        num_of_rows (int): how many rows of images
+    """
 
     refresh_data_sig = qtc.pyqtSignal(list)
 
     def __init__(self, columns: List[str], num_of_rows: int):
         super().__init__()
+        self._columns = columns
+        self.num_of_rows = num_of_rows
+        self.num_of_cols = len(columns)
+        self._pending: Dict[Cell, np.ndarray] = dict()
+        self._update_scheduled = False
         self._init_ui(columns, num_of_rows)
         self.refresh_data_sig.connect(self._refresh_data)
 
     def _init_ui(self, columns: List[str], num_of_rows: int):
-        layout = qwt.QVBoxLayout()
-        self.preview = CustomFigCanvas(columns, num_of_rows)
-        layout.addWidget(self.preview)
+        layout = qwt.QGridLayout()
+        self._cells: Dict[Cell, ImageCell] = dict()
+        for col, title in enumerate(columns):
+            label = qwt.QLabel(title)
+            label.setAlignment(qtc.Qt.AlignmentFlag.AlignCenter)
+            layout.addWidget(label, 0, col)
+            for row in range(num_of_rows):
+                cell = ImageCell()
+                layout.addWidget(cell, row + 1, col)
+                self._cells[(row, col)] = cell
         self.setLayout(layout)
 
     @qtc.pyqtSlot(list)
-    def _refresh_data(self, data: List[torch.Tensor]):
-        """Sends data to preview widget.
+    def _refresh_data(self, data: List[Optional[Sequence[np.ndarray]]]):
+        """Stores new images and schedules update of their cells.
 
         Args:
-            data (List[torch.Tensor]): list of tensor images
+            data (List[Optional[Sequence[np.ndarray]]]): columns of RGB
+                uint8 images
         """
-        self.preview.add_data(data)
+        for col, images in enumerate(data[:self.num_of_cols]):
+            if images is None:
+                continue
+            for row, image in enumerate(images[:self.num_of_rows]):
+                self._pending[(row, col)] = image
+        if not self._update_scheduled:
+            self._update_scheduled = True
+            qtc.QTimer.singleShot(0, self._apply_pending)
+
+    def _apply_pending(self) -> None:
+        self._update_scheduled = False
+        # hidden preview keeps only the newest images and shows them when
+        # it becomes visible
+        if not self.isVisible():
+            return
+        pending, self._pending = self._pending, dict()
+        for cell, image in pending.items():
+            self._cells[cell].set_image(image)
+
+    def showEvent(self, event: qtg.QShowEvent) -> None:
+        super().showEvent(event)
+        if self._pending:
+            self._apply_pending()
@@ -1,4 +1,5 @@
 import logging
+import threading
 
 import numpy as np
 import cv2 as cv
@@ -9,14 +10,14 @@ from torchvision import transforms
 from configs.app_config import APP_CONFIG
 from core.face import Face
 from core.face_alignment.face_aligner import FaceAligner
-from core.face_alignment.utils import get_face_mask
+from core.face_swap import FaceSwapper, seamless_merge
 from core.face_detection.algorithms.faceboxes.faceboxes_fdm import FaceboxesFDM
 from core.face_detection.algorithms.s3fd.s3fd_fdm import S3FDFDM
 from core.image.image import Image
 from core.landmark_detection.algorithms.fan.fan_ldm import FANLDM
 from core.model.original_ae import OriginalAE
-from enums import DEVICE, FACE_DETECTION_ALGORITHM, MASK_DIM
-from utils import tensor_to_np_image
+from enums import BLEND, DEVICE, FACE_DETECTION_ALGORITHM
+from utils import tensor_to_np_image, tensor_to_uint8_images
 
 
 logger = logging.getLogger(__name__)
@@ -28,7 +29,9 @@ class InferenceWorker(qtc.QObject):
     model_sig = qtc.pyqtSignal(str)
     device_sig = qtc.pyqtSignal(DEVICE)
     algorithm_sig = qtc.pyqtSignal(FACE_DETECTION_ALGORITHM)
-    inference_result = qtc.pyqtSignal(torch.Tensor, torch.Tensor, torch.Tensor)
+    inference_result = qtc.pyqtSignal(np.ndarray, np.ndarray, np.ndarray)
+    video_sig = qtc.pyqtSignal(str, str)
+    video_progress = qtc.pyqtSignal(int, int)
     inference_started = qtc.pyqtSignal()
     inference_finished = qtc.pyqtSignal()
 
@@ -41,11 +44,20 @@ class InferenceWorker(qtc.QObject):
         self._face_detection_algorithm = \
             APP_CONFIG.app.core.face_detection.algorithms.default
         self._device = DEVICE.CPU
+        self._blend = BLEND.FEATHER
+        self._stop_event = threading.Event()
         self.image_sig.connect(self.run)
+        self.video_sig.connect(self.run_video)
         self.model_sig.connect(self._load_model)
         self.device_sig.connect(self._device_changed)
         self.algorithm_sig.connect(self._algorithm_changed)
 
+    def stop(self) -> None:
+        """Stops swapping of the video which is running, called directly
+        from the gui thread because worker's thread is busy swapping.
+        """
+        self._stop_event.set()
+
     @qtc.pyqtSlot(FACE_DETECTION_ALGORITHM)
     def _algorithm_changed(self, algorithm: FACE_DETECTION_ALGORITHM) -> None:
         self._face_detection_algorithm = algorithm
@@ -96,30 +108,7 @@ class InferenceWorker(qtc.QObject):
         pred = tensor_to_np_image(prediction).astype(np.uint8)
         pred = cv.cvtColor(pred, cv.COLOR_RGB2BGR)
         pred = cv.resize(pred, (64, 64), interpolation=cv.INTER_CUBIC)
-
-        mask = face.get_mask(mask_dim=MASK_DIM.THREE)
-        pred = pred * mask
-
-        negative_mask = 1 - mask
-        clone = face.aligned_image.copy()
-        clone = clone * negative_mask + pred
-
-        mask = face.get_mask(fill_values=255)
-        max_region = np.argwhere(mask == 255)
-        min_y, min_x = max_region.min(axis=0)
-        max_y, max_x = max_region.max(axis=0)
-        len_x = max_x - min_x
-        len_y = max_y - min_y
-        mask_y = min_x + len_x // 2
-        mask_x = min_y + len_y // 2
-
-        return cv.seamlessClone(
-            clone.astype(np.uint8),
-            face.aligned_image,
-            mask.astype(np.uint8),
-            (mask_y, mask_x),
-            cv.NORMAL_CLONE,
-        )
+        return seamless_merge(face.aligned_image, pred, face.aligned_mask)
 
     @qtc.pyqtSlot(Image)
     def run(self, image: Image) -> None:
@@ -141,7 +130,7 @@ class InferenceWorker(qtc.QObject):
             landmarks = self._ldm.detect_landmarks(face)
             logger.debug(f'Landmark detection done for face {i}.')
             face.landmarks = landmarks
-            face.mask = get_face_mask(face.raw_image.data, landmarks.dots)
+            face.compute_mask()
             FaceAligner.align_face(face, 64)
 
             img_ten = transforms.ToTensor()(face.aligned_image)
@@ -153,9 +142,50 @@ class InferenceWorker(qtc.QObject):
 
             clone = InferenceWorker._merge(face, prediction)
 
+            # preview gets RGB uint8 images, nothing is converted in the gui
             self.inference_result.emit(
-                transforms.ToTensor()(face.aligned_image),
-                prediction,
-                transforms.ToTensor()(clone),
+                cv.cvtColor(face.aligned_image, cv.COLOR_BGR2RGB),
+                tensor_to_uint8_images(prediction)[0],
+                cv.cvtColor(clone, cv.COLOR_BGR2RGB),
             )
         self.inference_finished.emit()
+
+    @qtc.pyqtSlot(str, str)
+    def run_video(self, source: str, output_path: str) -> None:
+        """Swaps faces of the whole video or folder of frames, frames are
+        processed in batches and streamed into the output video.
+
+        Args:
+            source (str): video file or directory with frames
+            output_path (str): path of the output video
+        """
+        if self._fdm is None:
+            self._load_face_detection_model()
+        if self._ldm is None:
+            self._load_landmark_detection_model()
+        if self._model is None:
+            logger.error('Can not run inference, model was not loaded.')
+            return
+
+        self._stop_event.clear()
+        self.inference_started.emit()
+        logger.info(f'Swapping faces of {source} into {output_path}.')
+        swapper = FaceSwapper(
+            self._model,
+            self._fdm,
+            self._ldm,
+            self._device,
+            blend=self._blend,
+        )
+        try:
+            written = swapper.swap(
+                source,
+                output_path,
+                progress=self.video_progress.emit,
+                should_stop=self._stop_event.is_set,
+            )
+            logger.info(f'Face swapping done, {written} frames written.')
+        except Exception as e:
+            logger.error(f'Face swapping failed: {e}.')
+        finally:
+            self.inference_finished.emit()
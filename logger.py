@@ -21,7 +21,8 @@ WORKER_LOGGERS = ['.'.join([*_core_worker.parts, w.stem]) for w in _workers]
 
 class GuiHandler(logging.Handler):
     """Custom logging handler which should receive records from different
-    loggers, format the message and send it to the gui console.
+    loggers, format the message and send it to the gui console. Records are
+    only queued here, console sends them to the widget in batches.
     """
 
     def __init__(self) -> None:
@@ -33,7 +34,7 @@ class GuiHandler(logging.Handler):
         )
         level = LEVEL[record.levelname]
         name = record.name
-        msg = record.message
+        msg = record.getMessage()
         source_type = 'worker' if record.name in WORKER_LOGGERS \
             else 'widget'
         Console.print(date, name, source_type, level, msg)
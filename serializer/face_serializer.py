@@ -7,7 +7,7 @@ from typing import Union
 from core.face import Face
 from core.exception import FileDoesNotExistsError, NotDirectoryError
 from serializer.serializer import Serializer
-from utils import construct_file_path
+from utils import get_path_allocator
 
 
 class FaceSerializer(Serializer):
@@ -52,17 +52,20 @@ class FaceSerializer(Serializer):
         NotDirectoryError
             if `path` is not a directory
         """
-        if not os.path.exists(path):
-            os.makedirs(path)
-
-        if not os.path.isdir(path):
+        if os.path.exists(path) and not os.path.isdir(path):
             raise NotDirectoryError(path)
 
         # image name, no extension
         face_name = obj.raw_image.name.split('.')[0]
 
-        face_path = os.path.join(path, face_name + '.p')
-        face_path = construct_file_path(face_path)
+        face_path = get_path_allocator(path).allocate(face_name + '.p')
         obj.path = face_path
         obj.name = face_path.name
-        pickle.dump(obj, gzip.open(face_path, 'wb'))
+        try:
+            with gzip.open(face_path, 'wb') as f:
+                pickle.dump(obj, f)
+        except BaseException:
+            # claimed empty file would be listed and loaded as broken face
+            if face_path.exists():
+                face_path.unlink()
+            raise
@@ -6,6 +6,7 @@ from itertools import islice
 import logging
 import os
 from pathlib import Path
+import threading
 from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import cv2 as cv
@@ -19,6 +20,11 @@ from enums import IMAGE_FORMAT, NUMBER_TYPE
 
 logger = logging.getLogger(__name__)
 
+# directory listings, key is (directory, listing directories), value is
+# directory mtime and names of the entries when it was listed
+_listing_cache: Dict[Tuple[str, bool], Tuple[int, List[str]]] = dict()
+_listing_cache_lock = threading.Lock()
+
 
 def get_file_extension(file_path: Union[str, Path]) -> str:
     """Gets file extension.
@@ -51,55 +57,141 @@ def get_image_paths_from_dir(dir: Union[str, Path]) -> List[Path] or None:
     List[Path] or None
         image paths or None if directory does not exist
     """
-    file_paths = get_file_paths_from_dir(dir)
-    if file_paths is None:
+    return get_file_paths_from_dir(dir, [f.value for f in IMAGE_FORMAT])
+
+
+def _normalize_extensions(
+    extensions: Optional[Iterable[str]],
+) -> Optional[set]:
+    if extensions is None:
         return None
+    return set(['.' + ext.lstrip('.') for ext in extensions])
 
-    images_exts = set(['.' + f.value for f in IMAGE_FORMAT])
-    image_paths = [fp for fp in file_paths
-                   if fp.suffix in images_exts]
 
-    return image_paths
+def scan_dir(
+    dir: Union[str, Path],
+    extensions: Optional[Iterable[str]] = None,
+    directories: bool = False,
+) -> Iterator[Path]:
+    """Generator of absolute paths of the files in `dir`. Paths are
+    yielded while the directory is being scanned so the consumer can start
+    before the scan of the large directory is done. Type of the entry is
+    read from the directory listing, without additional stat per file.
+
+    Parameters
+    ----------
+    dir : Union[str, Path]
+        directory with files
+    extensions : Optional[Iterable[str]], optional
+        files that end with these extension will be included, with or
+        without leading dot, by default None
+    directories : bool, optional
+        yield subdirectories instead of files, by default False
+
+    Yields
+    ------
+    Iterator[Path]
+        file or subdirectory paths
+    """
+    root = Path(dir).absolute()
+    exts = _normalize_extensions(extensions)
+    with os.scandir(root) as it:
+        for entry in it:
+            if directories:
+                if not entry.is_dir():
+                    continue
+            elif not entry.is_file():
+                continue
+            if exts is not None and \
+                    os.path.splitext(entry.name)[1] not in exts:
+                continue
+            yield root / entry.name
+
+
+def _cached_listing(root: Path, directories: bool) -> List[str]:
+    key = (str(root), directories)
+    mtime = os.stat(root).st_mtime_ns
+    with _listing_cache_lock:
+        cached = _listing_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    names = [p.name for p in scan_dir(root, directories=directories)]
+    with _listing_cache_lock:
+        _listing_cache[key] = (mtime, names)
+    return names
+
+
+def _list_dir(
+    dir: Union[str, Path],
+    extensions: Optional[Iterable[str]],
+    directories: bool,
+    use_cache: bool,
+) -> Optional[List[Path]]:
+    root = Path(dir).absolute()
+    if not root.is_dir():
+        return None
+    if not use_cache:
+        return list(scan_dir(root, extensions, directories))
+    names = _cached_listing(root, directories)
+    exts = _normalize_extensions(extensions)
+    return [
+        root / n for n in names
+        if exts is None or os.path.splitext(n)[1] in exts
+    ]
 
 
 def get_file_paths_from_dir(
     dir: Union[str, Path],
-    extensions: Optional[List[str]] = None,
+    extensions: Optional[Iterable[str]] = None,
+    use_cache: bool = False,
 ) -> Optional[List[Path]]:
     """Constructs apsolute file paths of the files in `dir`. If files
     with particular extensions are allowed, then `extensions` argument
     should be also passed as an argument.
 
+    With `use_cache` listing of the directory is remembered and reused
+    while the modification time of the directory doesn't change, which
+    happens when files are added, removed or renamed. Changes of the files
+    content don't invalidate the listing.
+
     Parameters
     ----------
     dir : Union[str, Path]
         directory with files
-    extensions : Optional[List[str]], optional
+    extensions : Optional[Iterable[str]], optional
         files that end with these extension will be included, by default None
+    use_cache : bool, optional
+        reuse listing of unchanged directory, by default False
 
     Returns
     -------
     Optional[List[Path]]
-        list of file paths is they satisfy `extensions` argument
+        list of file paths is they satisfy `extensions` argument, None if
+            directory does not exist
     """
-    if isinstance(dir, str):
-        dir = Path(dir)
-
-    if not os.path.exists(dir):
-        return None
+    return _list_dir(dir, extensions, False, use_cache)
 
-    files = [
-        Path(f) for f in os.listdir(dir) if os.path.isfile(dir.joinpath(f))
-    ]
-    curr_dir = dir.absolute()
-    file_paths = [curr_dir.joinpath(f) for f in files]
 
-    if extensions is None:
-        return file_paths
+def get_dir_paths_from_dir(
+    dir: Union[str, Path],
+    use_cache: bool = False,
+) -> Optional[List[Path]]:
+    """Constructs apsolute paths of the subdirectories in `dir`.
 
-    exts = set(['.' + ext for ext in extensions])
+    Parameters
+    ----------
+    dir : Union[str, Path]
+        parent directory
+    use_cache : bool, optional
+        reuse listing of unchanged directory, see
+            `get_file_paths_from_dir`, by default False
 
-    return [f for f in file_paths if f.suffix in exts]
+    Returns
+    -------
+    Optional[List[Path]]
+        list of subdirectory paths, None if directory does not exist
+    """
+    return _list_dir(dir, None, True, use_cache)
 
 
 def qicon_from_path(path: str) -> qtg.QIcon:
@@ -229,41 +321,123 @@ def load_file_from_google_drive(model_id: str, filename: str) -> str:
     return cached_file
 
 
-def construct_file_path(path: Union[str, Path]) -> Path:
-    """Constructs new file name by adding a number to the end of the
-    filename if file on this path already exists.
+class PathAllocator:
+    """Allocates free file paths in one directory. If file with the
+    requested name already exists, number is added to the end of the
+    filename, e.g. `face.p`, `face_1.p`, `face_2.p`...
+
+    Directory is scanned once and taken names and the next free number for
+    every name are kept in memory, so allocation doesn't probe the file
+    system in a loop. Directory is scanned again only if it was changed by
+    something other than this allocator, e.g. files were deleted, which is
+    detected by its modification time, or if it was removed, in which case
+    it's created again. Allocated path is claimed by creating an empty file
+    with `O_EXCL`, which fails if other process took the same name in the
+    meantime, in that case next number is tried. This makes allocation safe
+    when several processes write into the same directory.
 
     Parameters
     ----------
-    path : Union[str, Path]
-        file path
+    directory : Union[str, Path]
+        directory where files are written, created if it doesn't exist
+    """
+
+    def __init__(self, directory: Union[str, Path]) -> None:
+        self._directory = Path(directory)
+        self._taken = set()
+        self._next: Dict[str, int] = dict()
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._scan()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def _scan(self) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._taken = set(p.name for p in scan_dir(self._directory))
+        self._next = dict()
+        self._mtime = os.stat(self._directory).st_mtime_ns
+
+    def _refresh(self) -> None:
+        try:
+            mtime = os.stat(self._directory).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self._scan()
+
+    def _claim(self, name: str) -> bool:
+        if name in self._taken:
+            return False
+        self._taken.add(name)
+        path = self._directory / name
+        flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY
+        try:
+            fd = os.open(path, flags)
+        except FileExistsError:
+            # created after the directory was scanned
+            return False
+        except FileNotFoundError:
+            # directory was removed after the last check
+            self._directory.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, flags)
+        os.close(fd)
+        # own changes of the directory don't need a new scan
+        self._mtime = os.stat(self._directory).st_mtime_ns
+        return True
+
+    def allocate(self, filename: str) -> Path:
+        """Allocates path for the file with name `filename`.
+
+        Parameters
+        ----------
+        filename : str
+            preferred file name with extension
+
+        Returns
+        -------
+        Path
+            path of the newly created empty file in the directory
+        """
+        with self._lock:
+            self._refresh()
+            if self._claim(filename):
+                return self._directory / filename
+            name = Path(filename)
+            counter = self._next.get(filename, 1)
+            while not self._claim(f'{name.stem}_{counter}{name.suffix}'):
+                counter += 1
+            self._next[filename] = counter + 1
+            return self._directory / f'{name.stem}_{counter}{name.suffix}'
+
+
+_path_allocators: Dict[Path, PathAllocator] = dict()
+_path_allocators_lock = threading.Lock()
+
+
+def get_path_allocator(directory: Union[str, Path]) -> PathAllocator:
+    """Shared `PathAllocator` of the `directory`, directory is scanned when
+    allocator is requested for the first time.
+
+    Parameters
+    ----------
+    directory : Union[str, Path]
+        directory where files are written
 
     Returns
     -------
-    str
-        file path
+    PathAllocator
+        path allocator
     """
-    if isinstance(path, str):
-        path = Path(path)
-    if path.exists():
-        # ['folder1', 'folder2', 'file.txt']
-        parts = list(path.parts)
-        # 'file.txt'
-        filename_with_ext = parts.pop()
-        (filename, ext) = filename_with_ext.split('.')
-        # making new file path where numbers are added to the end of the
-        # filename if more copies of the same file exist
-        counter = 1
-        folder = Path(*parts)
-        while True:
-            new_filename_with_ext = f'{filename}_{str(counter)}.{ext}'
-            new_file_path = folder / new_filename_with_ext
-            if new_file_path.exists():
-                counter += 1
-            else:
-                return new_file_path
-    else:
-        return path
+    directory = Path(directory).absolute()
+    with _path_allocators_lock:
+        allocator = _path_allocators.get(directory)
+        if allocator is None:
+            allocator = PathAllocator(directory)
+            _path_allocators[directory] = allocator
+        return allocator
 
 
 def tensor_to_np_image(image: torch.Tensor) -> np.ndarray:
@@ -288,6 +462,26 @@ def tensor_to_np_image(image: torch.Tensor) -> np.ndarray:
     return np.int32(img)
 
 
+def tensor_to_uint8_images(images: torch.Tensor) -> List[np.ndarray]:
+    """Converts batch of BGR images in 0..1 range into RGB uint8 images
+    which can be shown in gui. Whole batch is converted at once, meant to be
+    called by the worker before images are sent to the gui.
+
+    Args:
+        images (torch.Tensor): images of shape (N, C, H, W) or (C, H, W)
+
+    Returns:
+        List[np.ndarray]: images of shape (H, W, C)
+    """
+    images = images.detach()
+    if images.dim() == 3:
+        images = images.unsqueeze(0)
+    images = images.float().clamp(0, 1).mul(255).round().to(torch.uint8)
+    # BGR to RGB and channels last
+    images = images.flip(1).permute(0, 2, 3, 1).contiguous().cpu().numpy()
+    return list(images)
+
+
 def parse_number(
     number: str,
     number_type: NUMBER_TYPE = NUMBER_TYPE.INT,
@@ -426,6 +620,37 @@ def format_timedelta(tdelta: timedelta) -> str:
     return formatted
 
 
+def format_stage_timings(stage_timings: Dict[str, Any]) -> str:
+    """Formats stage timings summary made by the worker profiler, one stage
+    per line, stages which took the most time come first.
+
+    Parameters
+    ----------
+    stage_timings : Dict[str, Any]
+        summary of the stage timings
+
+    Returns
+    -------
+    str
+        formatted stage timings
+    """
+    stages = sorted(
+        stage_timings['stages'].items(),
+        key=lambda s: s[1]['total'],
+        reverse=True,
+    )
+    lines = [
+        f'{name}: {round(s["total"], 2)}s ({round(s["share"] * 100, 1)}%), ' +
+        f'{round(s["mean"] * 1000, 2)}ms x {s["count"]}'
+        for name, s in stages
+    ]
+    lines.extend(
+        f'{name}: {value}'
+        for name, value in stage_timings['counters'].items()
+    )
+    return '\n'.join(lines)
+
+
 def prepare_path(path: Union[Path, str]) -> Union[Path, None]:
     """Tries to parse argument to the `Path` object.
 
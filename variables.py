@@ -43,4 +43,8 @@ MAKE_DEEPFAKE_PAGE_TITLE = 'Make deepfake page'
 DETECT_DEEPFAKE_PAGE_NAME = 'detect_deepfake_page'
 DETECT_DEEPFAKE_PAGE_TITLE = 'Detect deepfake page'
 
-APP_LOGGER = 'app'
\ No newline at end of file
+APP_LOGGER = 'app'
+
+CACHE_ROOT = DEEPFAKE_ROOT / 'cache'
+
+THUMBNAIL_CACHE_PATH = CACHE_ROOT / 'thumbnails.sqlite'